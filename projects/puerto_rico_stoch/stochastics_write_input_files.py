@@ -30,11 +30,17 @@ dbs = ["T.sqlite", "U.sqlite", "V.sqlite",
 # model years
 years = [2016, 2021, 2026, 2031, 2036]
 
-# Hurricane scenarios with corresponding probabilities and windspeeds
+# Hurricane scenarios with corresponding probabilities
 scenarios = ["H1", "H2", "H3"]
 probabilities_hist = [0.52, 0.32, 0.16]  # sum must equal 1
 probabilities_climate_change = [0.2, 0.32, 0.48]  # sum must equal 1
-windspeeds = [22.0, 113.0, 154.0]  # mph
+
+# Hurricane windspeeds are sampled from the historical record, with storm categories grouped into the scenarios
+hurricane_data = os.path.join('hurricane_backcasting', 'hurricaneData.csv')
+categories = {'None': 'H1', 'TD': 'H1', 'TS': 'H1', 'H1': 'H1', 'H2': 'H2', 'H3': 'H2', 'H4': 'H3', 'H5': 'H3'}
+record_start = 1979
+record_stop = 2017
+n_storms = 10000  # storms sampled per scenario
 
 # temoa model technologies and corresponding fragility curve groups
 techs = {'LOCAL': "inf_stiff", 'UGND_TRANS': "UGND", 'UGND_DIST': "UGND", 'TRANS': "trans", 'SUB': "sub",
@@ -70,6 +76,14 @@ if cutoff ** n_years < 1e-6:
 else:
     print("Verified: Appropriate value for cutoff")
 
+# --------------------
+# capacity reduction of each technology in each scenario
+# --------------------
+climatology = tt.HurricaneClimatology.from_csv(hurricane_data, categories, start=record_start, stop=record_stop,
+                                               step=years[1] - years[0])
+tech_curves = {tech: curves[techs[tech]] for tech in techs.keys()}
+cap_reduction = tt.sample_cap_reduction(climatology, tech_curves, n_samples=n_storms, cutoff=cutoff, seed=0)
+
 # --------------------
 # directory management
 # --------------------
@@ -148,18 +162,10 @@ for case in range(n_cases):
         f.write(")\n")
         f.write("rates = {\n")
         f.write("\t'CapReduction': dict(\n")
-        for scenario, prob, windspeed in zip(scenarios, probabilities, windspeeds):
+        for scenario in scenarios:
             f.write("\t\t" + scenario + "=(\n")
             for tech in techs.keys():
-                tech_cat = techs[tech]
-                curve = curves[tech_cat]
-                fragility = tt.fragility(windspeed, curve=curve)
-                capReduction = round(1.0 - fragility, 3)
-                # Check for unallowed values of capReduction
-                if capReduction > 1.0:
-                    capReduction = 1.0
-                elif capReduction < cutoff:  # Zero values will crash
-                    capReduction = cutoff
+                capReduction = round(cap_reduction.loc[tech, scenario], 3)
                 f.write("\t\t\t('" + tech + "', " + str(capReduction) + "),\n")
             f.write("\t\t),\n\n")
         f.write("\t),\n")
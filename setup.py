@@ -9,4 +9,5 @@ setup(name='temoatools',
       packages=['temoatools'],
       zip_safe=False,
       include_package_data=True,
-      install_requires=['pandas', 'numpy', 'matplotlib', 'seaborn', 'joblib', 'scipy', 'xlrd'])
\ No newline at end of file
+      install_requires=['pandas', 'numpy', 'matplotlib', 'seaborn', 'joblib', 'scipy', 'xlrd'],
+      extras_require={'store': ['pyarrow']})
\ No newline at end of file
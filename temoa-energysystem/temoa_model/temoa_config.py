@@ -23,6 +23,61 @@ from os import sep
 
 import re
 
+#[set or param, table_name, DAT fieldname, flag (if any), index (where to insert '#')
+table_list = [
+	['set',  'time_periods',              'time_exist',          'e',            0],
+	['set',  'time_periods',              'time_future',         'f',            0],
+	['set',  'time_season',               '',                    '',             0],
+	['set',  'time_of_day',               '',                    '',             0],
+	['set',  'Zones',        	          '',                    '',             0],
+	['set',  'tech_curtailment',          '',                    '',             0],
+	['set',  'tech_reserve',              '',                    '',             0],		
+	['set',  'technologies',              'tech_resource',       'r',            0],
+	['set',  'technologies',              'tech_production',    ['p','pb','ps'], 0],
+	['set',  'technologies',              'tech_baseload',       'pb',           0],
+	['set',  'technologies',              'tech_storage',  		 'ps',           0],
+	['set',  'tech_ramping',              '',                    '',             0],
+	['set',  'commodities',               'commodity_physical',  'p',            0],
+	['set',  'commodities',               'commodity_emissions', 'e',            0],
+	['set',  'commodities',               'commodity_demand',    'd',            0],
+	['set',  'tech_groups',               '',                    '',             0],
+	['set',  'tech_annual',              '',                    '',             0],				
+	['set',  'groups',                    '',                    '',             0],		
+	['param','MinGenGroupTarget',         '',                    '',             2], 
+	['param','MinGenGroupWeight',         '',                    '',             2], 
+	['param','SegFrac',                   '',                    '',             2],
+	['param','DemandSpecificDistribution','',                    '',             3],
+	['param','CapacityToActivity',        '',                    '',             1],
+	['param','PlanningReserveMargin',     '',                    '',             1],
+	['param','GlobalDiscountRate',        '',                    '',             0],
+	['param','DiscountRate',              '',                    '',             2],
+	['param','EmissionActivity',          '',                    '',             5],
+	['param','EmissionLimit',             '',                    '',             2],
+	['param','Demand',                    '',                    '',             2],
+	['param','TechOutputSplit',           '',                    '',             3],
+	['param','TechInputSplit',            '',                    '',             3],
+	['param','MinCapacity',               '',                    '',             2],
+	['param','MaxCapacity',               '',                    '',             2],
+	['param','MaxActivity',               '',                    '',             2],
+	['param','MinActivity',               '',                    '',             2],
+	['param','GrowthRateMax',             '',                    '',             1],
+	['param','GrowthRateSeed',            '',                    '',             1],
+	['param','LifetimeTech',              '',                    '',             1],
+	['param','LifetimeProcess',           '',                    '',             2],
+	['param','LifetimeLoanTech',          '',                    '',             1],
+	['param','CapacityFactorTech',        '',                    '',             3],
+	['param','CapacityFactorProcess',     '',                    '',             4],
+	['param','Efficiency',                '',                    '',             4],
+	['param','ExistingCapacity',          '',                    '',             2],
+	['param','CostInvest',                '',                    '',             2],
+	['param','CostFixed',                 '',                    '',             3],
+	['param','CostVariable',              '',                    '',             3],
+	['param','CapacityCredit',            '',                    '',             2],
+	['param','RampUp',                    '',                    '',             1],
+	['param','RampDown',                  '',                    '',             1],
+	['param','StorageInitFrac',           '',                    '',             2],
+	['param','StorageDuration',           '',                    '',             1]]
+
 def db_2_dat(ifile, ofile, options):
 	# Adapted from DB_to_DAT.py
 	import sqlite3
@@ -87,7 +142,6 @@ def db_2_dat(ifile, ofile, options):
 			for line in cur:
 				str_row = str(line[0]) + "\n"
 				f.write(str_row)
-				print(str_row)
 		else:
 			for line in cur:
 				before_comments = line[:t_index+1]    
@@ -102,64 +156,8 @@ def db_2_dat(ifile, ofile, options):
 				else :
 						str_row = before_comments + "\n"
 				f.write(str_row)
-				print(str_row)
 		f.write(';\n\n')
 
-	#[set or param, table_name, DAT fieldname, flag (if any), index (where to insert '#')
-	table_list = [
-		['set',  'time_periods',              'time_exist',          'e',            0],
-		['set',  'time_periods',              'time_future',         'f',            0],
-		['set',  'time_season',               '',                    '',             0],
-		['set',  'time_of_day',               '',                    '',             0],
-		['set',  'Zones',        	          '',                    '',             0],
-		['set',  'tech_curtailment',          '',                    '',             0],
-		['set',  'tech_reserve',              '',                    '',             0],		
-		['set',  'technologies',              'tech_resource',       'r',            0],
-		['set',  'technologies',              'tech_production',    ['p','pb','ps'], 0],
-		['set',  'technologies',              'tech_baseload',       'pb',           0],
-		['set',  'technologies',              'tech_storage',  		 'ps',           0],
-		['set',  'tech_ramping',              '',                    '',             0],
-		['set',  'commodities',               'commodity_physical',  'p',            0],
-		['set',  'commodities',               'commodity_emissions', 'e',            0],
-		['set',  'commodities',               'commodity_demand',    'd',            0],
-		['set',  'tech_groups',               '',                    '',             0],
-		['set',  'tech_annual',              '',                    '',             0],				
-		['set',  'groups',                    '',                    '',             0],		
-		['param','MinGenGroupTarget',         '',                    '',             2], 
-		['param','MinGenGroupWeight',         '',                    '',             2], 
-		['param','SegFrac',                   '',                    '',             2],
-		['param','DemandSpecificDistribution','',                    '',             3],
-		['param','CapacityToActivity',        '',                    '',             1],
-		['param','PlanningReserveMargin',     '',                    '',             1],
-		['param','GlobalDiscountRate',        '',                    '',             0],
-		['param','DiscountRate',              '',                    '',             2],
-		['param','EmissionActivity',          '',                    '',             5],
-		['param','EmissionLimit',             '',                    '',             2],
-		['param','Demand',                    '',                    '',             2],
-		['param','TechOutputSplit',           '',                    '',             3],
-		['param','TechInputSplit',            '',                    '',             3],
-		['param','MinCapacity',               '',                    '',             2],
-		['param','MaxCapacity',               '',                    '',             2],
-		['param','MaxActivity',               '',                    '',             2],
-		['param','MinActivity',               '',                    '',             2],
-		['param','GrowthRateMax',             '',                    '',             1],
-		['param','GrowthRateSeed',            '',                    '',             1],
-		['param','LifetimeTech',              '',                    '',             1],
-		['param','LifetimeProcess',           '',                    '',             2],
-		['param','LifetimeLoanTech',          '',                    '',             1],
-		['param','CapacityFactorTech',        '',                    '',             3],
-		['param','CapacityFactorProcess',     '',                    '',             4],
-		['param','Efficiency',                '',                    '',             4],
-		['param','ExistingCapacity',          '',                    '',             2],
-		['param','CostInvest',                '',                    '',             2],
-		['param','CostFixed',                 '',                    '',             3],
-		['param','CostVariable',              '',                    '',             3],
-		['param','CapacityCredit',            '',                    '',             2],
-		['param','RampUp',                    '',                    '',             1],
-		['param','RampDown',                  '',                    '',             1],
-		['param','StorageInitFrac',           '',                    '',             2],
-		['param','StorageDuration',           '',                    '',             1]]
-
 	with open(ofile, 'w') as f:
 		f.write('data ;\n\n')
 		#connect to the database
@@ -184,6 +182,116 @@ def db_2_dat(ifile, ofile, options):
 		cur.close()
 		con.close()
 
+def db_2_data(ifile, options):
+	"""Read the tables of a database (see table_list) into a Pyomo data
+	dictionary, {None: {name: data}}, that can be passed to
+	create_instance in place of a .dat file."""
+	import sqlite3
+
+	def dat_value(value):
+		# Values are converted as DataPortal does when reading the .dat file
+		if isinstance(value, str):
+			for convert in (int, float):
+				try:
+					return convert(value)
+				except ValueError:
+					pass
+		return value
+
+	con = sqlite3.connect(ifile)
+	cur = con.cursor()
+	con.text_factory = str
+
+	table_exist = cur.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+	table_exist = [i[0] for i in table_exist]
+
+	data = dict()
+	for t_type, t_name, t_dtname, t_flag, t_index in table_list:
+		if t_name not in table_exist:
+			continue
+		if type(t_flag) is list:
+			db_query = "SELECT * FROM " + t_name + " WHERE flag IN (" + ','.join('?' * len(t_flag)) + ")"
+			rows = cur.execute(db_query, t_flag).fetchall()
+		elif t_flag != '':
+			rows = cur.execute("SELECT * FROM " + t_name + " WHERE flag==?", (t_flag,)).fetchall()
+		else:
+			rows = cur.execute("SELECT * FROM " + t_name).fetchall()
+		if not rows:
+			continue
+		name = t_dtname if t_flag != '' else t_name
+
+		if t_type == 'set':
+			data[name] = {None: [dat_value(row[0]) for row in rows]}
+		elif t_index == 0:
+			data[name] = {None: dat_value(rows[-1][0])}
+		elif t_index == 1:
+			data[name] = {dat_value(row[0]): dat_value(row[1]) for row in rows}
+		else:
+			data[name] = {tuple(dat_value(i) for i in row[:t_index]): dat_value(row[t_index]) for row in rows}
+
+	mga_weight = getattr(options, 'mga_weight', None)
+	if mga_weight == 'integer':
+		data['tech_mga'] = {None: [row[0] for row in cur.execute("SELECT tech FROM technologies")]}
+	if mga_weight == 'normalized':
+		for sector, tech in cur.execute("SELECT sector, tech FROM technologies").fetchall():
+			data.setdefault('tech_' + sector, {None: []})[None].append(tech)
+
+	cur.close()
+	con.close()
+	return {None: data}
+
+def db_input_hash(ifile, options):
+	"""Return the sha256 of the input tables of a database (see table_list),
+	which do not change when results are written to the Output tables."""
+	import hashlib, sqlite3
+
+	con = sqlite3.connect(ifile)
+	cur = con.cursor()
+	con.text_factory = str
+
+	table_exist = set(i[0] for i in cur.execute("SELECT name FROM sqlite_master WHERE type='table'"))
+	tables = sorted(set(table[1] for table in table_list) | set(['technologies']))
+
+	sha = hashlib.sha256()
+	sha.update(str(getattr(options, 'mga_weight', None)).encode())
+	for t_name in tables:
+		if t_name not in table_exist:
+			continue
+		sha.update(t_name.encode())
+		for row in cur.execute("SELECT * FROM " + t_name):
+			sha.update(repr(row).encode())
+
+	cur.close()
+	con.close()
+	return sha.hexdigest()
+
+def load_db(ifile, options):
+	"""Return the Pyomo data dictionary of a database (see db_2_data).  If
+	options.data_cache names a directory, the dictionary is pickled there,
+	keyed on the hash of the input tables of the database (db_input_hash),
+	and reused while they are unchanged."""
+	import pickle, os
+
+	data_cache = getattr(options, 'data_cache', None)
+	if not data_cache:
+		return db_2_data(ifile, options)
+
+	cache_file = os.path.join(data_cache, db_input_hash(ifile, options) + '.pkl')
+
+	if isfile(cache_file):
+		with open(cache_file, 'rb') as f:
+			return pickle.load(f)
+
+	data = db_2_data(ifile, options)
+	if not os.path.exists(data_cache):
+		os.makedirs(data_cache)
+	# Write to a temporary file first, so that concurrent runs never read a partial cache file
+	temp_file = cache_file + '.' + str(os.getpid()) + '.tmp'
+	with open(temp_file, 'wb') as f:
+		pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+	os.replace(temp_file, cache_file)
+	return data
+
 class TemoaConfig( object ):
 	states = (
 	('mga', 'exclusive'),
@@ -204,6 +312,9 @@ class TemoaConfig( object ):
 		'mgaiter',
 		'path_to_db_io',
 		'path_to_logs',
+		'write_dat',
+		'data_cache',
+		'fast_matrix',
 		'mgaweight'
 	)
 	
@@ -234,6 +345,9 @@ class TemoaConfig( object ):
 		self.mga              = None # mga slack value
 		self.mga_iter         = None
 		self.mga_weight       = None
+		self.write_dat        = False # Also write .db input files to .dat files
+		self.data_cache       = None # Directory holding the data read from .db input files
+		self.fast_matrix      = False # Write the solver file from the coefficient matrix (temoa_matrix)
 
 		# To keep consistent with Kevin's argumetn parser, will be removed in the future.
 		self.graph_format     = None
@@ -265,6 +379,8 @@ class TemoaConfig( object ):
 		msg += '{:>{}s}: {}\n'.format('Output file', width, self.output)
 		msg += '{:>{}s}: {}\n'.format('Scenario', width, self.scenario)	
 		msg += '{:>{}s}: {}\n'.format('Spreadsheet output', width, self.saveEXCEL)
+		msg += '{:>{}s}: {}\n'.format('Write .dat file', width, self.write_dat)
+		msg += '{:>{}s}: {}\n'.format('Input data cache', width, self.data_cache)
 		msg += spacer
 		msg += '{:>{}s}: {}\n'.format('Citation output status', width, self.how_to_cite)
 		msg += '{:>{}s}: {}\n'.format('NEOS status', width, self.neos)
@@ -273,6 +389,7 @@ class TemoaConfig( object ):
 		msg += '{:>{}s}: {}\n'.format('Selected solver status', width, self.solver)
 		msg += '{:>{}s}: {}\n'.format('Solver LP write status', width, self.generateSolverLP)
 		msg += '{:>{}s}: {}\n'.format('Pyomo LP write status', width, self.keepPyomoLP)
+		msg += '{:>{}s}: {}\n'.format('Fast matrix status', width, self.fast_matrix)
 		msg += spacer
 		msg += '{:>{}s}: {}\n'.format('MGA slack value', width, self.mga)
 		msg += '{:>{}s}: {}\n'.format('MGA # of iterations', width, self.mga_iter)
@@ -312,6 +429,18 @@ class TemoaConfig( object ):
 		r'--path_to_logs[\s\=]+[-\\\/\:\.\~\w\ ]+\b'
 		self.path_to_logs = abspath(t.value.replace('=', ',').split(",")[1])
 	
+	def t_write_dat(self, t):
+		r'--write_dat\b'
+		self.write_dat = True
+
+	def t_data_cache(self, t):
+		r'--data_cache[\s\=]+[-\\\/\:\.\~\w]+'
+		self.data_cache = abspath(t.value.replace('=', ' ').split()[1])
+
+	def t_fast_matrix(self, t):
+		r'--fast_matrix\b'
+		self.fast_matrix = True
+
 	def t_how_to_cite(self, t):
 		r'--how_to_cite\b'
 		self.how_to_cite = True
@@ -446,19 +575,15 @@ class TemoaConfig( object ):
 			for i in range(self.mga_iter):
 				self.__mga_todo.put(self.scenario + '_mga_' + str(i))
 
-		f = open(os.devnull, 'w'); 
-		sys.stdout = f # Suppress the original DB_to_DAT.py output
-		
+		# .db input files are read directly by create_temoa_instance (see load_db),
+		# they are only written to .dat files when requested
 		counter = 0
 		
-		for ifile in self.dot_dat:
-			i_name, i_ext = splitext(ifile)
-			if i_ext != '.dat':
-				ofile = i_name + '.dat'
-				db_2_dat(ifile, ofile, self)
-				self.dot_dat[self.dot_dat.index(ifile)] = ofile
-				counter += 1
-		f.close()
-		sys.stdout = sys.__stdout__
+		if self.write_dat:
+			for ifile in self.dot_dat:
+				i_name, i_ext = splitext(ifile)
+				if i_ext != '.dat':
+					db_2_dat(ifile, i_name + '.dat', self)
+					counter += 1
 		if counter > 0:
-			sys.stderr.write("\n{} .db DD file(s) converted\n".format(counter))
\ No newline at end of file
+			sys.stderr.write("\n{} .db DD file(s) converted\n".format(counter))
@@ -18,6 +18,7 @@ received this license file.  If not, see <http://www.gnu.org/licenses/>.
 from operator import itemgetter as iget
 from itertools import product as cross_product
 from sys import argv, stderr as SE, stdout as SO
+from time import time
 
 import IPython
 
@@ -55,6 +56,8 @@ class TemoaModel( AbstractModel ):
 		self.activeActivity_ptv = None
 		self.activeCapacity_tv = None
 		self.activeCapacityAvailable_pt = None
+		self.capacityAvailablePeriods = dict() # Sorted periods of each tech in activeCapacityAvailable_pt
+		self.capacityAvailablePrevPeriod = dict() # Previous period of each (p, t) in activeCapacityAvailable_pt
 
 		self.commodityDStreamProcess  = dict() # The downstream process of a commodity during a period
 		self.commodityUStreamProcess  = dict() # The upstream process of a commodity during a period
@@ -70,6 +73,15 @@ class TemoaModel( AbstractModel ):
 		self.inputsplitVintages = dict()
 		self.outputsplitVintages = dict()
 		self.ProcessByPeriodAndOutput = dict()
+		self.sparseDictsTiming = dict() # Seconds spent in each phase of CreateSparseDicts
+
+		self.costInvestByPeriod   = dict() # (t, v) of the CostInvest keys by vintage
+		self.costFixedByPeriod    = dict() # (t, v) of the CostFixed keys by period
+		self.costVariableByPeriod = dict() # (t, v) of the CostVariable keys by period
+		self.emissionActivityByPeriod = dict() # (i, t, v, o) of the active EmissionActivity keys by (p, e)
+		self.loanDiscount    = dict() # Discount factor of the loan of (t, v)
+		self.loanHorizonFrac = dict() # Fraction of the loan of (t, v) paid within the horizon
+		self.periodDiscount  = dict() # Discount factor of the fixed and variable costs of (p, t, v)
 
 # ---------------------------------------------------------------
 # Validation and initialization routines.
@@ -509,17 +521,36 @@ def CreateSparseDicts ( M ):
 	Efficiency table. For each iteration of the loop, the appropriate key / value
 	pairs are defined as appropriate for each dictionary.
 	"""
+	l_begin = time()
 	l_first_period = min( M.time_future )
 	l_exist_indices = M.ExistingCapacity.sparse_keys()
 	l_used_techs = set()
 
+	# Hashed lookups, built once.  Membership tests against sparse_iterkeys()
+	# scan the whole parameter, which made this function quadratic in the
+	# number of splits.
+	l_periods        = list( M.time_optimize )
+	l_vintage_opt    = set( M.time_optimize )
+	l_vintage_exist  = set( M.vintage_exist )
+	l_input_splits   = set( M.TechInputSplit.sparse_iterkeys() )
+	l_output_splits  = set( M.TechOutputSplit.sparse_iterkeys() )
+	l_curtailment    = set( M.tech_curtailment )
+	l_baseload       = set( M.tech_baseload )
+	l_storage        = set( M.tech_storage )
+	l_ramping        = set( M.tech_ramping )
+	l_resource       = set( M.tech_resource )
+	l_reserve        = set( M.tech_reserve )
+
 	# The basis for the dictionaries are the sparse keys defined in the
-	# Efficiency table.
+	# Efficiency table.  The first pass checks them, and finds the periods
+	# in which each process (t, v) is active or has a loan.
+	l_efficiency = list()
+	l_process_periods = dict()
 	for i, t, v, o in M.Efficiency.sparse_iterkeys():
 		l_process = (t, v)
 		l_lifetime = value(M.LifetimeProcess[ l_process ])
 		# Do some error checking for the user.
-		if v in M.vintage_exist:
+		if v in l_vintage_exist:
 			if l_process not in l_exist_indices:
 				msg = ('Warning: %s has a specified Efficiency, but does not '
 				  'have any existing install base (ExistingCapacity).\n')
@@ -549,89 +580,64 @@ def CreateSparseDicts ( M ):
 			continue
 
 		l_used_techs.add( t )
+		l_efficiency.append( eindex )
 
-		# Add in the period (p) index, since it's not included in the efficiency
-		# table.
-		for p in M.time_optimize:
+		if l_process not in l_process_periods:
 			# Can't build a vintage before it's been invented
-			if p < v: continue
-
-			pindex = (p, t, v)
-
-			if v in M.time_optimize:
+			l_built = [ p for p in l_periods if p >= v ]
+			if v in l_vintage_opt:
 				l_loan_life = value(M.LifetimeLoanProcess[ l_process ])
-				if v + l_loan_life >= p:
-					M.processLoans[ pindex ] = True
-
+				for p in l_built:
+					if v + l_loan_life >= p:
+						M.processLoans[ p, t, v ] = True
 			# if tech is no longer active, don't include it
-			if v + l_lifetime <= p: continue
-
-			# Here we utilize the indices in a given iteration of the loop to
-			# create the dictionary keys, and initialize the associated values
-			# to an empty set.
-			if pindex not in M.processInputs:
-				M.processInputs[  pindex ] = set()
-				M.processOutputs[ pindex ] = set()
-			if (p, i) not in M.commodityDStreamProcess:
-				M.commodityDStreamProcess[p, i] = set()
-			if (p, o) not in M.commodityUStreamProcess:
-				M.commodityUStreamProcess[p, o] = set()
-			if (p, t, v, i) not in M.ProcessOutputsByInput:
-				M.ProcessOutputsByInput[p, t, v, i] = set()
-			if (p, t, v, o) not in M.ProcessInputsByOutput:
-				M.ProcessInputsByOutput[p, t, v, o] = set()
-			if t not in M.processTechs:
-					M.processTechs[t] = set()
+			l_process_periods[ l_process ] = [ p for p in l_built if v + l_lifetime > p ]
+
+	M.sparseDictsTiming[ 'efficiency' ] = time() - l_begin
+	l_begin = time()
+
+	# The second pass fills every dictionary in one go, each key being
+	# initialized to an empty set the first time it is seen.
+	for i, t, v, o in l_efficiency:
+		l_curtail = t in l_curtailment
+		l_base    = t in l_baseload
+		l_store   = t in l_storage
+		l_ramp    = t in l_ramping
+		l_res     = t in l_resource
+		l_rsv     = t in l_reserve
+
+		for p in l_process_periods[ t, v ]:
+			pindex = (p, t, v)
+			M.processInputs.setdefault( pindex, set() ).add( i )
+			M.processOutputs.setdefault( pindex, set() ).add( o )
+			M.commodityDStreamProcess.setdefault( (p, i), set() ).add( (t, v) )
+			M.commodityUStreamProcess.setdefault( (p, o), set() ).add( (t, v) )
+			M.ProcessOutputsByInput.setdefault( (p, t, v, i), set() ).add( o )
+			M.ProcessInputsByOutput.setdefault( (p, t, v, o), set() ).add( i )
+			M.processTechs.setdefault( t, set() ).add( (p, v) )
 			# While the dictionary just above indentifies the vintage (v)
 			# associated with each (p,t) we need to do the same below for various
 			# technology subsets.
-			if (p, t) not in M.processVintages:
-				M.processVintages[p, t] = set()
-			if t in M.tech_curtailment and (p, t) not in M.curtailmentVintages:
-				M.curtailmentVintages[p, t] = set()
-			if t in M.tech_baseload and (p, t) not in M.baseloadVintages:
-				M.baseloadVintages[p, t] = set()
-			if t in M.tech_storage and (p,t) not in M.storageVintages:
-				M.storageVintages[p,t] = set()
-			if t in M.tech_ramping and (p,t) not in M.rampVintages:
-				M.rampVintages[p,t] = set()
-			if (p, i, t) in M.TechInputSplit.sparse_iterkeys() and (p, i, t) not in M.inputsplitVintages:
-				M.inputsplitVintages[p,i,t] = set()
-			if (p, t, o) in M.TechOutputSplit.sparse_iterkeys() and (p, t, o) not in M.outputsplitVintages:
-				M.outputsplitVintages[p,t,o] = set()
-			if t in M.tech_resource and (p,o) not in M.ProcessByPeriodAndOutput:
-				M.ProcessByPeriodAndOutput[p,o] = set()
-			if t in M.tech_reserve and p not in M.processReservePeriods:
-					M.processReservePeriods[p] = set()
-
-			# Now that all of the keys have been defined, and values initialized
-			# to empty sets, we fill in the appropriate values for each
-			# dictionary.
-			M.processInputs[ pindex ].add( i )
-			M.processOutputs[pindex ].add( o )
-			M.commodityDStreamProcess[p, i].add( (t, v) )
-			M.commodityUStreamProcess[p, o].add( (t, v) )
-			M.ProcessOutputsByInput[p, t, v, i].add( o )
-			M.ProcessInputsByOutput[p, t, v, o].add( i )
-			M.processTechs[t].add( (p, v) )
-			M.processVintages[p, t].add( v )
-			if t in M.tech_curtailment:
-				M.curtailmentVintages[p, t].add( v )
-			if t in M.tech_baseload:
-				M.baseloadVintages[p, t].add( v )
-			if t in M.tech_storage:
-				M.storageVintages[p, t].add( v )
-			if t in M.tech_ramping:
-				M.rampVintages[p , t].add( v )
-			if (p, i, t) in M.TechInputSplit.sparse_iterkeys():
-				M.inputsplitVintages[p,i,t].add( v )
-			if (p, t, o) in M.TechOutputSplit.sparse_iterkeys():
-				M.outputsplitVintages[p,t,o].add( v )
-			if t in M.tech_resource:
-				M.ProcessByPeriodAndOutput[p,o].add(( i,t,v ))
-			if t in M.tech_reserve:
-				M.processReservePeriods[p].add( (t,v) )
-
+			M.processVintages.setdefault( (p, t), set() ).add( v )
+			if l_curtail:
+				M.curtailmentVintages.setdefault( (p, t), set() ).add( v )
+			if l_base:
+				M.baseloadVintages.setdefault( (p, t), set() ).add( v )
+			if l_store:
+				M.storageVintages.setdefault( (p, t), set() ).add( v )
+			if l_ramp:
+				M.rampVintages.setdefault( (p, t), set() ).add( v )
+			if (p, i, t) in l_input_splits:
+				M.inputsplitVintages.setdefault( (p, i, t), set() ).add( v )
+			if (p, t, o) in l_output_splits:
+				M.outputsplitVintages.setdefault( (p, t, o), set() ).add( v )
+			if l_res:
+				M.ProcessByPeriodAndOutput.setdefault( (p, o), set() ).add( (i, t, v) )
+			if l_rsv:
+				M.processReservePeriods.setdefault( p, set() ).add( (t, v) )
+
+	M.sparseDictsTiming[ 'process maps' ] = time() - l_begin
+	l_begin = time()
 
 	l_unused_techs = M.tech_all - l_used_techs
 	if l_unused_techs:
@@ -705,6 +711,64 @@ def CreateSparseDicts ( M ):
 	  if M.processVintages[ p, t ]
 	)
 
+	# Ordered periods of each tech with available capacity, and the period
+	# before each of them (None for the first one), for GrowthRateConstraint
+	for p, t in M.activeCapacityAvailable_pt:
+		M.capacityAvailablePeriods.setdefault( t, list() ).append( p )
+	for t, l_periods in M.capacityAvailablePeriods.items():
+		l_periods.sort()
+		for l_prev, p in zip( [None] + l_periods[:-1], l_periods ):
+			M.capacityAvailablePrevPeriod[p, t] = l_prev
+
+	M.sparseDictsTiming[ 'active indices' ] = time() - l_begin
+
+def CreateCostAndEmissionIndices ( M ):
+	"""
+	This function indexes the cost parameters by period and the emission
+	activities by period and emission commodity, so that PeriodCost_rule and
+	EmissionLimit_Constraint only visit the terms of their own period (and
+	emission), instead of scanning every key of the parameters.  It also
+	computes the discount factors of the objective function once for each
+	process.
+	"""
+	P_0 = min( M.time_optimize )
+	P_e = M.time_future.last()  # End point of modeled horizon
+	GDR = value( M.GlobalDiscountRate )
+	MPL = M.ModelProcessLife
+	x = 1 + GDR  # convenience variable, nothing more.
+
+	for t, v in M.CostInvest.sparse_iterkeys():
+		M.costInvestByPeriod.setdefault( v, list() ).append( (t, v) )
+		l_loan_life = value( M.LifetimeLoanProcess[t, v] )
+		l_life = value( M.LifetimeProcess[t, v] )
+		M.loanDiscount[t, v] = (
+		  l_loan_life if not GDR else
+		  x ** (P_0 - v + 1) * (1 - x ** (-l_loan_life)) / GDR
+		)
+		# Fraction of the loan paid within the model horizon
+		M.loanHorizonFrac[t, v] = (
+		  (1 - x ** (-min( l_life, P_e - v ))) / (1 - x ** (-l_life))
+		)
+
+	for p, t, v in MPL.sparse_iterkeys():
+		M.periodDiscount[p, t, v] = (
+		  value( MPL[p, t, v] ) if not GDR else
+		  x ** (P_0 - p + 1) * (1 - x ** (-value( MPL[p, t, v] ))) / GDR
+		)
+
+	for p, t, v in M.CostFixed.sparse_iterkeys():
+		M.costFixedByPeriod.setdefault( p, list() ).append( (t, v) )
+
+	for p, t, v in M.CostVariable.sparse_iterkeys():
+		M.costVariableByPeriod.setdefault( p, list() ).append( (t, v) )
+
+	# EmissionActivity is not indexed by p, so keep the (p, t, v) combinations
+	# of active processes only.
+	for e, i, t, v, o in M.EmissionActivity.sparse_iterkeys():
+		for p, S_v in M.processTechs.get( t, () ):
+			if S_v == v:
+				M.emissionActivityByPeriod.setdefault( (p, e), list() ).append( (i, t, v, o) )
+
 # ---------------------------------------------------------------
 # Create sparse parameter indices.
 # These functions are called from temoa_model.py and use the sparse keys 
@@ -0,0 +1,663 @@
+"""
+Tools for Energy Model Optimization and Analysis (Temoa):
+An open source framework for energy systems optimization modeling
+
+Copyright (C) 2015,  NC State University
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A complete copy of the GNU General Public License v2 (GPLv2) is available
+in LICENSE.txt.  Users uncompressing this from an archive may not have
+received this license file.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# ---------------------------------------------------------------------------
+# This module writes a Temoa instance as a sparse coefficient matrix (COO
+# arrays of rows, columns and values).  The core constraint families
+# (Capacity, CommodityBalance, Demand, Storage and Ramp) hold most of the
+# V_FlowOut terms, so they are not declared as Pyomo constraints at all (see
+# create_instance): their coefficients are generated straight from the sparse
+# dicts of CreateSparseDicts, which avoids building a Pyomo expression for
+# every term and walking it again in the LP writer.  The other constraints and
+# the objective are read from their Pyomo expressions.
+#
+# The matrix is written as an LP or MPS file and solved with the usual Pyomo
+# solver plugins, or handed to a solver API (csr), and the solution is stored
+# back in the instance variables, so that pformat_results works as usual.
+# ---------------------------------------------------------------------------
+
+__all__ = ('fast_constraints', 'create_instance', 'TemoaMatrix')
+
+from collections import defaultdict
+from os import close, path, remove
+from sys import stderr as SE
+import re
+import tempfile
+
+import numpy as np
+
+from pyomo.core import Constraint, Objective, Var, maximize, value
+from pyomo.repn import generate_standard_repn
+from pyutilib.services import TempfileManager
+
+from temoa_rules import (
+  CommodityBalance_Constraint, CommodityBalanceAnnual_Constraint,
+  Demand_Constraint
+)
+
+
+# Constraint families generated directly, in the order they are declared in
+# temoa_model.py.  The Ramp*Period constraints are always skipped by their rules.
+fast_constraints = (
+  'CapacityConstraint', 'CapacityAnnualConstraint', 'DemandConstraint',
+  'CommodityBalanceConstraint', 'CommodityBalanceAnnualConstraint',
+  'StorageEnergyConstraint', 'StorageEnergyUpperBoundConstraint',
+  'StorageChargeRateConstraint', 'StorageDischargeRateConstraint',
+  'StorageThroughputConstraint', 'StorageInitConstraint',
+  'RampUpConstraintDay', 'RampDownConstraintDay',
+  'RampUpConstraintSeason', 'RampDownConstraintSeason',
+  'RampUpConstraintPeriod', 'RampDownConstraintPeriod',
+)
+
+inf = float('inf')
+
+
+def create_instance ( model, data ):
+	"""
+	Creates an instance of (a copy of) the abstract model without the core
+	constraint families, which TemoaMatrix generates directly.  Their index
+	sets are kept.
+	"""
+	fast_model = model.clone()
+	for name in fast_constraints:
+		fast_model.del_component( name )
+
+	return fast_model.create_instance( data )
+
+
+def row_name ( name, index ):
+	# Name of a constraint, as given by Pyomo, e.g. DemandConstraint[1990,inter,day,RH]
+	if not isinstance( index, tuple ):
+		index = (index,)
+	return '%s[%s]' % (name, ','.join( str(i) for i in index ))
+
+
+def lp_label ( name ):
+	# Label of a variable or constraint in LP and MPS files, e.g. V_Capacity(E01_1960)
+	return re.sub( r'[^\w()]', '_', name.replace( '[', '(' ).replace( ']', ')' ))
+
+
+class TemoaMatrix( object ):
+	def __init__ ( self, instance ):
+		"""
+		Generates the coefficient matrix of instance.  Constraint families of
+		fast_constraints missing from instance (see create_instance) are
+		generated from the sparse dicts, all other constraints are read from
+		their Pyomo expressions.
+		"""
+		self.instance = instance
+
+		# Columns: every variable of the instance, in declaration order
+		self.variables = list()
+		self.column_names = list()
+		self.columns = dict()      # variable name -> { index: column }
+		self._column_of = dict()   # id of a variable -> column
+		for var in instance.component_objects( Var, active=True ):
+			columns = self.columns[ var.getname() ] = dict()
+			for index in var:
+				columns[ index ] = len( self.variables )
+				self._column_of[ id(var[ index ]) ] = len( self.variables )
+				self.variables.append( var[ index ] )
+				self.column_names.append( var[ index ].name )
+
+		self.col_lower = np.array([ -inf if v.lb is None else v.lb for v in self.variables ], dtype='float64' )
+		self.col_upper = np.array([ inf if v.ub is None else v.ub for v in self.variables ], dtype='float64' )
+		for j, v in enumerate( self.variables ):
+			if v.fixed:
+				self.col_lower[ j ] = self.col_upper[ j ] = value( v )
+
+		# Rows, stored as COO triplets
+		self.row_names = list()
+		self._lower = list()
+		self._upper = list()
+		self._rows = list()
+		self._cols = list()
+		self._vals = list()
+
+		self.add_objective()
+
+		generators = {
+		  'CapacityConstraint'               : self.add_capacity,
+		  'CapacityAnnualConstraint'         : self.add_capacity_annual,
+		  'DemandConstraint'                 : self.add_demand,
+		  'CommodityBalanceConstraint'       : self.add_commodity_balance,
+		  'CommodityBalanceAnnualConstraint' : self.add_commodity_balance_annual,
+		  'StorageEnergyConstraint'          : self.add_storage_energy,
+		  'StorageEnergyUpperBoundConstraint': self.add_storage_upper_bound,
+		  'StorageChargeRateConstraint'      : self.add_storage_charge,
+		  'StorageDischargeRateConstraint'   : self.add_storage_discharge,
+		  'StorageThroughputConstraint'      : self.add_storage_throughput,
+		  'StorageInitConstraint'            : self.add_storage_init,
+		  'RampUpConstraintDay'              : self.add_ramp_day,
+		  'RampDownConstraintDay'            : self.add_ramp_day,
+		  'RampUpConstraintSeason'           : self.add_ramp_season,
+		  'RampDownConstraintSeason'         : self.add_ramp_season,
+		}
+		for name in fast_constraints:
+			if instance.find_component( name ) is None and name in generators:
+				generators[ name ]( name )
+
+		for con in instance.component_objects( Constraint, active=True ):
+			for index in con:
+				self.add_expression_row( con[ index ].name, con[ index ] )
+
+		self.rows = np.array( self._rows, dtype='int64' )
+		self.cols = np.array( self._cols, dtype='int64' )
+		self.vals = np.array( self._vals, dtype='float64' )
+		self.row_lower = np.array( self._lower, dtype='float64' )
+		self.row_upper = np.array( self._upper, dtype='float64' )
+		del self._rows, self._cols, self._vals, self._lower, self._upper
+
+	# ---------------------------------------------------------------
+	# Rows
+	# ---------------------------------------------------------------
+
+	def add_row ( self, name, terms, lower, upper ):
+		# terms is a list of (column, coefficient); repeated columns are summed
+		coefs = defaultdict( float )
+		for j, coef in terms:
+			coefs[ j ] += coef
+		# Like Pyomo, leave out zero coefficients, e.g. of a zero capacity factor
+		coefs = dict( (j, coef) for j, coef in coefs.items() if coef )
+		if not coefs:
+			return
+		row = len( self.row_names )
+		self.row_names.append( name )
+		self._lower.append( lower )
+		self._upper.append( upper )
+		for j, coef in coefs.items():
+			self._rows.append( row )
+			self._cols.append( j )
+			self._vals.append( coef )
+
+	def add_expression_row ( self, name, con ):
+		repn = generate_standard_repn( con.body )
+		if not repn.is_linear():
+			raise Exception( 'Constraint %s is not linear.' % name )
+		terms = [ (self._column_of[ id(v) ], coef) for v, coef in zip( repn.linear_vars, repn.linear_coefs ) ]
+		lower = -inf if con.lower is None else value( con.lower ) - repn.constant
+		upper = inf if con.upper is None else value( con.upper ) - repn.constant
+		self.add_row( name, terms, lower, upper )
+
+	def add_objective ( self ):
+		objs = list( self.instance.component_data_objects( Objective, active=True ))
+		self.objective = np.zeros( len( self.variables ))
+		self.objective_constant = 0.0
+		self.objective_name = 'TotalCost'
+		self.sense = 1
+		if not objs:
+			return
+		obj = objs[0]
+		repn = generate_standard_repn( obj.expr )
+		if not repn.is_linear():
+			raise Exception( 'Objective %s is not linear.' % obj.getname() )
+		for v, coef in zip( repn.linear_vars, repn.linear_coefs ):
+			self.objective[ self._column_of[ id(v) ]] += coef
+		self.objective_constant = repn.constant
+		self.objective_name = obj.getname()
+		self.sense = -1 if obj.sense == maximize else 1
+
+	def flows ( self, p, s, d, t, v ):
+		# Columns of the V_FlowOut of process (t, v) in time slice (p, s, d)
+		M = self.instance
+		flow_out = self.columns[ 'V_FlowOut' ]
+		return [
+		  flow_out[ p, s, d, S_i, t, v, S_o ]
+		  for S_i in M.processInputs[ p, t, v ]
+		  for S_o in M.ProcessOutputsByInput[ p, t, v, S_i ]
+		]
+
+	def add_capacity ( self, name ):
+		M = self.instance
+		capacity = self.columns[ 'V_Capacity' ]
+		curtailment = self.columns[ 'V_Curtailment' ]
+		for p, s, d, t, v in M.CapacityConstraint_psdtv:
+			if t in M.tech_storage: continue
+			cap = (
+			  value( M.CapacityFactorProcess[s, d, t, v] )
+			  * value( M.CapacityToActivity[t] )
+			  * value( M.SegFrac[s, d] )
+			  * value( M.ProcessLifeFrac[p, t, v] )
+			)
+			terms = [ (capacity[ t, v ], cap) ]
+			terms.extend( (j, -1.0) for j in self.flows( p, s, d, t, v ))
+			if t in M.tech_curtailment:
+				terms.extend(
+				  (curtailment[ p, s, d, S_i, t, v, S_o ], -1.0)
+				  for S_i in M.processInputs[ p, t, v ]
+				  for S_o in M.ProcessOutputsByInput[ p, t, v, S_i ]
+				)
+				self.add_row( row_name( name, (p, s, d, t, v) ), terms, 0.0, 0.0 )
+			else:
+				self.add_row( row_name( name, (p, s, d, t, v) ), terms, 0.0, inf )
+
+	def add_capacity_annual ( self, name ):
+		M = self.instance
+		capacity = self.columns[ 'V_Capacity' ]
+		flow_annual = self.columns[ 'V_FlowOutAnnual' ]
+		for p, t, v in M.CapacityAnnualConstraint_ptv:
+			cap = value( M.CapacityToActivity[t] ) * value( M.ProcessLifeFrac[p, t, v] )
+			terms = [ (capacity[ t, v ], cap) ]
+			terms.extend(
+			  (flow_annual[ p, S_i, t, v, S_o ], -1.0)
+			  for S_i in M.processInputs[ p, t, v ]
+			  for S_o in M.ProcessOutputsByInput[ p, t, v, S_i ]
+			)
+			self.add_row( row_name( name, (p, t, v) ), terms, 0.0, inf )
+
+	def add_demand ( self, name ):
+		M = self.instance
+		flow_out = self.columns[ 'V_FlowOut' ]
+		flow_annual = self.columns[ 'V_FlowOutAnnual' ]
+		DSD_keys = set( M.DemandSpecificDistribution.sparse_keys() )
+		for p, s, d, dem in M.DemandConstraint_psdc:
+			if (s, d, dem) not in DSD_keys: continue
+			terms = list()
+			for S_t, S_v in M.commodityUStreamProcess[ p, dem ]:
+				for S_i in M.ProcessInputsByOutput[ p, S_t, S_v, dem ]:
+					if S_t not in M.tech_annual:
+						terms.append( (flow_out[ p, s, d, S_i, S_t, S_v, dem ], 1.0) )
+					else:
+						terms.append( (flow_annual[ p, S_i, S_t, S_v, dem ], value( M.SegFrac[s, d] )) )
+			if not terms:
+				# Raises the error message of the rule
+				Demand_Constraint( M, p, s, d, dem )
+			rhs = value( M.Demand[p, dem] ) * value( M.DemandSpecificDistribution[s, d, dem] )
+			self.add_row( row_name( name, (p, s, d, dem) ), terms, rhs, rhs )
+
+	def add_commodity_balance ( self, name ):
+		M = self.instance
+		flow_out = self.columns[ 'V_FlowOut' ]
+		flow_annual = self.columns[ 'V_FlowOutAnnual' ]
+		flow_in = self.columns[ 'V_FlowIn' ]
+		for p, s, d, c in M.CommodityBalanceConstraint_psdc:
+			if c in M.commodity_demand: continue
+			terms = list()
+			for S_t, S_v in M.commodityUStreamProcess[ p, c ]:
+				for S_i in M.ProcessInputsByOutput[ p, S_t, S_v, c ]:
+					if (p, s, d, S_i, S_t, S_v, c) not in flow_out:
+						# Raises the error message of the rule (annual producer)
+						CommodityBalance_Constraint( M, p, s, d, c )
+					terms.append( (flow_out[ p, s, d, S_i, S_t, S_v, c ], 1.0) )
+			if not terms:
+				CommodityBalance_Constraint( M, p, s, d, c )
+			for S_t, S_v in M.commodityDStreamProcess[ p, c ]:
+				for S_o in M.ProcessOutputsByInput[ p, S_t, S_v, c ]:
+					if S_t in M.tech_storage:
+						terms.append( (flow_in[ p, s, d, c, S_t, S_v, S_o ], -1.0) )
+					elif S_t not in M.tech_annual:
+						terms.append( (flow_out[ p, s, d, c, S_t, S_v, S_o ],
+						  -1.0 / value( M.Efficiency[c, S_t, S_v, S_o] )) )
+					else:
+						terms.append( (flow_annual[ p, c, S_t, S_v, S_o ],
+						  -value( M.SegFrac[s, d] ) / value( M.Efficiency[c, S_t, S_v, S_o] )) )
+			self.add_row( row_name( name, (p, s, d, c) ), terms, 0.0, 0.0 )
+
+	def add_commodity_balance_annual ( self, name ):
+		M = self.instance
+		flow_out = self.columns[ 'V_FlowOut' ]
+		flow_annual = self.columns[ 'V_FlowOutAnnual' ]
+		for p, c in M.CommodityBalanceAnnualConstraint_pc:
+			if c in M.commodity_demand: continue
+			terms = [
+			  (flow_annual[ p, S_i, S_t, S_v, c ], 1.0)
+			  for S_t, S_v in M.commodityUStreamProcess[ p, c ]
+			  for S_i in M.ProcessInputsByOutput[ p, S_t, S_v, c ]
+			]
+			if not terms:
+				CommodityBalanceAnnual_Constraint( M, p, c )
+			for S_t, S_v in M.commodityDStreamProcess[ p, c ]:
+				for S_o in M.ProcessOutputsByInput[ p, S_t, S_v, c ]:
+					eff = value( M.Efficiency[c, S_t, S_v, S_o] )
+					if S_t in M.tech_annual:
+						terms.append( (flow_annual[ p, c, S_t, S_v, S_o ], -1.0 / eff) )
+					else:
+						terms.extend(
+						  (flow_out[ p, s, d, c, S_t, S_v, S_o ], -1.0 / eff)
+						  for d in M.time_of_day
+						  for s in M.time_season
+						)
+			self.add_row( row_name( name, (p, c) ), terms, 0.0, 0.0 )
+
+	def storage_terms ( self, p, s, d, t, v, sign_charge, sign_discharge ):
+		# Efficiency weighted V_FlowIn (charge) and V_FlowOut (discharge) of
+		# storage process (t, v) in time slice (p, s, d)
+		M = self.instance
+		flow_out = self.columns[ 'V_FlowOut' ]
+		flow_in = self.columns[ 'V_FlowIn' ]
+		terms = [
+		  (flow_in[ p, s, d, S_i, t, v, S_o ], sign_charge * value( M.Efficiency[S_i, t, v, S_o] ))
+		  for S_i in M.processInputs[ p, t, v ]
+		  for S_o in M.ProcessOutputsByInput[ p, t, v, S_i ]
+		]
+		terms.extend(
+		  (flow_out[ p, s, d, S_i, t, v, S_o ], sign_discharge)
+		  for S_o in M.processOutputs[ p, t, v ]
+		  for S_i in M.ProcessInputsByOutput[ p, t, v, S_o ]
+		)
+		return terms
+
+	def add_storage_energy ( self, name ):
+		M = self.instance
+		level = self.columns[ 'V_StorageLevel' ]
+		init = self.columns[ 'V_StorageInit' ]
+		d_first, d_last = M.time_of_day.first(), M.time_of_day.last()
+		s_first, s_last = M.time_season.first(), M.time_season.last()
+		for p, s, d, t, v in M.StorageConstraints_psdtv:
+			# level - previous level - charge + discharge == 0, the previous
+			# level of the first time slice being StorageInit and the level of
+			# the last time slice being StorageInit as well
+			terms = self.storage_terms( p, s, d, t, v, -1.0, 1.0 )
+			if d == d_last and s == s_last:
+				terms = [ (j, -coef) for j, coef in terms ]
+				terms.append( (level[ p, s, M.time_of_day.prev( d ), t, v ], 1.0) )
+				terms.append( (init[ t, v ], -1.0) )
+			elif d == d_first and s == s_first:
+				terms.append( (level[ p, s, d, t, v ], 1.0) )
+				terms.append( (init[ t, v ], -1.0) )
+			elif d == d_first:
+				terms.append( (level[ p, s, d, t, v ], 1.0) )
+				terms.append( (level[ p, M.time_season.prev( s ), d_last, t, v ], -1.0) )
+			else:
+				terms.append( (level[ p, s, d, t, v ], 1.0) )
+				terms.append( (level[ p, s, M.time_of_day.prev( d ), t, v ], -1.0) )
+			self.add_row( row_name( name, (p, s, d, t, v) ), terms, 0.0, 0.0 )
+
+	def energy_capacity ( self, p, s, t, v ):
+		# Energy capacity of storage process (t, v) per unit of V_Capacity
+		M = self.instance
+		return (
+		  value( M.CapacityToActivity[t] )
+		  * (value( M.StorageDuration[t] ) / 8760)
+		  * sum( value( M.SegFrac[s, S_d] ) for S_d in M.time_of_day ) * 365
+		  * value( M.ProcessLifeFrac[p, t, v] )
+		)
+
+	def slice_capacity ( self, p, s, d, t, v ):
+		# Activity of storage process (t, v) in a time slice per unit of V_Capacity
+		M = self.instance
+		return (
+		  value( M.CapacityToActivity[t] )
+		  * value( M.SegFrac[s, d] )
+		  * value( M.ProcessLifeFrac[p, t, v] )
+		)
+
+	def add_storage_upper_bound ( self, name ):
+		M = self.instance
+		level = self.columns[ 'V_StorageLevel' ]
+		capacity = self.columns[ 'V_Capacity' ]
+		for p, s, d, t, v in M.StorageConstraints_psdtv:
+			terms = [ (level[ p, s, d, t, v ], 1.0),
+			  (capacity[ t, v ], -self.energy_capacity( p, s, t, v )) ]
+			self.add_row( row_name( name, (p, s, d, t, v) ), terms, -inf, 0.0 )
+
+	def add_storage_charge ( self, name ):
+		M = self.instance
+		capacity = self.columns[ 'V_Capacity' ]
+		for p, s, d, t, v in M.StorageConstraints_psdtv:
+			terms = self.storage_terms( p, s, d, t, v, 1.0, 0.0 )
+			terms.append( (capacity[ t, v ], -self.slice_capacity( p, s, d, t, v )) )
+			self.add_row( row_name( name, (p, s, d, t, v) ), terms, -inf, 0.0 )
+
+	def add_storage_discharge ( self, name ):
+		M = self.instance
+		capacity = self.columns[ 'V_Capacity' ]
+		for p, s, d, t, v in M.StorageConstraints_psdtv:
+			terms = self.storage_terms( p, s, d, t, v, 0.0, 1.0 )
+			terms.append( (capacity[ t, v ], -self.slice_capacity( p, s, d, t, v )) )
+			self.add_row( row_name( name, (p, s, d, t, v) ), terms, -inf, 0.0 )
+
+	def add_storage_throughput ( self, name ):
+		M = self.instance
+		capacity = self.columns[ 'V_Capacity' ]
+		for p, s, d, t, v in M.StorageConstraints_psdtv:
+			terms = self.storage_terms( p, s, d, t, v, 1.0, 1.0 )
+			terms.append( (capacity[ t, v ], -self.slice_capacity( p, s, d, t, v )) )
+			self.add_row( row_name( name, (p, s, d, t, v) ), terms, -inf, 0.0 )
+
+	def add_storage_init ( self, name ):
+		M = self.instance
+		capacity = self.columns[ 'V_Capacity' ]
+		init = self.columns[ 'V_StorageInit' ]
+		s = M.time_season.first()
+		for t, v in M.StorageInitConstraint_tv:
+			terms = [ (init[ t, v ], 1.0),
+			  (capacity[ t, v ], -self.energy_capacity( v, s, t, v ) * value( M.StorageInitFrac[t, v] )) ]
+			self.add_row( row_name( name, (t, v) ), terms, 0.0, 0.0 )
+
+	def ramp_row ( self, name, index, p, t, v, slice_now, slice_prev ):
+		# (activity in slice_now / SegFrac - activity in slice_prev / SegFrac)
+		# / CapacityToActivity <= RampUp * V_Capacity, or >= -RampDown * V_Capacity
+		M = self.instance
+		c2a = value( M.CapacityToActivity[t] )
+		coef_now = (1.0 / value( M.SegFrac[slice_now] )) / c2a
+		coef_prev = (1.0 / value( M.SegFrac[slice_prev] )) / c2a
+		terms = [ (j, coef_now) for j in self.flows( p, slice_now[0], slice_now[1], t, v ) ]
+		terms.extend( (j, -coef_prev) for j in self.flows( p, slice_prev[0], slice_prev[1], t, v ))
+		capacity = self.columns[ 'V_Capacity' ][ t, v ]
+		if name.startswith( 'RampUp' ):
+			terms.append( (capacity, -value( M.RampUp[t] )) )
+			self.add_row( row_name( name, index ), terms, -inf, 0.0 )
+		else:
+			terms.append( (capacity, value( M.RampDown[t] )) )
+			self.add_row( row_name( name, index ), terms, 0.0, inf )
+
+	def add_ramp_day ( self, name ):
+		M = self.instance
+		d_first = M.time_of_day.first()
+		for p, s, d, t, v in M.RampConstraintDay_psdtv:
+			if d == d_first: continue
+			self.ramp_row( name, (p, s, d, t, v), p, t, v, (s, d), (s, M.time_of_day.prev( d )) )
+
+	def add_ramp_season ( self, name ):
+		M = self.instance
+		s_first = M.time_season.first()
+		d_first, d_last = M.time_of_day.first(), M.time_of_day.last()
+		for p, s, t, v in M.RampConstraintSeason_pstv:
+			if s == s_first: continue
+			self.ramp_row( name, (p, s, t, v), p, t, v, (s, d_first), (M.time_season.prev( s ), d_last) )
+
+	# ---------------------------------------------------------------
+	# Output
+	# ---------------------------------------------------------------
+
+	def shape ( self ):
+		return (len( self.row_names ), len( self.variables ))
+
+	def csr ( self ):
+		"""
+		Returns the matrix as a scipy.sparse.csr_matrix, for solver APIs
+		along with objective, row_lower, row_upper, col_lower and col_upper.
+		"""
+		from scipy.sparse import coo_matrix
+		return coo_matrix( (self.vals, (self.rows, self.cols)), shape=self.shape() ).tocsr()
+
+	def write ( self, filename ):
+		"""Writes the matrix as an LP (.lp) or free MPS (.mps) file."""
+		if path.splitext( filename )[1] == '.mps':
+			self.write_mps( filename )
+		else:
+			self.write_lp( filename )
+
+	def write_lp ( self, filename ):
+		names = [ lp_label( name ) for name in self.column_names ]
+		row_names = [ lp_label( name ) for name in self.row_names ]
+		objective_name = lp_label( self.objective_name )
+		n_rows = len( self.row_names )
+		order = np.argsort( self.rows, kind='mergesort' )
+		starts = np.searchsorted( self.rows[ order ], np.arange( n_rows + 1 ))
+
+		with open( filename, 'w' ) as f:
+			f.write( '\\* Temoa matrix *\\\n\n' )
+			f.write( ('max' if self.sense < 0 else 'min') + '\n%s:\n' % objective_name )
+			for j in np.nonzero( self.objective )[0]:
+				f.write( '%+.17g %s\n' % (self.objective[ j ], names[ j ]) )
+			if self.objective_constant:
+				f.write( '%+.17g ONE_VAR_CONSTANT\n' % self.objective_constant )
+
+			f.write( '\ns.t.\n' )
+			for r in range( n_rows ):
+				lower, upper = self.row_lower[ r ], self.row_upper[ r ]
+				ind = order[ starts[ r ]:starts[ r + 1 ]]
+				body = ''.join( '%+.17g %s\n' % (self.vals[ k ], names[ self.cols[ k ]]) for k in ind )
+				name = row_names[ r ]
+				if lower == upper:
+					f.write( '%s:\n%s= %.17g\n\n' % (name, body, upper) )
+					continue
+				# Ranged rows are written as two rows
+				if lower > -inf:
+					f.write( '%s:\n%s>= %.17g\n\n' % (name + ('_l' if upper < inf else ''), body, lower) )
+				if upper < inf:
+					f.write( '%s:\n%s<= %.17g\n\n' % (name + ('_u' if lower > -inf else ''), body, upper) )
+
+			f.write( 'bounds\n' )
+			for j in range( len( names )):
+				lb, ub = self.col_lower[ j ], self.col_upper[ j ]
+				if lb == 0 and ub == inf: continue
+				if lb == ub:
+					f.write( ' %s = %.17g\n' % (names[ j ], lb) )
+				elif lb == -inf and ub == inf:
+					f.write( ' %s free\n' % names[ j ] )
+				else:
+					f.write( ' %s <= %s <= %s\n' % (
+					  '-inf' if lb == -inf else '%.17g' % lb, names[ j ],
+					  '+inf' if ub == inf else '%.17g' % ub) )
+			if self.objective_constant:
+				f.write( ' ONE_VAR_CONSTANT = 1\n' )
+			f.write( 'end\n' )
+
+	def write_mps ( self, filename ):
+		names = [ lp_label( name ) for name in self.column_names ]
+		row_names = [ lp_label( name ) for name in self.row_names ]
+		objective_name = lp_label( self.objective_name )
+		order = np.lexsort( (self.rows, self.cols) )
+		starts = np.searchsorted( self.cols[ order ], np.arange( len( names ) + 1 ))
+
+		with open( filename, 'w' ) as f:
+			f.write( 'NAME Temoa\n' )
+			if self.sense < 0:
+				f.write( 'OBJSENSE\n    MAX\n' )
+			f.write( 'ROWS\n N %s\n' % objective_name )
+			for name, lower, upper in zip( row_names, self.row_lower, self.row_upper ):
+				sense = 'E' if lower == upper else ('L' if lower == -inf else 'G')
+				f.write( ' %s %s\n' % (sense, name) )
+
+			f.write( 'COLUMNS\n' )
+			for j in range( len( names )):
+				if self.objective[ j ]:
+					f.write( ' %s %s %.17g\n' % (names[ j ], objective_name, self.objective[ j ]) )
+				for k in order[ starts[ j ]:starts[ j + 1 ]]:
+					f.write( ' %s %s %.17g\n' % (names[ j ], row_names[ self.rows[ k ]], self.vals[ k ]) )
+			if self.objective_constant:
+				f.write( ' ONE_VAR_CONSTANT %s %.17g\n' % (objective_name, self.objective_constant) )
+
+			f.write( 'RHS\n' )
+			for name, lower, upper in zip( row_names, self.row_lower, self.row_upper ):
+				rhs = upper if lower == -inf else lower
+				if rhs:
+					f.write( ' RHS %s %.17g\n' % (name, rhs) )
+
+			f.write( 'RANGES\n' )
+			for name, lower, upper in zip( row_names, self.row_lower, self.row_upper ):
+				if -inf < lower < upper < inf:
+					f.write( ' RNG %s %.17g\n' % (name, upper - lower) )
+
+			f.write( 'BOUNDS\n' )
+			for j in range( len( names )):
+				lb, ub = self.col_lower[ j ], self.col_upper[ j ]
+				if lb == 0 and ub == inf: continue
+				if lb == ub:
+					f.write( ' FX BND %s %.17g\n' % (names[ j ], lb) )
+					continue
+				if lb == -inf and ub == inf:
+					f.write( ' FR BND %s\n' % names[ j ] )
+					continue
+				if lb == -inf:
+					f.write( ' MI BND %s\n' % names[ j ] )
+				elif lb != 0:
+					f.write( ' LO BND %s %.17g\n' % (names[ j ], lb) )
+				if ub < inf:
+					f.write( ' UP BND %s %.17g\n' % (names[ j ], ub) )
+			if self.objective_constant:
+				f.write( ' FX BND ONE_VAR_CONSTANT 1\n' )
+			f.write( 'ENDATA\n' )
+
+	# ---------------------------------------------------------------
+	# Solution
+	# ---------------------------------------------------------------
+
+	def solve ( self, optimizer, keepfiles=False, file_format='lp' ):
+		"""
+		Writes the matrix to a file (in the Pyomo temporary directory, e.g.
+		lp_files), solves it with optimizer (a Pyomo SolverFactory solver) and
+		stores the solution in the instance.
+		Returns the Pyomo results, to be used with pformat_results.
+		"""
+		handle, filename = tempfile.mkstemp(
+		  suffix='.' + file_format, prefix='temoa_matrix_', dir=TempfileManager.tempdir )
+		close( handle )
+		self.write( filename )
+		try:
+			results = optimizer.solve( filename, keepfiles=keepfiles )
+		finally:
+			if keepfiles:
+				SE.write( 'Matrix file: %s\n' % filename )
+			else:
+				remove( filename )
+
+		if len( results.solution ) > 0:
+			solution = results.solution[0]
+			column = dict( (lp_label( name ), j) for j, name in enumerate( self.column_names ))
+			x = np.zeros( len( self.variables ))
+			for label, data in solution.variable.items():
+				if label in column:
+					x[ column[ label ]] = data[ 'Value' ]
+			self.load_solution( x )
+
+			# Report the solution with the names of the instance, as
+			# instance.solutions.store_to does.  Ranged rows were split in two.
+			row = dict( (lp_label( name ), name) for name in self.row_names )
+			constraints = dict()
+			for label, data in solution.constraint.items():
+				if label not in row and label[-2:] in ('_l', '_u'):
+					label = label[:-2]
+				if label in row:
+					constraints[ row[ label ]] = data
+			solution.variable.clear()
+			solution.variable.update( (var.name, {'Value': var.value}) for var in self.variables )
+			solution.constraint.clear()
+			solution.constraint.update( constraints )
+		return results
+
+	def load_solution ( self, x ):
+		"""
+		Stores the solution vector x (one value per column) in the instance
+		variables, e.g. before collect_svars or pformat_results.
+		"""
+		for var, val in zip( self.variables, x ):
+			if not var.fixed:
+				var.value = float( val )
+
+	def svars ( self, x ):
+		"""Returns the svars of pformat_results for the solution vector x."""
+		from pformat_results import collect_svars
+		self.load_solution( x )
+		return collect_svars( self.instance )
@@ -340,64 +340,38 @@ loan rates and periods.
 
 
 def PeriodCost_rule(M, p):
-    P_0 = min(M.time_optimize)
-    P_e = M.time_future.last()  # End point of modeled horizon
-    GDR = value(M.GlobalDiscountRate)
-    MLL = M.ModelLoanLife
-    MPL = M.ModelProcessLife
-    x = 1 + GDR  # convenience variable, nothing more.
-
+    # Keys of the cost parameters by period and discount factors are computed
+    # once in CreateCostAndEmissionIndices
     loan_costs = sum(
         M.V_Capacity[S_t, S_v]
         * (
             value(M.CostInvest[S_t, S_v])
             * value(M.LoanAnnualize[S_t, S_v])
-            * (
-                value(M.LifetimeLoanProcess[S_t, S_v])
-                if not GDR
-                else (
-                    x ** (P_0 - S_v + 1)
-                    * (1 - x ** (-value(M.LifetimeLoanProcess[S_t, S_v])))
-                    / GDR
-                )
-            )
-        )
-        * (
-            (1 - x ** (-min(value(M.LifetimeProcess[S_t, S_v]), P_e - S_v)))
-            / (1 - x ** (-value(M.LifetimeProcess[S_t, S_v])))
+            * M.loanDiscount[S_t, S_v]
         )
-        for S_t, S_v in M.CostInvest.sparse_iterkeys()
-        if S_v == p
+        * M.loanHorizonFrac[S_t, S_v]
+        for S_t, S_v in M.costInvestByPeriod.get(p, ())
     )
 
     fixed_costs = sum(
         M.V_Capacity[S_t, S_v]
         * (
             value(M.CostFixed[p, S_t, S_v])
-            * (
-                value(MPL[p, S_t, S_v])
-                if not GDR
-                else (x ** (P_0 - p + 1) * (1 - x ** (-value(MPL[p, S_t, S_v]))) / GDR)
-            )
+            * M.periodDiscount[p, S_t, S_v]
         )
-        for S_p, S_t, S_v in M.CostFixed.sparse_iterkeys()
-        if S_p == p
+        for S_t, S_v in M.costFixedByPeriod.get(p, ())
     )
 
     variable_costs = sum(
         M.V_FlowOut[p, s, d, S_i, S_t, S_v, S_o]
         * (
             value(M.CostVariable[p, S_t, S_v])
-            * (
-                value(MPL[p, S_t, S_v])
-                if not GDR
-                else (x ** (P_0 - p + 1) * (1 - x ** (-value(MPL[p, S_t, S_v]))) / GDR)
-            )
+            * M.periodDiscount[p, S_t, S_v]
         )
-        for S_p, S_t, S_v in M.CostVariable.sparse_iterkeys()
-        if S_p == p and S_t not in M.tech_annual
-        for S_i in M.processInputs[S_p, S_t, S_v]
-        for S_o in M.ProcessOutputsByInput[S_p, S_t, S_v, S_i]
+        for S_t, S_v in M.costVariableByPeriod.get(p, ())
+        if S_t not in M.tech_annual
+        for S_i in M.processInputs[p, S_t, S_v]
+        for S_o in M.ProcessOutputsByInput[p, S_t, S_v, S_i]
         for s in M.time_season
         for d in M.time_of_day       
     )
@@ -406,16 +380,12 @@ def PeriodCost_rule(M, p):
         M.V_FlowOutAnnual[p, S_i, S_t, S_v, S_o]
         * (
             value(M.CostVariable[p, S_t, S_v])
-            * (
-                value(MPL[p, S_t, S_v])
-                if not GDR
-                else (x ** (P_0 - p + 1) * (1 - x ** (-value(MPL[p, S_t, S_v]))) / GDR)
-            )
+            * M.periodDiscount[p, S_t, S_v]
         )
-        for S_p, S_t, S_v in M.CostVariable.sparse_iterkeys()
-        if S_p == p and S_t in M.tech_annual
-        for S_i in M.processInputs[S_p, S_t, S_v]
-        for S_o in M.ProcessOutputsByInput[S_p, S_t, S_v, S_i]     
+        for S_t, S_v in M.costVariableByPeriod.get(p, ())
+        if S_t in M.tech_annual
+        for S_i in M.processInputs[p, S_t, S_v]
+        for S_o in M.ProcessOutputsByInput[p, S_t, S_v, S_i]     
     )    
 
     period_costs = loan_costs + fixed_costs + variable_costs + variable_costs_annual
@@ -1443,13 +1413,13 @@ output in separate terms.
 """
     emission_limit = M.EmissionLimit[p, e]
     
+    # EmissionsActivity not indexed by p, so only the keys of processes active
+    # in p are kept (CreateCostAndEmissionIndices)
     actual_emissions = sum(
         M.V_FlowOut[p, S_s, S_d, S_i, S_t, S_v, S_o]
         * M.EmissionActivity[e, S_i, S_t, S_v, S_o]
-        for tmp_e, S_i, S_t, S_v, S_o in M.EmissionActivity.sparse_iterkeys()
-        if tmp_e == e and S_t not in M.tech_annual
-        # EmissionsActivity not indexed by p, so make sure (p,t,v) combos valid
-        if (p, S_t, S_v) in M.processInputs.keys()
+        for S_i, S_t, S_v, S_o in M.emissionActivityByPeriod.get((p, e), ())
+        if S_t not in M.tech_annual
         for S_s in M.time_season
         for S_d in M.time_of_day
     )
@@ -1457,10 +1427,8 @@ output in separate terms.
     actual_emissions_annual = sum(
         M.V_FlowOutAnnual[p, S_i, S_t, S_v, S_o]
         * M.EmissionActivity[e, S_i, S_t, S_v, S_o]
-        for tmp_e, S_i, S_t, S_v, S_o in M.EmissionActivity.sparse_iterkeys()
-        if tmp_e == e and S_t in M.tech_annual
-        # EmissionsActivity not indexed by p, so make sure (p,t,v) combos valid
-        if (p, S_t, S_v) in M.processInputs.keys()
+        for S_i, S_t, S_v, S_o in M.emissionActivityByPeriod.get((p, e), ())
+        if S_t in M.tech_annual
     )    
 
     if int is type(actual_emissions + actual_emissions_annual):
@@ -1498,18 +1466,15 @@ horizon.
     GRM = value(M.GrowthRateMax[t])
     CapPT = M.V_CapacityAvailableByPeriodAndTech
 
-    periods = sorted(set(p_ for p_, t_ in CapPT if t_ == t))
-
-    if p not in periods:
+    # Periods of each tech are ordered once in CreateSparseDicts
+    if (p, t) not in M.capacityAvailablePrevPeriod:
         return Constraint.Skip
 
-    if p == periods[0]:
+    p_prev = M.capacityAvailablePrevPeriod[p, t]
+    if p_prev is None:
         expr = CapPT[p, t] <= GRS
 
     else:
-        p_prev = periods.index(p)
-        p_prev = periods[p_prev - 1]
-
         expr = CapPT[p, t] <= GRM * CapPT[p_prev, t] + GRS
 
     return expr
@@ -26,9 +26,10 @@ from shutil import copyfile, move
 
 from pyomo.opt import SolverFactory as SF
 from pyomo.opt import SolverManagerFactory
+from pyomo.solvers.plugins.solvers.persistent_solver import PersistentSolver
 from pyomo.environ import *
 
-from temoa_config import TemoaConfig
+from temoa_config import TemoaConfig, load_db
 
 import errno, warnings
 import re as reg_exp
@@ -48,6 +49,7 @@ import sys, os, gc
 from pyomo.environ import DataPortal
 
 from pformat_results import pformat_results
+from temoa_matrix import TemoaMatrix, create_instance as create_matrix_instance
 
 from collections import defaultdict
 from temoa_rules import TotalCost_rule, ActivityByTech_Constraint
@@ -153,19 +155,29 @@ class TemoaSolver(object):
 		# The MGA algorithm uses different objectives per iteration, so the first
 		# step is to remove the original objective function
 		self.model.del_component( 'TotalCost' )
-		# Create concrete model
-		temoaInstance1 = TemoaSolverInstance(self.model, self.optimizer, self.options, self.txt_file)
+
+		# The instance is created once and shared by all MGA iterations, which
+		# only change the objective.  With a persistent solver interface (e.g.
+		# cplex_persistent), the solver keeps its model between iterations and
+		# re-optimizes from the previous basis.
+		optimizer = self.optimizer
+		if not self.options.neos:
+			optimizer = get_persistent_solver( self.options.solver ) or self.optimizer
+		temoaInstance1 = TemoaSolverInstance(self.model, optimizer, self.options, self.txt_file)
 		for k in temoaInstance1.create_temoa_instance():
 			# yield "<div>" + k + "</div>"
 			yield k
 			#yield " " * 1024
 		# Now add back the objective function that we earlier removed; note that name
 		# we choose here (FirstObj) will be copied to the output file.
-		temoaInstance1.instance.FirstObj = Objective( rule=TotalCost_rule, sense=minimize )
-		temoaInstance1.instance.preprocess()
-		temoaInstance1.instance.V_ActivityByTech = Var(temoaInstance1.instance.tech_all, domain=NonNegativeReals)
-		temoaMGAInstance.instance.ActivityByTechConstraint = Constraint(M.tech_all, rule=ActivityByTech_Constraint)
-		
+		instance = temoaInstance1.instance
+		instance.FirstObj = Objective( rule=TotalCost_rule, sense=minimize )
+		instance.V_ActivityByTech = Var(instance.tech_all, domain=NonNegativeReals)
+		instance.ActivityByTechConstraint = Constraint(instance.tech_all, rule=ActivityByTech_Constraint)
+		instance.preprocess()
+		if temoaInstance1.persistent():
+			optimizer.set_instance( instance, symbolic_solver_labels=self.options.keepPyomoLP )
+
 		for k in temoaInstance1.solve_temoa_instance():
 			# yield "<div>" + k + "</div>"
 			yield k
@@ -175,21 +187,25 @@ class TemoaSolver(object):
 		# using value() converts the now-loaded results into a single number,
 		# which we'll use with our slightly unusual SlackedObjective_rule below
 		# (but defined above).
-		Perfect_Foresight_Obj = value( temoaInstance1.instance.FirstObj )
+		Perfect_Foresight_Obj = value( instance.FirstObj )
 
 		# Create a new dictionary that stores the MGA objective function weights
 		prev_activity_t = defaultdict( int )
 		# Store first set of MGA objective weights drawn from base solution
-		prev_activity_t = PreviousAct_rule( temoaInstance1.instance, self.options.mga_weight, prev_activity_t )
+		prev_activity_t = PreviousAct_rule( instance, self.options.mga_weight, prev_activity_t )
+
+		# The slacked objective constraint is the same for every iteration
+		instance.del_component( 'FirstObj' )
+		instance.PreviousSlackedObjective = Constraint(
+		rule=None,
+		expr=SlackedObjective_rule( instance, Perfect_Foresight_Obj, self.options.mga ),
+		noruleinit=True
+		)
+		if temoaInstance1.persistent():
+			optimizer.add_constraint( instance.PreviousSlackedObjective )
 
 		# Perform MGA iterations
 		while self.options.next_mga():
-			temoaMGAInstance = TemoaSolverInstance(self.model, self.optimizer, self.options, self.txt_file)
-			for k in temoaMGAInstance.create_temoa_instance():
-				# yield "<div>" + k + "</div>"
-				yield k
-				#yield " " * 1024
-
 			try:
 				txt_file_mga = open(self.options.path_to_logs+os.sep+"Complete_OutputLog.log", "w")
 			except BaseException as io_exc:
@@ -197,26 +213,23 @@ class TemoaSolver(object):
 				SE.write("MGA Log file cannot be opened. Please check path. Trying to find:\n"+self.options.path_to_logs+" folder\n")
 				txt_file_mga = open("OutputLog_MGA_last.log", "w")
 
-			# Update second instance with the new MGA-specific objective function
-			# and constraint.
-			temoaMGAInstance.instance.SecondObj = Objective(
-			expr=ActivityObj_rule( temoaMGAInstance.instance, prev_activity_t ),
+			# Update the instance with the new MGA-specific objective function
+			instance.del_component( 'SecondObj' )
+			instance.SecondObj = Objective(
+			expr=ActivityObj_rule( instance, prev_activity_t ),
 			noruleinit=True,
 			sense=minimize
 			)
-			temoaMGAInstance.instance.PreviousSlackedObjective = Constraint(
-			rule=None,
-			expr=SlackedObjective_rule( temoaMGAInstance.instance, Perfect_Foresight_Obj, self.options.mga ),
-			noruleinit=True
-			)
-			temoaMGAInstance.instance.preprocess()
-			for k in temoaMGAInstance.solve_temoa_instance():
+			instance.preprocess()
+			if temoaInstance1.persistent():
+				optimizer.set_objective( instance.SecondObj )
+			for k in temoaInstance1.solve_temoa_instance():
 				# yield "<div>" + k + "</div>"
 				yield k
 				#yield " " * 1024
-			temoaMGAInstance.handle_files(log_name='Complete_OutputLog.log' )
+			temoaInstance1.handle_files(log_name='Complete_OutputLog.log' )
 			#Update MGA objective function weights for use in the next iteration
-			prev_activity_t = PreviousAct_rule( temoaMGAInstance.instance, self.options.mga_weight, prev_activity_t )
+			prev_activity_t = PreviousAct_rule( instance, self.options.mga_weight, prev_activity_t )
 
 
 	'''
@@ -299,6 +312,15 @@ class TemoaSolverInstance(object):
 		self.optimizer = optimizer
 		self.txt_file = txt_file
 
+	def persistent (self):
+		"""True if the optimizer is a persistent solver interface."""
+		return isinstance( self.optimizer, PersistentSolver )
+
+	def fast_matrix (self):
+		"""True if the instance is solved through TemoaMatrix."""
+		return ( getattr( self.options, 'fast_matrix', False )
+			and not self.options.neos and not self.persistent() )
+
 	def create_temoa_instance (self):
 		"""Create a single instance of Temoa."""
 		
@@ -317,11 +339,19 @@ class TemoaSolverInstance(object):
 			modeldata = DataPortal( model=self.model )
 			# Recreate the pyomo command's ability to specify multiple "dot dat" files
 			# on the command lin			
+			# Databases are read directly into the data dictionary, without a .dat file
+			dbdata = dict()
 			for fname in self.options.dot_dat:
-				if fname[-4:] != '.dat':
-					msg = "InputError: expecting a dot dat (e.g., data.dat) file, found '{}'\n"
+				f_ext = path.splitext( fname )[1]
+				if f_ext == '.dat':
+					modeldata.load( filename=fname )
+				elif f_ext in ('.db', '.sqlite', '.sqlite3', '.sqlitedb'):
+					dbdata.update( load_db( fname, self.options )[None] )
+				else:
+					msg = "InputError: expecting a dot dat (e.g., data.dat) or database file, found '{}'\n"
 					raise Exception( msg.format( fname ))
-				modeldata.load( filename=fname )
+			if dbdata:
+				modeldata._data.setdefault( None, dict() ).update( dbdata )
 			yield '\t\t\t\t\t[%8.2f]\n' % duration()
 			SE.write( '\r[%8.2f]\n' % duration() )
 			self.txt_file.write( '[%8.2f]\n' % duration() )
@@ -330,10 +360,16 @@ class TemoaSolverInstance(object):
 			SE.write( '[        ] Creating Temoa model instance.'); SE.flush()
 			self.txt_file.write( 'Creating Temoa model instance.')
 			
-			self.instance = self.model.create_instance( modeldata )
+			if self.fast_matrix():
+				# The core constraints are generated by TemoaMatrix at solve time
+				self.instance = create_matrix_instance( self.model, modeldata )
+			else:
+				self.instance = self.model.create_instance( modeldata )
 			yield '\t\t\t\t[%8.2f]\n' % duration()
 			SE.write( '\r[%8.2f]\n' % duration() )
 			self.txt_file.write( '[%8.2f]\n' % duration() )
+			for phase in ('efficiency', 'process maps', 'active indices'):
+				self.txt_file.write( '\tSparse dicts, %s: [%8.2f]\n' % (phase, self.instance.sparseDictsTiming.get( phase, 0 )) )
 
 		except Exception as model_exc:
 			yield "Exception found in create_temoa_instance\n"
@@ -357,6 +393,14 @@ class TemoaSolverInstance(object):
 			if self.optimizer:	
 				if self.options.neos:
 				    self.result = self.optimizer.solve(self.instance, opt=self.options.solver)
+				elif self.persistent():
+				    # The model is already in the solver (set_instance)
+				    self.result = self.optimizer.solve( self.instance,
+								keepfiles=self.options.keepPyomoLP )
+				elif self.fast_matrix():
+				    # The solution is stored in the instance and the result by TemoaMatrix
+				    self.result = TemoaMatrix( self.instance ).solve( self.optimizer,
+								keepfiles=self.options.keepPyomoLP )
 				else:
 				    self.result = self.optimizer.solve( self.instance, 
 								keepfiles=self.options.keepPyomoLP, 
@@ -372,7 +416,8 @@ class TemoaSolverInstance(object):
 				yield 'Calculating reporting variables and formatting results.'
 				SE.write( msg ); SE.flush()
 				self.txt_file.write( 'Calculating reporting variables and formatting results.')
-				self.instance.solutions.store_to(self.result)
+				if not self.fast_matrix():
+					self.instance.solutions.store_to(self.result)
 				formatted_results = pformat_results( self.instance, self.result, self.options )
 				yield '\t[%8.2f]\n' % duration()
 				SE.write( '\r[%8.2f\n' % duration() )
@@ -421,6 +466,20 @@ class TemoaSolverInstance(object):
 				move(self.options.path_to_lp_files+os.sep+lpfile, new_dir+os.sep+self.options.scenario+'.lp')
 
 					
+def get_persistent_solver( solver ):
+	"""Return the persistent interface of solver (e.g. cplex_persistent for
+	cplex) if it is available, None otherwise."""
+	if not solver: return None
+	sname = solver if solver.endswith( '_persistent' ) else solver + '_persistent'
+	try:
+		optimizer = SF( sname )
+		if isinstance( optimizer, PersistentSolver ) and optimizer.available( exception_flag=False ):
+			return optimizer
+	except ApplicationError as e:
+		pass
+	return None
+
+
 def get_solvers():
 	"""Return the solvers avaiable on the system."""
 	from logging import getLogger
@@ -149,7 +149,7 @@ def solve_ef(p_model, p_data, temoa_options = None):
         # Write to database
         if hasattr(temoa_options, 'output'):
             sys.path.append(options.model_location)
-            from pformat_results import pformat_results
+            from pformat_results import write_ef_results
             # from temoa_config import TemoaConfig
             # temoa_options = TemoaConfig()
             # temoa_options.config = temoa_options.config
@@ -157,29 +157,21 @@ def solve_ef(p_model, p_data, temoa_options = None):
             # temoa_options.saveTEXTFILE = temoa_options.saveTEXTFILE
             # temoa_options.path_to_db_io = temoa_options.path_to_db_io
             # temoa_options.saveEXCEL = temoa_options.saveEXCEL
-            ef_result.solution.Status = 'feasible' # Assume it is feasible
             # Maybe there is a better solution using manager, but now it is a 
             # kludge to use return_CP_and_path() function
             s2cd_dict, s2fp_dict = return_CP_and_path(p_data)
-            stochastic_run = temoa_options.scenario # Name of stochastic run
-            for s in manager.scenario_tree.scenarios:
-                ins = s._instance
-                temoa_options.scenario = '.'.join( [stochastic_run, s.name] )
-                temoa_options.dot_dat = list()
-                for fname in s2fp_dict[s.name]:
-                    temoa_options.dot_dat.append(
-                        os.path.join(options.scenario_tree_location, fname)
-                    )
-                # temoa_options.output = os.path.join(
-                #     options.scenario_tree_location, 
-                #     stochastic_output
-                #     )
-                msg = '\nStoring results from scenario {} to database.\n'.format(s.name)
-                sys.stderr.write(msg)
-                formatted_results = pformat_results( ins, ef_result, temoa_options )
+            # Input tables are copied from the first file (the root node),
+            # which is the same for all scenarios
+            s = manager.scenario_tree.scenarios[0]
+            temoa_options.dot_dat = [
+                os.path.join(options.scenario_tree_location, s2fp_dict[s.name][0])
+            ]
+            msg = '\nStoring results from all scenarios to database.\n'
+            sys.stderr.write(msg)
+            write_ef_results( manager.scenario_tree, temoa_options )
 
     ef_instance.solutions.store_to( ef_result )
-    ef_obj = value( ef_instance.EF_EXPECTED_COST.values()[0] )
+    ef_obj = value( list(ef_instance.EF_EXPECTED_COST.values())[0] )
     return ef_obj
 
 def StochasticPointObjective_rule ( M, p ):
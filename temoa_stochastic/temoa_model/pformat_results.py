@@ -26,7 +26,8 @@ received this license file.  If not, see <http://www.gnu.org/licenses/>.
 # ---------------------------------------------------------------------------
 
 
-__all__ = ('pformat_results', 'stringify_data')
+__all__ = ('pformat_results', 'stringify_data', 'write_results_to_db', 'write_ef_results',
+           'collect_node_svars', 'write_node_results')
 
 from collections import defaultdict
 from cStringIO import StringIO
@@ -42,6 +43,25 @@ import sys
 from pyomo.core import value
 from IPython import embed as IP
 
+# Table dictionary below maps variable names to database table names
+tables = { "V_FlowIn"   : "Output_VFlow_In",  \
+		   "V_FlowOut"  : "Output_VFlow_Out", \
+		   "V_Capacity" : "Output_V_Capacity",       \
+		   "V_CapacityAvailableByPeriodAndTech"   : "Output_CapacityByPeriodAndTech",  \
+		   "V_EmissionActivityByPeriodAndProcess" : "Output_Emissions", \
+		   "Objective"  : "Output_Objective", \
+		   "Costs"      : "Output_Costs"}
+
+# Position of the period (or vintage) in the keys of the results stored by
+# scenario tree node (see write_ef_results), and the costs stored by vintage
+node_periods = { "V_FlowIn" : 0, "V_FlowOut" : 0, "V_Capacity" : 1, \
+				 "V_EmissionActivityByPeriodAndProcess" : 0 }
+node_costs = ( 'V_UndiscountedInvestmentByProcess', 'V_DiscountedInvestmentByProcess' )
+
+# Input tables copied to the output database
+db_tables = ['time_periods', 'time_season', 'time_of_day', 'technologies', 'commodities',\
+			'LifetimeTech', 'LifetimeProcess', 'Efficiency', 'EmissionActivity', 'ExistingCapacity']
+
 
 def stringify_data ( data, ostream=SO, format='plain' ):
 	# data is a list of tuples of ('var_name[index]', value)
@@ -62,50 +82,15 @@ def stringify_data ( data, ostream=SO, format='plain' ):
 		ostream.write( fmt.format(*row) )
 
 
-def pformat_results ( pyomo_instance, pyomo_result, options ):
-	from pyomo.core import Objective, Var, Constraint
-
-	output = StringIO()
-
-	m = pyomo_instance            # lazy typist
-	result = pyomo_result
-
-	soln = result['Solution']
-	solv = result['Solver']      # currently unused, but may want it later
-	prob = result['Problem']     # currently unused, but may want it later
-
-	optimal_solutions = (
-	  'feasible', 'globallyOptimal', 'locallyOptimal', 'optimal'
-	)
-	if str(soln.Status) not in optimal_solutions:
-		output.write( 'No solution found.' )
-		return output
-
-	objs = list(m.component_data_objects( Objective ))
-	if len( objs ) > 1:
-		msg = '\nWarning: More than one objective.  Using first objective.\n'
-		SE.write( msg )
-
-	Cons = soln.Constraint
-
-
-	def collect_result_data( cgroup, clist, epsilon):
-		# cgroup = "Component group"; i.e., Vars or Cons
-		# clist = "Component list"; i.e., where to store the data
-		# epsilon = absolute value below which to ignore a result
-		results = defaultdict(list)
-		for name, data in cgroup.iteritems():
-			if not (abs( data['Value'] ) > epsilon ): continue
-
-			# name looks like "Something[some,index]"
-			group, index = name[:-1].split('[')
-			results[ group ].append( (name.replace("'", ''), data['Value']) )
-		clist.extend( t for i in sorted( results ) for t in sorted(results[i]))
+def collect_svars ( m ):
+	# Returns the solved variable values (and the costs and emissions computed
+	# from them) of instance m, as a dictionary of variable group to a
+	# dictionary of index to value.  Values below epsilon are left out.
+	from pyomo.core import Objective
 
 	#Create a dictionary in which to store "solved" variable values
 	svars = defaultdict( lambda: defaultdict( float ))   
-	
-	con_info = list()
+
 	epsilon = 1e-9   # threshold for "so small it's zero"
 
 	emission_keys = { (i, t, v, o) : set() for e, i, t, v, o in m.EmissionActivity }
@@ -173,6 +158,7 @@ def pformat_results ( pyomo_instance, pyomo_result, options ):
 	# Calculate model costs:	
 	# This is a generic workaround.  Not sure how else to automatically discover 
     # the objective name
+	objs = list(m.component_data_objects( Objective ))
 	obj_name, obj_value = objs[0].cname(True), value( objs[0] )	
 	svars[ 'Objective' ]["('"+obj_name+"')"] = obj_value
 
@@ -224,6 +210,53 @@ def pformat_results ( pyomo_instance, pyomo_result, options ):
 		  )
 		svars[	'Costs'	][ 'V_DiscountedVariableCostsByProcess', t, v] += vcost
 
+	return svars
+
+
+def pformat_results ( pyomo_instance, pyomo_result, options ):
+	from pyomo.core import Objective, Var, Constraint
+
+	output = StringIO()
+
+	m = pyomo_instance            # lazy typist
+	result = pyomo_result
+
+	soln = result['Solution']
+	solv = result['Solver']      # currently unused, but may want it later
+	prob = result['Problem']     # currently unused, but may want it later
+
+	optimal_solutions = (
+	  'feasible', 'globallyOptimal', 'locallyOptimal', 'optimal'
+	)
+	if str(soln.Status) not in optimal_solutions:
+		output.write( 'No solution found.' )
+		return output
+
+	objs = list(m.component_data_objects( Objective ))
+	if len( objs ) > 1:
+		msg = '\nWarning: More than one objective.  Using first objective.\n'
+		SE.write( msg )
+
+	Cons = soln.Constraint
+
+
+	def collect_result_data( cgroup, clist, epsilon):
+		# cgroup = "Component group"; i.e., Vars or Cons
+		# clist = "Component list"; i.e., where to store the data
+		# epsilon = absolute value below which to ignore a result
+		results = defaultdict(list)
+		for name, data in cgroup.iteritems():
+			if not (abs( data['Value'] ) > epsilon ): continue
+
+			# name looks like "Something[some,index]"
+			group, index = name[:-1].split('[')
+			results[ group ].append( (name.replace("'", ''), data['Value']) )
+		clist.extend( t for i in sorted( results ) for t in sorted(results[i]))
+
+	con_info = list()
+	svars = collect_svars( m )
+	obj_name, obj_value = objs[0].cname(True), value( objs[0] )
+
 	collect_result_data( Cons, con_info, epsilon=1e-9 )
 
 	msg = ( 'Model name: %s\n'
@@ -263,19 +296,6 @@ def pformat_results ( pyomo_instance, pyomo_result, options ):
 	# Write outputs stored in dictionary to the user-specified database 
 	# -----------------------------------------------------------------
 
-	# Table dictionary below maps variable names to database table names
-	tables = { "V_FlowIn"   : "Output_VFlow_In",  \
-			   "V_FlowOut"  : "Output_VFlow_Out", \
-			   "V_Capacity" : "Output_V_Capacity",       \
-			   "V_CapacityAvailableByPeriodAndTech"   : "Output_CapacityByPeriodAndTech",  \
-			   "V_EmissionActivityByPeriodAndProcess" : "Output_Emissions", \
-			   "Objective"  : "Output_Objective", \
-			   "Costs"      : "Output_Costs"}
-	
-	db_tables = ['time_periods', 'time_season', 'time_of_day', 'technologies', 'commodities',\
-				'LifetimeTech', 'LifetimeProcess', 'Efficiency', 'EmissionActivity', 'ExistingCapacity']
-
-	
 	if isinstance(options, TemoaConfig):	
 		if not options.output:
 			if options.saveTEXTFILE or options.keepPyomoLP:
@@ -295,113 +315,220 @@ def pformat_results ( pyomo_instance, pyomo_result, options ):
 
 
 		con = sqlite3.connect(options.output)
-		cur = con.cursor()   # A database cursor enables traversal over DB records
 		con.text_factory = str # This ensures data is explored with UTF-8 encoding
 
-		### Copy tables from Input File to DB file.
-		# IF output file is empty database.
-		cur.execute("SELECT * FROM technologies")
-		is_db_empty = False #False for empty db file
-		for elem in cur:
-			is_db_empty = True #True for non-empty db file
-			break
-		
-		
-		if is_db_empty: #This file could be schema with populated results from previous run. Or it could be a normal db file.
-			cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='input_file';")
-			does_input_file_table_exist = False
-			for i in cur: # This means that the 'input_file' table exists in db.
-				does_input_file_table_exist = True
-			if does_input_file_table_exist: #This block distinguishes normal database from schema.
-				#This is schema file. 
-				cur.execute("SELECT file FROM input_file WHERE id is '1';")
-				for i in cur:
-					tagged_file = i[0]
-				tagged_file = re.sub('["]', "", tagged_file)
-
-				if tagged_file == options.dot_dat[0]:
-					#If Input_file name matches, add output and check tech/comm
-					dat_to_db(options.dot_dat[0], con)
-				else:
-					#If not a match, delete output tables and update input_file. Call dat_to_db
-					for i in db_tables:
-						cur.execute("DELETE FROM "+i+";")
-						cur.execute("VACUUM;")		
-					
-					for i in tables.keys():
-						cur.execute("DELETE FROM "+tables[i]+";")
-						cur.execute("VACUUM;")
-						
-					for i in options.dot_dat:
-						cur.execute("DELETE FROM input_file WHERE id=1;")
-						cur.execute("INSERT INTO input_file VALUES(1, '"+i+"');")
-						break
-					dat_to_db(i, con)
-			
-		else: #empty schema db file
-			cur.execute("CREATE TABLE IF NOT EXISTS input_file ( id integer PRIMARY KEY, file varchar(30));")
-			
-			for i in tables.keys():
-				cur.execute("DELETE FROM "+tables[i]+";")
-				cur.execute("VACUUM;")
-			
-			for i in options.dot_dat:
-				cur.execute("DELETE FROM input_file WHERE id=1;")
-				cur.execute("INSERT INTO input_file(id, file) VALUES(?, ?);", (1,  '"'+i+'"'))
-				break
-			dat_to_db(i, con)
-		
+		prepare_output_db( con, options )
+
+		write_results_to_db( svars, tables, con, options.scenario )
+		con.close()
 
-		
-		for table in svars.keys() :
-			if table in tables :
-				cur.execute("SELECT DISTINCT scenario FROM '"+tables[table]+"'")
-				for val in cur : 
-					if options.scenario == val[0]: # If scenario exists, delete
-						cur.execute("DELETE FROM "+tables[table]+" \
-									WHERE scenario is '"+options.scenario+"'") 
-				if table == 'Objective' : # Only table without sector info
-					for key in svars[table].keys():
-						key_str = str(key) # only 1 row to write
-						key_str = key_str[1:-1] # Remove parentheses
-						cur.execute("INSERT INTO "+tables[table]+" \
-									VALUES('"+options.scenario+"',"+key_str+", \
-									"+str(svars[table][key])+");")
-
-				else : # First add 'NULL' for sector then update
-					for key in svars[table].keys() : # Need to loop over keys (rows)
-						key_str = str(key)
-						key_str = key_str[1:-1] # Remove parentheses
-						cur.execute("INSERT INTO "+tables[table]+ \
-									" VALUES('"+options.scenario+"','NULL', \
-									"+key_str+","+str(svars[table][key])+");")
-					cur.execute("UPDATE "+tables[table]+" SET sector = \
-								(SELECT technologies.sector FROM technologies \
-								WHERE "+tables[table]+".tech = technologies.tech);")
-		con.commit()
-		con.close()			
-		
 		if options.saveEXCEL or options.saveTEXTFILE or options.keepPyomoLP:
-			for inpu in options.dot_dat:
-				file_ty = re.search(r"\b([\w-]+)\.(\w+)\b", inpu)
-			new_dir = options.path_to_db_io+os.sep+file_ty.group(1)+'_'+options.scenario+'_model'
-			if os.path.exists( new_dir ):
-				rmtree( new_dir )
-			os.mkdir(new_dir)
-			
-			if options.saveEXCEL:
-				file_type = re.search(r"([\w-]+)\.(\w+)\b", options.output)
-				file_n = file_type.group(1)
-				from DB_to_Excel import make_excel
-				temp_scenario = set()
-				temp_scenario.add(options.scenario)
-				make_excel(options.output, new_dir+os.sep+options.scenario, temp_scenario)
-				#os.system("python db_io"+os.sep+"DB_to_Excel.py -i \
-				#		  ""+options.output+" \
-				#		  " -o db_io"+os.sep+options.scenario+" -s "+options.scenario)
-	
+			write_excel( options, set([options.scenario]) )
+
 	return output
+
+
+def write_results_to_db ( svars, tables, con, scenario, commit=True ):
+	# Writes the solved variables in svars to the output tables of the database
+	# in a single transaction.  Rows are inserted with executemany and the sector
+	# of each row is looked up from the technologies table, which is read once.
+	# With commit=False the transaction is left open, so that the results of
+	# several scenarios are written in the same transaction.
+	cur = con.cursor()
+
+	cur.execute("SELECT tech, sector FROM technologies")
+	tech_sector = dict( cur.fetchall() )
+
+	for table in svars.keys() :
+		if table not in tables : continue
+
+		# Replace results of an earlier run of this scenario
+		cur.execute("DELETE FROM "+tables[table]+" WHERE scenario is ?", (scenario,))
+
+		if table == 'Objective' : # Only table without sector info
+			# key looks like "('TotalCost')"
+			rows = [ (scenario, key[1:-1].strip("'"), val) for key, val in svars[table].items() ]
+			cur.executemany("INSERT INTO "+tables[table]+" VALUES(?, ?, ?)", rows)
+			continue
+
+		# Position of the tech within each key, from the column names of the table
+		cur.execute("PRAGMA table_info("+tables[table]+")")
+		columns = [ col[1] for col in cur.fetchall() ]
+		t_pos = columns.index('tech') - 2   # columns begin with scenario, sector
+
+		rows = [ (scenario, tech_sector.get(key[t_pos])) + tuple(key) + (val,)
+		         for key, val in svars[table].items() ]
+		qry = "INSERT INTO "+tables[table]+" VALUES("+", ".join(["?"] * len(columns))+")"
+		cur.executemany(qry, rows)
+
+	if commit:
+		con.commit()
+
+
+def write_ef_results ( scenario_tree, options ):
+	# Writes the results of all scenarios of a solved extensive form to the
+	# output database, in a single transaction.  Each scenario instance is
+	# walked once, and each row is stored once under the scenario tree node it
+	# belongs to (scenario column "<run>.<node>"): flows and emissions of a
+	# stage period and capacity and investment costs of a stage vintage are
+	# stage variables (see generate_scenario_tree.py) shared by all scenarios
+	# through the node of that stage; existing capacity belongs to the root and
+	# everything else to the leaf node of the scenario.  Output_Scenario_Tree
+	# lists the nodes of each scenario with their conditional and cumulative
+	# probabilities, e.g. to collect the results of scenario S0s1:
+	#   SELECT o.* FROM Output_V_Capacity o JOIN Output_Scenario_Tree n
+	#   ON o.scenario = n.node WHERE n.scenario = '<run>.S0s1'
+	node_svars = dict()
+	for s in scenario_tree.scenarios:
+		collect_node_svars( node_svars, s, s._instance )
+	write_node_results( node_svars, scenario_tree, options )
+
+
+def collect_node_svars ( node_svars, s, ins ):
+	# Adds the results of scenario s (solved instance ins) to node_svars, a
+	# dictionary of node name to the svars of the rows belonging to the node,
+	# for the nodes of s not stored by an earlier scenario.
+	new_nodes = set( n.name for n in s.node_list if n.name not in node_svars )
+	for node in new_nodes:
+		node_svars[ node ] = defaultdict( dict )
+
+	# Node of each period, for stages named after their period (e.g. s2020)
+	stage_node = dict( (n.stage.name[1:], n.name) for n in s.node_list )
+	root, leaf = s.node_list[0].name, s.node_list[-1].name
+	first_period = min( ins.time_optimize )
+
+	svars = collect_svars( ins )
+	for table in svars:
+		for key, val in svars[table].items():
+			period = None
+			if table in node_periods:
+				period = key[ node_periods[table] ]
+			elif table == 'Costs' and key[0] in node_costs:
+				period = key[2]
+
+			if period is None:
+				node = leaf
+			elif period < first_period:
+				node = root
+			else:
+				node = stage_node.get( str(period), leaf )
+			if node in new_nodes: # else stored by an earlier scenario
+				node_svars[ node ][ table ][ key ] = val
+
+
+def write_node_results ( node_svars, scenario_tree, options ):
+	# Writes node_svars (see collect_node_svars) and the Output_Scenario_Tree
+	# of scenario_tree to the output database, replacing an earlier run of the
+	# same name, in a single transaction.
+	run = options.scenario
+
+	con = sqlite3.connect(options.output)
+	con.text_factory = str # This ensures data is explored with UTF-8 encoding
+	cur = con.cursor()
+	prepare_output_db( con, options )
+
+	# Replace the results of an earlier run, stored by scenario or by node
+	cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
+	db_table_names = set( row[0] for row in cur.fetchall() )
+	for table in tables.values():
+		if table not in db_table_names: continue
+		cur.execute("DELETE FROM "+table+" WHERE substr(scenario, 1, ?) = ?", (len(run) + 1, run + '.'))
+
+	for node, svars in node_svars.items():
+		write_results_to_db( svars, tables, con, run + '.' + node, commit=False )
+
+	cur.execute("CREATE TABLE IF NOT EXISTS Output_Scenario_Tree ( scenario text, node text, stage text, "
+	            "conditional_probability real, probability real, PRIMARY KEY(scenario, node) );")
+	cur.execute("DELETE FROM Output_Scenario_Tree WHERE substr(scenario, 1, ?) = ?", (len(run) + 1, run + '.'))
+	rows = [ (run + '.' + s.name, run + '.' + n.name, n.stage.name, n.conditional_probability, n.probability)
+	         for s in scenario_tree.scenarios for n in s.node_list ]
+	cur.executemany("INSERT INTO Output_Scenario_Tree VALUES(?, ?, ?, ?, ?)", rows)
+	con.commit()
+	con.close()
+
+	if options.saveEXCEL or options.saveTEXTFILE or options.keepPyomoLP:
+		write_excel( options, set( run + '.' + node for node in node_svars ) )
+
+
+def prepare_output_db ( con, options ):
+	# Copies the input tables of options.dot_dat[0] to the output database,
+	# unless they are already there from an earlier run of the same input file.
+	cur = con.cursor()
+
+	### Copy tables from Input File to DB file.
+	# IF output file is empty database.
+	cur.execute("SELECT * FROM technologies")
+	is_db_empty = False #False for empty db file
+	for elem in cur:
+		is_db_empty = True #True for non-empty db file
+		break
 	
+	
+	if is_db_empty: #This file could be schema with populated results from previous run. Or it could be a normal db file.
+		cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='input_file';")
+		does_input_file_table_exist = False
+		for i in cur: # This means that the 'input_file' table exists in db.
+			does_input_file_table_exist = True
+		if does_input_file_table_exist: #This block distinguishes normal database from schema.
+			#This is schema file. 
+			cur.execute("SELECT file FROM input_file WHERE id is '1';")
+			for i in cur:
+				tagged_file = i[0]
+			tagged_file = re.sub('["]', "", tagged_file)
+
+			if tagged_file == options.dot_dat[0]:
+				#If Input_file name matches, add output and check tech/comm
+				dat_to_db(options.dot_dat[0], con)
+			else:
+				#If not a match, delete output tables and update input_file. Call dat_to_db
+				for i in db_tables:
+					cur.execute("DELETE FROM "+i+";")
+					cur.execute("VACUUM;")		
+				
+				for i in tables.keys():
+					cur.execute("DELETE FROM "+tables[i]+";")
+					cur.execute("VACUUM;")
+					
+				for i in options.dot_dat:
+					cur.execute("DELETE FROM input_file WHERE id=1;")
+					cur.execute("INSERT INTO input_file VALUES(1, '"+i+"');")
+					break
+				dat_to_db(i, con)
+		
+	else: #empty schema db file
+		cur.execute("CREATE TABLE IF NOT EXISTS input_file ( id integer PRIMARY KEY, file varchar(30));")
+		
+		for i in tables.keys():
+			cur.execute("DELETE FROM "+tables[i]+";")
+			cur.execute("VACUUM;")
+		
+		for i in options.dot_dat:
+			cur.execute("DELETE FROM input_file WHERE id=1;")
+			cur.execute("INSERT INTO input_file(id, file) VALUES(?, ?);", (1,  '"'+i+'"'))
+			break
+		dat_to_db(i, con)
+
+
+def write_excel ( options, scenarios ):
+	# Creates the folder of the model run and, with saveEXCEL, writes the
+	# results of scenarios (a set of scenario names) to an Excel file in it.
+	for inpu in options.dot_dat:
+		file_ty = re.search(r"\b([\w-]+)\.(\w+)\b", inpu)
+	new_dir = options.path_to_db_io+os.sep+file_ty.group(1)+'_'+options.scenario+'_model'
+	if os.path.exists( new_dir ):
+		rmtree( new_dir )
+	os.mkdir(new_dir)
+
+	if options.saveEXCEL:
+		file_type = re.search(r"([\w-]+)\.(\w+)\b", options.output)
+		file_n = file_type.group(1)
+		from DB_to_Excel import make_excel
+		make_excel(options.output, new_dir+os.sep+options.scenario, scenarios)
+		#os.system("python db_io"+os.sep+"DB_to_Excel.py -i \
+		#		  ""+options.output+" \
+		#		  " -o db_io"+os.sep+options.scenario+" -s "+options.scenario)
+
+
 def dat_to_db(input_file, output_schema, run_partial=False):
 
 	def traverse_dat(dat_filename, search_tablename):
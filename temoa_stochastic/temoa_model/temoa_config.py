@@ -158,7 +158,8 @@ def db_2_dat(ifile, ofile, options):
 		['param','RampUp',                    '',                    '',             1],
 		['param','RampDown',                  '',                    '',             1],
 		['param', 'StorageInitFrac', '', '', 2],
-		['param', 'StorageDuration', '', '', 1]	]
+		['param', 'StorageDuration', '', '', 1],
+		['param','CapReduction',              '',                    '',             3]	]
 
 	with open(ofile, 'w') as f:
 		f.write('data ;\n\n')
@@ -194,6 +195,7 @@ def db_2_dat(ifile, ofile, options):
 class TemoaConfig( object ):
 	states = (
 	('mga', 'exclusive'),
+	('ph', 'exclusive'),
 	)
 	
 	tokens = (
@@ -210,7 +212,13 @@ class TemoaConfig( object ):
 		'mgaiter',
 		'path_to_db_io',
 		'path_to_logs',
-		'mgaweight'
+		'mgaweight',
+		'phrho',
+		'phrhocapacity',
+		'phrhoflow',
+		'phiter',
+		'phthreshold',
+		'phworkers'
 	)
 	
 	t_ANY_ignore  = '[ \t]'
@@ -235,6 +243,13 @@ class TemoaConfig( object ):
 		self.mga              = None # mga slack value
 		self.mga_iter         = None
 		self.mga_weight       = None
+		self.ph               = False # Solve with Progressive Hedging instead of the extensive form
+		self.ph_rho           = 1.0
+		self.ph_rho_capacity  = None # None uses ph_rho
+		self.ph_rho_flow      = None
+		self.ph_iter          = 100
+		self.ph_threshold     = 0.0001
+		self.ph_workers       = 1
 
 		# To keep consistent with Kevin's argumetn parser, will be removed in the future.
 		self.graph_format     = None
@@ -277,6 +292,15 @@ class TemoaConfig( object ):
 		msg += '{:>{}s}: {}\n'.format('MGA slack value', width, self.mga)
 		msg += '{:>{}s}: {}\n'.format('MGA # of iterations', width, self.mga_iter)
 		msg += '{:>{}s}: {}\n'.format('MGA weighting method', width, self.mga_weight)
+		msg += spacer
+		msg += '{:>{}s}: {}\n'.format('Progressive Hedging', width, self.ph)
+		msg += '{:>{}s}: {}\n'.format('PH rho', width, self.ph_rho)
+		msg += '{:>{}s}: {}\n'.format('PH rho for capacity', width, self.ph_rho_capacity)
+		msg += '{:>{}s}: {}\n'.format('PH rho for flows', width, self.ph_rho_flow)
+		msg += '{:>{}s}: {}\n'.format('PH max # of iterations', width, self.ph_iter)
+		msg += '{:>{}s}: {}\n'.format('PH convergence threshold', width, self.ph_threshold)
+		msg += '{:>{}s}: {}\n'.format('PH # of worker processes', width, self.ph_workers)
+		msg += spacer
 		msg += '**NOTE: If you are performing MGA runs, navigate to the DAT file and make any modifications to the MGA sets before proceeding.'
 		return msg
 
@@ -350,6 +374,41 @@ class TemoaConfig( object ):
 		t.lexer.pop_state()
 		t.lexer.level -= 1
 	
+	def t_begin_ph(self, t):
+		r'--ph[\s\=]+\{'
+		self.ph = True
+		t.lexer.push_state('ph')
+		t.lexer.level = 1
+
+	def t_ph_phrhocapacity(self, t):
+		r'rho_capacity[\s\=]+[\.\deE\-\+]+'
+		self.ph_rho_capacity = float(t.value.replace('=', ' ').split()[1])
+
+	def t_ph_phrhoflow(self, t):
+		r'rho_flow[\s\=]+[\.\deE\-\+]+'
+		self.ph_rho_flow = float(t.value.replace('=', ' ').split()[1])
+
+	def t_ph_phrho(self, t):
+		r'rho[\s\=]+[\.\deE\-\+]+'
+		self.ph_rho = float(t.value.replace('=', ' ').split()[1])
+
+	def t_ph_phiter(self, t):
+		r'iteration[\s\=]+[\d]+'
+		self.ph_iter = int(t.value.replace('=', ' ').split()[1])
+
+	def t_ph_phthreshold(self, t):
+		r'threshold[\s\=]+[\.\deE\-\+]+'
+		self.ph_threshold = float(t.value.replace('=', ' ').split()[1])
+
+	def t_ph_phworkers(self, t):
+		r'workers[\s\=]+[\d]+'
+		self.ph_workers = int(t.value.replace('=', ' ').split()[1])
+
+	def t_ph_end(self, t):
+		r'\}'
+		t.lexer.pop_state()
+		t.lexer.level -= 1
+	
 	def t_ANY_newline(self,t):
 		r'\n+|(\r\n)+|\r+' # '\n' (In linux) = '\r\n' (In Windows) = '\r' (In Mac OS)
 		t.lexer.lineno += len(t.value)
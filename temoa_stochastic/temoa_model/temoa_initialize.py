@@ -50,6 +50,8 @@ class TemoaModel(AbstractModel):
         self.helper_activeActivity_ptv = None
         self.helper_activeCapacity_tv = None
         self.helper_activeCapacityAvailable_pt = None
+        self.helper_capacityAvailablePeriods = dict()  # Sorted periods of each tech in helper_activeCapacityAvailable_pt
+        self.helper_capacityAvailablePrevPeriod = dict()  # Previous period of each (p, t) with available capacity
 
         self.helper_commodityDStreamProcess = dict()  # The downstream process of a commodity during a period
         self.helper_commodityUStreamProcess = dict()  # The upstream process of a commodity during a period
@@ -58,6 +60,14 @@ class TemoaModel(AbstractModel):
 
         self.helper_storageVintages = dict()
 
+        self.helper_costInvestByPeriod = dict()  # (t, v) of the CostInvest keys by vintage
+        self.helper_costFixedByPeriod = dict()  # (t, v) of the CostFixed keys by period
+        self.helper_costVariableByPeriod = dict()  # (t, v) of the CostVariable keys by period
+        self.helper_emissionActivityByPeriod = dict()  # (i, t, v, o) of the active EmissionActivity keys by (p, e)
+        self.helper_loanDiscount = dict()  # Discount factor of the loan of (t, v)
+        self.helper_loanHorizonFrac = dict()  # Fraction of the loan of (t, v) paid within the horizon
+        self.helper_periodDiscount = dict()  # Discount factor of the fixed and variable costs of (p, t, v)
+
     ##########################################################################
     # Helper functions
 
@@ -578,11 +588,22 @@ def InitializeProcessParameters(M):
     l_exist_indices = M.ExistingCapacity.sparse_keys()
     l_used_techs = set()
 
+    # Hashed lookups, built once instead of testing the Pyomo sets for
+    # every Efficiency row and period.
+    l_periods = list(M.time_optimize)
+    l_vintage_opt = set(M.time_optimize)
+    l_vintage_exist = set(M.vintage_exist)
+    l_storage = set(M.tech_storage)
+
+    # The first pass checks the Efficiency keys, and finds the periods in
+    # which each process (t, v) is active or has a loan.
+    l_efficiency = list()
+    l_process_periods = dict()
     for i, t, v, o in M.Efficiency.sparse_iterkeys():
         l_process = (t, v)
         l_lifetime = value(M.LifetimeProcess[l_process])
 
-        if v in M.vintage_exist:
+        if v in l_vintage_exist:
             if l_process not in l_exist_indices:
                 msg = ('Warning: %s has a specified Efficiency, but does not '
                        'have any existing install base (ExistingCapacity).\n')
@@ -612,48 +633,36 @@ def InitializeProcessParameters(M):
             continue
 
         l_used_techs.add(t)
+        l_efficiency.append(eindex)
 
-        for p in M.time_optimize:
+        if l_process not in l_process_periods:
             # can't build a vintage before it's been invented
-            if p < v: continue
+            l_built = [p for p in l_periods if p >= v]
+            if v in l_vintage_opt:
+                l_loan_life = value(M.LifetimeLoanProcess[l_process])
+                for p in l_built:
+                    if v + l_loan_life >= p:
+                        M.helper_processLoans[p, t, v] = True
+            # if tech is no longer "alive", don't include it
+            l_process_periods[l_process] = [p for p in l_built if v + l_lifetime > p]
 
-            pindex = (p, t, v)
+    # The second pass fills every helper map, each key being initialized to
+    # an empty set the first time it is seen.
+    for i, t, v, o in l_efficiency:
+        l_store = t in l_storage
 
-            if v in M.time_optimize:
-                l_loan_life = value(M.LifetimeLoanProcess[l_process])
-                if v + l_loan_life >= p:
-                    M.helper_processLoans[pindex] = True
+        for p in l_process_periods[t, v]:
+            pindex = (p, t, v)
+            M.helper_processVintages.setdefault((p, t), set()).add(v)
+            M.helper_processInputs.setdefault(pindex, set()).add(i)
+            M.helper_processOutputs.setdefault(pindex, set()).add(o)
+            M.helper_commodityDStreamProcess.setdefault((p, i), set()).add((t, v))
+            M.helper_commodityUStreamProcess.setdefault((p, o), set()).add((t, v))
+            M.helper_ProcessOutputsByInput.setdefault((p, t, v, i), set()).add(o)
+            M.helper_ProcessInputsByOutput.setdefault((p, t, v, o), set()).add(i)
 
-            # if tech is no longer "alive", don't include it
-            if v + l_lifetime <= p: continue
-
-            if pindex not in M.helper_processInputs:
-                M.helper_processInputs[pindex] = set()
-                M.helper_processOutputs[pindex] = set()
-            if (p, t) not in M.helper_processVintages:
-                M.helper_processVintages[p, t] = set()
-            if (p, i) not in M.helper_commodityDStreamProcess:
-                M.helper_commodityDStreamProcess[p, i] = set()
-            if (p, o) not in M.helper_commodityUStreamProcess:
-                M.helper_commodityUStreamProcess[p, o] = set()
-            if (p, t, v, i) not in M.helper_ProcessOutputsByInput:
-                M.helper_ProcessOutputsByInput[p, t, v, i] = set()
-            if (p, t, v, o) not in M.helper_ProcessInputsByOutput:
-                M.helper_ProcessInputsByOutput[p, t, v, o] = set()
-
-            if t in M.tech_storage and (p, t) not in M.helper_storageVintages:
-                M.helper_storageVintages[p, t] = set()
-
-            M.helper_processVintages[p, t].add(v)
-            M.helper_processInputs[pindex].add(i)
-            M.helper_processOutputs[pindex].add(o)
-            M.helper_commodityDStreamProcess[p, i].add((t, v))
-            M.helper_commodityUStreamProcess[p, o].add((t, v))
-            M.helper_ProcessOutputsByInput[p, t, v, i].add(o)
-            M.helper_ProcessInputsByOutput[p, t, v, o].add(i)
-
-            if t in M.tech_storage:
-                M.helper_storageVintages[p, t].add(v)
+            if l_store:
+                M.helper_storageVintages.setdefault((p, t), set()).add(v)
 
     l_unused_techs = M.tech_all - l_used_techs
     if l_unused_techs:
@@ -696,6 +705,51 @@ def InitializeProcessParameters(M):
         if M.ProcessVintages(p, t)
     )
 
+    # Ordered periods of each tech with available capacity, and the period
+    # before each of them (None for the first one), for GrowthRateConstraint
+    for p, t in M.helper_activeCapacityAvailable_pt:
+        M.helper_capacityAvailablePeriods.setdefault(t, list()).append(p)
+    for t, l_periods in M.helper_capacityAvailablePeriods.items():
+        l_periods.sort()
+        for l_prev, p in zip([None] + l_periods[:-1], l_periods):
+            M.helper_capacityAvailablePrevPeriod[p, t] = l_prev
+
+
+def CreateCostAndEmissionIndices(M):
+    # Keys of the cost parameters by period, keys of EmissionActivity by period
+    # and emission commodity (processes active in the period only), and the
+    # discount factors of the objective function, so that PeriodCost_rule and
+    # EmissionLimit_Constraint do not scan every key of the parameters.
+    P_0 = min(M.time_optimize)
+    P_e = M.time_future.last()  # End point of modeled horizon
+    GDR = value(M.GlobalDiscountRate)
+    MPL = M.ModelProcessLife
+    x = 1 + GDR  # convenience variable, nothing more.
+
+    for t, v in M.CostInvest.sparse_iterkeys():
+        M.helper_costInvestByPeriod.setdefault(v, list()).append((t, v))
+        l_loan_life = value(M.LifetimeLoanProcess[t, v])
+        l_life = value(M.LifetimeProcess[t, v])
+        M.helper_loanDiscount[t, v] = (l_loan_life if not GDR else
+                                       x ** (P_0 - v + 1) * (1 - x ** (-l_loan_life)) / GDR)
+        # Fraction of the loan paid within the model horizon
+        M.helper_loanHorizonFrac[t, v] = (1 - x ** (-min(l_life, P_e - v))) / (1 - x ** (-l_life))
+
+    for p, t, v in MPL.sparse_iterkeys():
+        M.helper_periodDiscount[p, t, v] = (value(MPL[p, t, v]) if not GDR else
+                                            x ** (P_0 - p + 1) * (1 - x ** (-value(MPL[p, t, v]))) / GDR)
+
+    for p, t, v in M.CostFixed.sparse_iterkeys():
+        M.helper_costFixedByPeriod.setdefault(p, list()).append((t, v))
+
+    for p, t, v in M.CostVariable.sparse_iterkeys():
+        M.helper_costVariableByPeriod.setdefault(p, list()).append((t, v))
+
+    for e, i, t, v, o in M.EmissionActivity.sparse_iterkeys():
+        for p in M.time_optimize:
+            if M.ValidActivity(p, t, v):
+                M.helper_emissionActivityByPeriod.setdefault((p, e), list()).append((i, t, v, o))
+
 
 ##############################################################################
 # Sparse index creation functions
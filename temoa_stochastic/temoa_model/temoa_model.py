@@ -163,6 +163,7 @@ def temoa_create_model(name='The Temoa Energy System Model'):
     M.EmissionLimit = Param(M.time_optimize, M.commodity_emissions)
     M.EmissionActivity_eitvo = Set(dimen=5, initialize=EmissionActivityIndices)
     M.EmissionActivity = Param(M.EmissionActivity_eitvo)
+    M.initialize_CostAndEmissionIndices = BuildAction(rule=CreateCostAndEmissionIndices)
     M.TechInputSplit = Param(M.time_optimize, M.commodity_physical, M.tech_all)
     M.TechOutputSplit = Param(M.time_optimize, M.tech_all, M.commodity_carrier)
 
@@ -85,60 +85,39 @@ Note that we calculate loan costs by using depreciation. If a technology is deco
 
 
 def PeriodCost_rule(M, p):
-    P_0 = min(M.time_optimize)
-    P_e = M.time_future.last()  # End point of modeled horizon
-    GDR = value(M.GlobalDiscountRate)
-    MLL = M.ModelLoanLife
-    MPL = M.ModelProcessLife
-    x = 1 + GDR  # convenience variable, nothing more.
-
+    # Keys of the cost parameters by period and discount factors are computed
+    # once in CreateCostAndEmissionIndices
     loan_costs = sum(
         M.V_Capacity[S_t, S_v]
         * (
                 value(M.CostInvest[S_t, S_v])
                 * value(M.CostInvestIncrease[p, S_t])
                 * value(M.LoanAnnualize[S_t, S_v])
-                * (value(M.LifetimeLoanProcess[S_t, S_v]) if not GDR else
-                   (x ** (P_0 - S_v + 1) * (1 - x ** (-value(M.LifetimeLoanProcess[S_t, S_v]))) / GDR)
-                   )
-        )
-        * (
-                (
-                        1 - x ** (-min(value(M.LifetimeProcess[S_t, S_v]), P_e - S_v))
-                )
-                / (
-                        1 - x ** (-value(M.LifetimeProcess[S_t, S_v]))
-                )
+                * M.helper_loanDiscount[S_t, S_v]
         )
+        * M.helper_loanHorizonFrac[S_t, S_v]
 
-        for S_t, S_v in M.CostInvest.sparse_iterkeys()
-        if S_v == p
+        for S_t, S_v in M.helper_costInvestByPeriod.get(p, ())
     )
 
     fixed_costs = sum(
         M.V_Capacity[S_t, S_v]
         * (
-				value(M.CostFixed[p, S_t, S_v]) * value(M.FOMIncrease[p, S_t])  # sudan
-				* (value(MPL[p, S_t, S_v]) if not GDR else
-                   (x ** (P_0 - p + 1) * (1 - x ** (-value(MPL[p, S_t, S_v]))) / GDR)
-                   )
+                value(M.CostFixed[p, S_t, S_v]) * value(M.FOMIncrease[p, S_t])  # sudan
+                * M.helper_periodDiscount[p, S_t, S_v]
         )
 
-        for S_p, S_t, S_v in M.CostFixed.sparse_iterkeys()
-        if S_p == p
+        for S_t, S_v in M.helper_costFixedByPeriod.get(p, ())
     )
 
     variable_costs = sum(
         M.V_ActivityByPeriodAndProcess[p, S_t, S_v]
         * (
                 value(M.CostVariable[p, S_t, S_v])
-                * (value(MPL[p, S_t, S_v]) if not GDR else
-                   (x ** (P_0 - p + 1) * (1 - x ** (-value(MPL[p, S_t, S_v]))) / GDR)
-                   )
+                * M.helper_periodDiscount[p, S_t, S_v]
         )
 
-        for S_p, S_t, S_v in M.CostVariable.sparse_iterkeys()
-        if S_p == p
+        for S_t, S_v in M.helper_costVariableByPeriod.get(p, ())
     )
 
     period_costs = (loan_costs + fixed_costs + variable_costs)
@@ -322,9 +301,8 @@ to each emission commodity.
         M.V_FlowOut[p, S_s, S_d, S_i, S_t, S_v, S_o]
         * M.EmissionActivity[e, S_i, S_t, S_v, S_o]
 
-        for tmp_e, S_i, S_t, S_v, S_o in M.EmissionActivity.sparse_iterkeys()
-        if tmp_e == e
-        if M.ValidActivity(p, S_t, S_v)
+        # Keys of processes active in p only (CreateCostAndEmissionIndices)
+        for S_i, S_t, S_v, S_o in M.helper_emissionActivityByPeriod.get((p, e), ())
         for S_s in M.time_season
         for S_d in M.time_of_day
     )
@@ -1248,18 +1226,15 @@ def GrowthRateConstraint_rule(M, p, t):
     GRM = value(M.GrowthRateMax[t])
     CapPT = M.V_CapacityAvailableByPeriodAndTech
 
-    periods = sorted(set(p_ for p_, t_ in CapPT if t_ == t))
-
-    if p not in periods:
+    # Periods of each tech are ordered once in InitializeProcessParameters
+    if (p, t) not in M.helper_capacityAvailablePrevPeriod:
         return Constraint.Skip
 
-    if p == periods[0]:
+    p_prev = M.helper_capacityAvailablePrevPeriod[p, t]
+    if p_prev is None:
         expr = (CapPT[p, t] <= GRS)
 
     else:
-        p_prev = periods.index(p)
-        p_prev = periods[p_prev - 1]
-
         expr = (CapPT[p, t] <= GRM * CapPT[p_prev, t] + GRS)
 
     return expr
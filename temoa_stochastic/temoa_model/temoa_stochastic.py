@@ -29,9 +29,11 @@ from pyomo.environ import *
 from pyomo.pysp.scenariotree.manager import \
     ScenarioTreeManagerClientSerial
 from pyomo.pysp.ef import create_ef_instance
+from pyomo.pysp.phinit import construct_ph_options_parser, \
+    PHFromScratchManagedContext
 from pyomo.opt import SolverFactory
 from time import time
-import os, sys
+import os, sys, subprocess
 
 def return_CP_and_path(p_data):
     # return_CP_and_path(p_data) -> dict(), dict()
@@ -148,40 +150,198 @@ def solve_ef(p_model, p_data, temoa_options = None):
 
         # Write to database
         if hasattr(temoa_options, 'output'):
-			sys.path.append(options.model_location)
-			from pformat_results import pformat_results
-			# from temoa_config import TemoaConfig
-			# temoa_options = TemoaConfig()
-			# temoa_options.config = temoa_options.config
-			# temoa_options.keepPyomoLP = temoa_options.keepPyomoLP
-			# temoa_options.saveTEXTFILE = temoa_options.saveTEXTFILE
-			# temoa_options.path_to_db_io = temoa_options.path_to_db_io
-			# temoa_options.saveEXCEL = temoa_options.saveEXCEL
-			ef_result.solution.Status = 'feasible' # Assume it is feasible
-			# Maybe there is a better solution using manager, but now it is a 
-			# kludge to use return_CP_and_path() function
-			s2cd_dict, s2fp_dict = return_CP_and_path(p_data)
-			stochastic_run = temoa_options.scenario # Name of stochastic run
-			for s in manager.scenario_tree.scenarios:
-				ins = s._instance
-				temoa_options.scenario = '.'.join( [stochastic_run, s.name] )
-				temoa_options.dot_dat = list()
-				for fname in s2fp_dict[s.name]:
-					temoa_options.dot_dat.append(
-						os.path.join(options.scenario_tree_location, fname)
-					)
-				# temoa_options.output = os.path.join(
-				#     options.scenario_tree_location, 
-				#     stochastic_output
-				#     )
-				msg = '\nStoring results from scenario {} to database.\n'.format(s.name)
-				sys.stderr.write(msg)
-				formatted_results = pformat_results( ins, ef_result, temoa_options )
+            sys.path.append(options.model_location)
+            from pformat_results import write_ef_results
+            # Maybe there is a better solution using manager, but now it is a 
+            # kludge to use return_CP_and_path() function
+            s2cd_dict, s2fp_dict = return_CP_and_path(p_data)
+            # Input tables are copied from the first file (the root node),
+            # which is the same for all scenarios
+            s = manager.scenario_tree.scenarios[0]
+            temoa_options.dot_dat = [
+                os.path.join(options.scenario_tree_location, s2fp_dict[s.name][0])
+            ]
+            msg = '\nStoring results from all scenarios to database.\n'
+            sys.stderr.write(msg)
+            write_ef_results( manager.scenario_tree, temoa_options )
 
     ef_instance.solutions.store_to( ef_result )
     ef_obj = value( ef_instance.EF_EXPECTED_COST.values()[0] )
     return ef_obj
 
+# Progressive Hedging rho of each class of stage variable, as the name of the
+# temoa_options attribute holding it.  Variables not listed use ph_rho.
+ph_rho_class = {
+    'V_Capacity'                         : 'ph_rho_capacity',
+    'V_CapacityAvailableByPeriodAndTech' : 'ph_rho_capacity',
+    'V_FlowIn'                           : 'ph_rho_flow',
+    'V_FlowOut'                          : 'ph_rho_flow',
+    'V_ActivityByPeriodTechAndOutput'    : 'ph_rho_flow',
+}
+
+def solve_ph(p_model, p_data, temoa_options = None):
+    """
+    solve_ph(p_model, p_data) -> expected cost of the stochastic program
+    Solves the model in stochastic mode with Progressive Hedging (PH) rather
+    than the extensive form, so that only one scenario at a time is held by
+    each process.  With temoa_options.ph_workers > 1, scenarios are solved by
+    that many local phsolverserver processes and this process only keeps the
+    scenario tree.  p_model and p_data are the same as for solve_ef.
+    After PH, each scenario is solved once more with the capacity of the PH
+    solution (x-hat) and stored to the database.
+    """
+    if os.path.basename(p_model) != 'ReferenceModel.py':
+        sys.stderr.write('\nModel file should be ReferenceModel.py. Exiting...\n')
+        sys.exit(1)
+
+    # Same as: runph -m <model> -i <p_data> --solver=... --default-rho=...
+    args = [
+        '--model-directory',    os.path.dirname(p_model),
+        '--instance-directory', p_data,
+        '--solver',             temoa_options.solver,
+        '--default-rho',        str(temoa_options.ph_rho),
+        '--max-iterations',     str(temoa_options.ph_iter),
+        '--termdiff-threshold', str(temoa_options.ph_threshold)
+    ]
+
+    workers = list()
+    try:
+        if temoa_options.ph_workers > 1:
+            workers, port = start_ph_workers(temoa_options.ph_workers)
+            args += [
+                '--solver-manager',          'phpyro',
+                '--pyro-host',               'localhost',
+                '--pyro-port',               str(port),
+                '--phpyro-required-workers', str(temoa_options.ph_workers),
+                '--shutdown-pyro-workers'
+            ]
+
+        parser = construct_ph_options_parser('')
+        options = parser.parse_args(args)
+        options._ef_options = parser._ef_options # as in phinit.main
+        options._ef_options.import_argparse(options)
+
+        # the 'with' block releases the workers and closes the model files
+        with PHFromScratchManagedContext(options) as ph:
+            set_ph_rho(ph, temoa_options)
+            if ph.solve() is not None:
+                raise RuntimeError('PH failed to solve scenario(s).')
+
+            ph_obj = ph._scenario_tree.findRootNode().computeExpectedNodeCost()
+            report_ph_convergence(ph, os.path.join(p_data, 'ph_convergence.csv'))
+
+            # Write to database
+            if hasattr(temoa_options, 'output'):
+                sys.path.append(options.model_directory)
+                write_ph_results(ph, p_data, temoa_options)
+    finally:
+        for p in reversed(workers):
+            p.terminate()
+            p.wait()
+
+    return ph_obj
+
+def start_ph_workers(n_workers, host = 'localhost'):
+    """
+    start_ph_workers(n_workers) -> list of processes, port
+    Starts a Pyro name server, a dispatcher and n_workers phsolverserver
+    processes on this machine (the same as the pyomo_ns, dispatch_srvr and
+    phsolverserver commands in jobTemoa.pbs).  Requires Pyro4.
+    """
+    from pyutilib.pyro.util import find_unused_port
+    port = find_unused_port()
+    commands = [
+        # Pyro4 does not import its naming module with the package
+        ('from pyutilib.pyro import Pyro, start_ns; '
+         '__import__(Pyro.__name__ + ".naming"); start_ns()',
+            ['-n', host, '-p', str(port)]),
+        ('from pyutilib.pyro.dispatch_srvr import main; main()',
+            ['-n', host, '-p', str(port)])
+    ]
+    commands += [
+        ('from pyomo.pysp.phsolverserver import main; main()',
+            ['--pyro-host', host, '--pyro-port', str(port)])
+    ] * n_workers
+
+    workers = list()
+    for code, args in commands:
+        workers.append(subprocess.Popen([sys.executable, '-c', code] + args))
+    return workers, port
+
+def set_ph_rho(ph, temoa_options):
+    # Sets the rho of every non-anticipative variable from its class in
+    # ph_rho_class.  Rho only enters from PH iteration 1, so setting it here
+    # on the scenario tree is enough, also when solving with phsolverservers.
+    for tree_node in ph._scenario_tree._tree_nodes:
+        if tree_node.is_leaf_node(): continue
+        for variable_id in tree_node._standard_variable_ids:
+            name, index = tree_node._variable_ids[variable_id]
+            rho = getattr(temoa_options, ph_rho_class.get(name, 'ph_rho'))
+            if rho is None:
+                rho = temoa_options.ph_rho
+            ph.setRhoAllScenarios(tree_node, variable_id, rho)
+
+def report_ph_convergence(ph, filename):
+    # Writes the expected cost and the metric of each convergence criterion
+    # at every PH iteration to filename (csv), and whether PH converged to
+    # stderr.
+    import csv
+    with open(filename, 'wb') as f:
+        writer = csv.writer(f)
+        writer.writerow(['iteration', 'expected_cost'] +
+            [c._name for c in ph._convergers])
+        for i in sorted(ph._cost_history):
+            writer.writerow([i, ph._cost_history[i]] +
+                [c._metric_history.get(i) for c in ph._convergers])
+
+    for c in ph._convergers:
+        if c.isConverged(ph):
+            msg = '\n{}: converged after {} iterations ({:g} <= {:g}).\n'
+        else:
+            msg = '\n{}: NOT converged after {} iterations ({:g} > {:g}).\n'
+        sys.stderr.write(msg.format(c._name, ph._current_iteration,
+            c.lastMetric(), c._convergence_threshold))
+    sys.stderr.write('Convergence history written to {}\n'.format(filename))
+
+def write_ph_results(ph, p_data, temoa_options):
+    # Solves each scenario with the capacity built at non-leaf nodes fixed at
+    # the PH solution (as in VSS.py) and stores all of them to the database
+    # once per scenario tree node, as write_ef_results does.  Flows are not
+    # fixed: a PH solution that is only converged to a tolerance may not meet
+    # demand exactly in every scenario, so the rows of a non-leaf node are
+    # those of the first scenario through it.  Only one scenario instance is
+    # held at a time.
+    from pformat_results import collect_node_svars, write_node_results
+    s2cd_dict, s2fp_dict = return_CP_and_path(p_data)
+    scenario_tree = ph._scenario_tree
+    factory = scenario_tree._scenario_instance_factory
+    node_svars = dict()
+    for s in scenario_tree.scenarios:
+        ins = factory.construct_scenario_instance(s.name, scenario_tree)
+        for tree_node in s.node_list[:-1]:
+            for variable_id in tree_node._standard_variable_ids:
+                name, index = tree_node._variable_ids[variable_id]
+                if name != 'V_Capacity': continue
+                ins.find_component(name)[index].fix(
+                    tree_node._solution[variable_id]
+                )
+
+        with SolverFactory(temoa_options.solver) as opt:
+            result = opt.solve(ins)
+        ins.solutions.store_to(result)
+
+        msg = '\nCollecting results from scenario {}.\n'.format(s.name)
+        sys.stderr.write(msg)
+        collect_node_svars(node_svars, s, ins)
+        del ins
+
+    # Input tables are copied from the first file (the root node), which is
+    # the same for all scenarios
+    s = scenario_tree.scenarios[0]
+    temoa_options.dot_dat = [ os.path.join(p_data, s2fp_dict[s.name][0]) ]
+    sys.stderr.write('\nStoring results from all scenarios to database.\n')
+    write_node_results(node_svars, scenario_tree, temoa_options)
+
 def StochasticPointObjective_rule ( M, p ):
     expr = ( M.StochasticPointCost[ p ] == PeriodCost_rule( M, p ) )
     return expr
@@ -203,4 +363,7 @@ if __name__ == "__main__":
     p_dot_dat = temoa_options.dot_dat[0] # must be ScenarioStructure.dat
     p_data = os.path.dirname(p_dot_dat)
     print p_model, p_data
-    print solve_ef(p_model, p_data, temoa_options)
+    if getattr(temoa_options, 'ph', False):
+        print solve_ph(p_model, p_data, temoa_options)
+    else:
+        print solve_ef(p_model, p_data, temoa_options)
@@ -2,6 +2,9 @@
 
 import os
 import sys
+import json
+import hashlib
+from multiprocessing import Pool
 from pyomo.environ import *
 from pyomo.pysp.scenariotree.manager import \
     ScenarioTreeManagerClientSerial
@@ -33,48 +36,167 @@ def compute_evpi(ef_result, pf_result):
         pf += pf_result['cd'][i]*pf_result['cost'][i]
     return ef_result - pf
 
-def solve_pf(p_model, p_data):
+# State of a worker process, set by init_worker: the model, the solver and
+# the parsed data of the root node (R.dat), which is shared by all scenarios
+# and therefore parsed once per process rather than once per scenario
+worker = dict()
+
+def init_worker(p_model, solver):
+    (head, tail) = os.path.split(os.path.abspath(p_model))
+    if head not in sys.path:
+        sys.path.insert(0, head)
+    model_module = __import__(tail[:-3], globals(), locals())
+    worker['model'] = model_module.model
+    worker['solver'] = solver
+    worker['shared'] = dict()
+
+def load_shared(dat):
+    """
+    load_shared(dat) -> DataPortal
+    Returns a DataPortal holding the data of the shared .dat file dat. The file
+    is parsed the first time only, later calls copy the parsed data (params are
+    updated key by key when further .dat files are loaded on top of it).
+    """
+    if dat not in worker['shared']:
+        data = DataPortal(model=worker['model'])
+        data.load(filename=dat)
+        worker['shared'][dat] = (data._data, data._default)
+    (shared_data, shared_default) = worker['shared'][dat]
+    data_dict = dict()
+    for namespace, symbols in shared_data.items():
+        data_dict[namespace] = dict(
+            (name, dict(v) if isinstance(v, dict) else v)
+            for name, v in symbols.items()
+        )
+    data = DataPortal(model=worker['model'], data_dict=data_dict)
+    data._default.update(shared_default)
+    return data
+
+def solve_job(job):
+    """
+    solve_job(job) -> (name, result)
+    Solves one deterministic instance within a worker process. job is a tuple
+    (name, dats, first_stage): the .dat files are loaded in order (the first
+    one is the shared root node) and, if first_stage is True, the capacity
+    built in the first period is returned along with the objective value.
+    """
+    (name, dats, first_stage) = job
+    model = worker['model']
+    data = DataPortal(model=model)
+    to_load = dats
+    if len(dats) > 1:
+        data = load_shared(dats[0])
+        to_load = dats[1:]
+    for dat in to_load:
+        data.load(filename=dat)
+    instance = model.create_instance(data)
+    optimizer = SolverFactory(worker['solver'])
+    results = optimizer.solve(instance)
+
+    instance.solutions.load_from(results)
+    result = {'cost': value(list(instance.component_objects(Objective, active=True))[0])}
+    if first_stage:
+        first = min(instance.time_future)
+        result['capacity'] = [
+            [t, v, val] for (t, v), val in instance.V_Capacity.get_values().items()
+            if v == first and val is not None
+        ]
+    return name, result
+
+def job_key(p_model, solver, dats, first_stage):
+    # Hash of the .dat path set of a solve (with the size and modification
+    # time of each file, so that regenerated data is solved again)
+    stamps = list()
+    for dat in dats:
+        st = os.stat(dat)
+        stamps.append([os.path.abspath(dat), st.st_size, st.st_mtime])
+    key = json.dumps([os.path.abspath(p_model), solver, stamps, first_stage])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def solve_dats(p_model, jobs, solver='cplex', ncpus=1, cache_file=None):
+    """
+    solve_dats(p_model, jobs, solver, ncpus, cache_file) -> dict()
+    Solves deterministic instances of the model, e.g. the wait-and-see
+    (perfect sight) scenarios and the mean-value problem.
+    p_model -> string, the path to the model file.
+    jobs -> list of (name, dats, first_stage), see solve_job.
+    solver -> string, the solver passed to SolverFactory.
+    ncpus -> int, the number of worker processes.
+    cache_file -> string, the path to a JSON file holding the results of
+    previous solves, None to always solve.
+    Returns a dictionary of name to result ({'cost': ...}).
+    """
+    cache = dict()
+    if cache_file and os.path.isfile(cache_file):
+        with open(cache_file, 'r') as f:
+            cache = json.load(f)
+
+    results = dict()
+    keys = dict()
+    todo = list()
+    for (name, dats, first_stage) in jobs:
+        keys[name] = job_key(p_model, solver, dats, first_stage)
+        if keys[name] in cache:
+            results[name] = cache[keys[name]]
+            sys.stdout.write('\nCached .dat(s) {}\n'.format(dats))
+            sys.stdout.write('    Total cost: {}\n'.format(results[name]['cost']))
+        else:
+            todo.append((name, dats, first_stage))
+
+    pool = None
+    if ncpus > 1 and len(todo) > 1:
+        pool = Pool(min(ncpus, len(todo)), initializer=init_worker, initargs=(p_model, solver))
+        solved = pool.imap_unordered(solve_job, todo)
+    else:
+        if todo:
+            init_worker(p_model, solver)
+        solved = (solve_job(job) for job in todo)
+    job_dats = dict((job[0], job[1]) for job in todo)
+    try:
+        for name, result in solved:
+            results[name] = result
+            sys.stdout.write('\nSolved .dat(s) {}\n'.format(job_dats[name]))
+            sys.stdout.write('    Total cost: {}\n'.format(result['cost']))
+            # Saved after each solve, so that an interrupted run resumes
+            if cache_file:
+                cache[keys[name]] = result
+                with open(cache_file, 'w') as f:
+                    json.dump(cache, f)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return results
+
+def solve_pf(p_model, p_data, solver='cplex', ncpus=1, cache=True, mean_value_dat=None):
     """
     solve_pf(p_model, p_data) -> dict()
     Solves the model in perfect sight mode. 
     p_model -> string, the path to the model file. 
     p_data -> string, the path to the directory of data for the stochastic
-    mdoel, where ScenarioStructure.dat should resides.
+    model, where ScenarioStructure.dat should resides.
+    solver -> string, the solver passed to SolverFactory.
+    ncpus -> int, the number of processes solving scenarios in parallel.
+    cache -> bool, if True the result of each scenario is kept in
+    p_data/solve_cache.json and scenarios solved before are not solved again.
+    mean_value_dat -> string, optional, a .dat file in p_data (e.g.
+    AverageModel.dat) solved along with the scenarios as the mean-value problem.
     Returns a dictionary including the value of objective function for each
-    scenario and its conditional probability.
+    scenario and its conditional probability (and the result of the
+    mean-value problem as 'mv', if requested).
     """
 
-    def return_obj(instance):
-        from pyomo.core import Objective
-        obj = instance.component_objects(Objective, active = True)
-        obj_values = list()
-        for o in obj:
-            # See section 18.6.3 in Pyomo online doc
-            # https://taizilongxu.gitbooks.io/stackoverflow-about-python/content/59/README.html
-            method_obj = getattr(instance, str(o))
-            obj_values.append(method_obj())
-        # Assuming there is only one objective function
-        return obj_values[0]
-
-        # Out-of-date for Pyomo 4.1
-        # obj = instance.active_components(Objective) 
-        # objs = obj.items()[0]
-        # obj_name, obj_value = objs[0], value(objs[1]())
-        # return obj_value
-
     import sys, os
     from collections import deque, defaultdict
     from pyomo.pysp.util.scenariomodels import scenario_tree_model
-    from pyomo.core import Objective
 
-    (head, tail) = os.path.split(p_model)
-    sys.path.insert(0, head)
-    pwd = os.getcwd()
-    os.chdir(p_data)
+    p_data = os.path.abspath(p_data)
 
     s2fp_dict = defaultdict(deque) # Scenario to 'file path' dictionary, .dat not included
     s2cd_dict = defaultdict(float) # Scenario to conditonal density mapping
-    sStructure = scenario_tree_model.create_instance( filename='ScenarioStructure.dat' )
+    sStructure = scenario_tree_model.create_instance(
+        filename=os.path.join(p_data, 'ScenarioStructure.dat')
+    )
 
     # The following code is borrowed from Kevin's temoa_lib.py
     ###########################################################################
@@ -124,33 +246,27 @@ def solve_pf(p_model, p_data):
                 s2fp_dict[s].append(n + '.dat')
         s2cd_dict[s] = cp
     
-    from pyomo.core import Objective
     if sStructure.ScenarioBasedData.value:
         for s in sStructure.Scenarios:
             s2fp_dict[s].append(s + '.dat')
-    #IP()
-    model_module = __import__(tail[:-3], globals(), locals())
-    model = model_module.model
+
+    jobs = list()
+    for s in sStructure.Scenarios:
+        jobs.append((s, [os.path.join(p_data, dat) for dat in s2fp_dict[s]], False))
+    if mean_value_dat:
+        jobs.append((mean_value_dat, [os.path.join(p_data, mean_value_dat)], True))
+    cache_file = os.path.join(p_data, 'solve_cache.json') if cache else None
+    results = solve_dats(p_model, jobs, solver, ncpus, cache_file)
+
     pf_result = {'cost': list(), 'cd': list()}
     for s in sStructure.Scenarios:
         pf_result['cd'].append(s2cd_dict[s])
-        data = DataPortal(model=model)
-        for dat in s2fp_dict[s]:
-            data.load(filename=dat)
-        instance = model.create_instance(data)
-        optimizer = SolverFactory('cplex')
-        results = optimizer.solve(instance)
-
-        instance.solutions.load_from(results)
-        # instance.load(results)
-        obj_val = return_obj(instance)
-        pf_result['cost'].append(obj_val)
-        sys.stdout.write('\nSolved .dat(s) {}\n'.format(s2fp_dict[s]))
-        sys.stdout.write('    Total cost: {}\n'.format(obj_val))
-    os.chdir(pwd)
+        pf_result['cost'].append(results[s]['cost'])
+    if mean_value_dat:
+        pf_result['mv'] = results[mean_value_dat]
     return pf_result
 
-def solve_ef(p_model, p_data, dummy_temoa_options = None):
+def solve_ef(p_model, p_data, dummy_temoa_options = None, solver = 'cplex'):
     """
     solve_ef(p_model, p_data) -> objective value of the extensive form
     Solves the model in stochastic mode. 
@@ -180,7 +296,7 @@ def solve_ef(p_model, p_data, dummy_temoa_options = None):
     
         ef_instance.dual = Suffix(direction=Suffix.IMPORT)
     
-        with SolverFactory('cplex') as opt:
+        with SolverFactory(solver) as opt:
     
             ef_result = opt.solve(ef_instance)
 
@@ -214,7 +330,7 @@ def solve_ef(p_model, p_data, dummy_temoa_options = None):
     ef_obj = value( ef_instance.EF_EXPECTED_COST.values()[0] )
     return ef_obj
 
-def do_test(p_model, p_data, temoa_config = None):
+def do_test(p_model, p_data, temoa_config = None, solver = 'cplex', ncpus = 1):
     from time import time
     t0 = time()
     timeit = lambda: time() - t0
@@ -224,13 +340,13 @@ def do_test(p_model, p_data, temoa_config = None):
     for this_data in p_data:
         sys.stderr.write('\nSolving perfect sight mode\n')
         sys.stdout.write('-'*25 + '\n')
-        pf_result = solve_pf(p_model, this_data)
+        pf_result = solve_pf(p_model, this_data, solver, ncpus)
         msg = 'Time: {} s\n'.format( timeit() )
         sys.stderr.write(msg)
     
         sys.stderr.write('\nSolving extensive form\n')
         sys.stdout.write('-'*25 + '\n')
-        ef_result = solve_ef(p_model, this_data, temoa_config)
+        ef_result = solve_ef(p_model, this_data, temoa_config, solver)
     
         msg = '\nTime: {} s\n'.format( timeit() )
         msg += 'runef objective value: {}\n'.format(ef_result)
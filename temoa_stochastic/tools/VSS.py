@@ -116,10 +116,10 @@ def solve_ef(ef_options):
 	#II()
 	return root_node.computeExpectedNodeCost()
 
-def solve_ef_fix(ef_options,avg_instance):
+def solve_ef_fix(ef_options,dm_result):
 	#This function solves a stochastic optimization problem via extensive form
 	#where first stage decision variables are fixed at the optimal values from
-	#the deterministic model called here avg_instance
+	#the deterministic model, dm_result as returned by solve_dm
 
 	import os, sys
 	from collections import deque, defaultdict
@@ -128,30 +128,13 @@ def solve_ef_fix(ef_options,avg_instance):
 	sif = ScenarioTreeInstanceFactory(ef_options.model_directory, ef_options.instance_directory, ef_options.verbose)
 	scenario_tree = GenerateScenarioTreeForEF(ef_options, sif)
 	ef = EFAlgorithmBuilder(ef_options, scenario_tree)
-	
-	time_fut        = avg_instance.time_future.data()
-	techs           = avg_instance.tech_all.data()
-	dV_Capacity     = avg_instance.V_Capacity.get_values()     #Getting dec vars that matters to be fixed
-	#dV_HydroStorage = avg_instance.V_HydroStorage.get_values()
 
-	#Storing techs and future time periods in vector for easy access
-	vtime_fut = [0] * len(time_fut)
-	k = 0
-	for iaux in time_fut:
-		vtime_fut[k] = iaux
-		k = k+1
-	
-	#Fixing Capacity values for first stage at the ef instance with values from the deterministic instance
-	for iaux1 , iaux2 in dV_Capacity:
-		if iaux2 == vtime_fut[0]:
-			ef._binding_instance.S0s0s0.V_Capacity[iaux1, iaux2].fix(dV_Capacity[iaux1,iaux2])					
-			#ef._binding_instance.S0.V_Capacity[iaux1, iaux2].fix(3)  #just for checking if fixing at one scen also fix in the other - ok for now
+	#Fixing Capacity values for first stage at the ef instance with values from the deterministic model
+	#(fixing them in one scenario also fixes the others, through the non-anticipativity constraints)
+	scenario = getattr(ef._binding_instance, ef._scenario_tree._scenarios[0]._name)
+	for tech, vintage, capacity in dm_result['capacity']:
+		scenario.V_Capacity[tech, vintage].fix(capacity)
 
-	#Fixing Hydro Storage values for first stage
-	#for iaux1 , iaux2 in dV_HydroStorage:
-	#	if iaux2 == vtime_fut[0]:
-	#		ef._binding_instance.S0s0.V_HydroStorage[iaux1, iaux2].fix(dV_HydroStorage[iaux1,iaux2])
-				
 	f = open(os.devnull, 'w'); sys.stdout = f
 	ef.solve()
 	#ef.save_solution() # This line saves the results into two csv files
@@ -160,63 +143,25 @@ def solve_ef_fix(ef_options,avg_instance):
 	root_node = ef._scenario_tree._stages[0]._tree_nodes[0]
 	return root_node.computeExpectedNodeCost()	
 
-def solve_dm(p_model, p_data, opt_solver):
+def solve_dm(p_model, p_data, opt_solver, dat = 'AverageModel.dat'):
 	#This function solves a deterministic model with the inputs for 
 	#uncertainty values represented by their average values at each stage
-	#We assume the ReferenceModel.dat as the average problem properly represented
-	#inside the stochastic folder 
-
-	def return_obj(instance):
-		from pyomo.core import Objective
-		obj = instance.component_objects(Objective, active = True)
-		obj_values = list()
-		for o in obj:
-			# See section 18.6.3 in Pyomo online doc
-			method_obj = getattr(instance, str(o))
-			obj_values.append(method_obj())
-		# Assuming there is only one objective function
-		return obj_values[0]
+	#We assume the AverageModel.dat as the average problem properly represented
+	#inside the stochastic folder
+	#The solve is done by solve_dats of the EVPI script, its result is cached in
+	#p_data/solve_cache.json and holds the first stage capacity used by solve_ef_fix
 
 	import sys, os
-	from collections import deque, defaultdict
-	from pyomo.core import Objective, Var #not sure if Var is right after the Objective
-
-	(head, tail) = os.path.split(p_model)
-	sys.path.insert(0, head)
-	pwd = os.getcwd()
-	os.chdir(p_data)
-
-	model_module = __import__(tail[:-3], globals(), locals())
-	model = model_module.model
-	dm_result = {'cost': list(), 'flowin': list(), 'flowout': list(), 'capacity': list()}
-   
-	data = DataPortal(model=model)
-
-	dat = "AverageModel.dat" #Loading the model from the data file
-	data.load(filename=dat)
-    
-	instance = model.create_instance(data) #Defining the model instance with the data from .dat file
-	optimizer = SolverFactory(opt_solver)  #Defining the optimization solver
-	results = optimizer.solve(instance)    #Solving the optimization model
-
-	instance.solutions.load_from(results)  #Saving solutions in memory
+	from EVPI_new import solve_dats
 
-	#Getting objective function values
-	obj_val = return_obj(instance)
-	dm_result['cost'].append(obj_val)
+	job = (dat, [os.path.join(p_data, dat)], True)
+	cache_file = os.path.join(p_data, 'solve_cache.json')
+	dm_result = solve_dats(p_model, [job], opt_solver, cache_file=cache_file)[dat]
 
 	#Writting to the Shell
 	sys.stdout.write('\nSolved deterministic model with uncertainty at average valures \n')
-	sys.stdout.write('    Total cost: {}\n'.format(obj_val))
-	os.chdir(pwd)
-	return instance #Returning instance solved, values will be used later
-
-def runEVPI():
-	from EVPI import *
-
-	#EVPI_value = test_twotechs_vss_base()
-	EVPI_value = test_sudan_VSS()
-	return EVPI_value
+	sys.stdout.write('    Total cost: {}\n'.format(dm_result['cost']))
+	return dm_result #Returning the objective function value and first stage capacity
 
 def runECIU():
 	from time import time
@@ -228,11 +173,13 @@ def runECIU():
 	folder_string = "stochastic/utopia_vss/"
 	os.system("python temoa_model/ --eciu " + folder_string)	
 
-def runVSS():
+def runVSS(p_model, p_data, optsolver = 'cplex', ncpus = 1):
 	#This is the main function. It calls 1) Extensive Form 2)Deterministic LP 3)Fixed Extensive Form
 	#After results of 1) and 3) are obtained it computes the VSS
 	#As input, this function requires the path of the stochastic folder and temoa_stochastic.py file
-	#It assumes that an instance named ReferenceModel.dat is located inside the stochastic folder
+	#It assumes that an instance named AverageModel.dat is located inside the stochastic folder
+	#The deterministic LP is solved along with the perfect sight scenarios (used for the EVPI)
+	#by ncpus processes, results are cached in the stochastic folder
 
 	from time import time
 	import sys
@@ -240,20 +187,18 @@ def runVSS():
 	from subprocess import call
 	import sqlite3
 	import csv
+	from EVPI_new import solve_pf, compute_evpi
 
 	sys.stderr.write('\nFinding the Value of the Stochastic Solution using Temoa\n')
 
-	p_model = '/home/arqueiroz/SSudan/S1_2_H/temoa_model/temoa_stochastic.py'
-	p_data  = '/home/arqueiroz/SSudan/S1_2_H/stochastic/S_Sudan_original_stoch_cap_cost_11'
-	optsolver = 'cplex'
-
 	#---------------------
 	#Solving the deterministic model with average values
 	#---------------------
-	sys.stderr.write('\nSolving perfect sight with uncertainty at average values\n')
-	dm_instance = solve_dm(p_model, p_data, optsolver) #Here we have all the information with respect to objfunc and decvars
-	
-	zdm_result = dm_instance.TotalCost.value
+	sys.stderr.write('\nSolving perfect sight with uncertainty at average values and for each scenario\n')
+	pf_result = solve_pf(p_model, p_data, optsolver, ncpus, mean_value_dat='AverageModel.dat')
+	dm_result = pf_result['mv'] #Here we have all the information with respect to objfunc and decvars
+
+	zdm_result = dm_result['cost']
 	#---------------------
 	#Solving the extensive model for the recoursive problem
 	#---------------------
@@ -273,16 +218,17 @@ def runVSS():
 	#---------------------
 	#Solving the extensive model fixing variables for stage 1
 	#---------------------
-	ef_result_fixed = solve_ef_fix(ef_options,dm_instance)
+	ef_result_fixed = solve_ef_fix(ef_options,dm_result)
 
 	#Compute the value of the stochastic solution (vss = z_eev - z_rp)
-	return ef_result, ef_result_fixed, zdm_result
+	return ef_result, ef_result_fixed, zdm_result, compute_evpi(ef_result, pf_result)
 
 if __name__ == '__main__':
-	vZrp, vZeev, vZdm  = runVSS()
+	p_model = '/home/arqueiroz/SSudan/S1_2_H/temoa_model/temoa_stochastic.py'
+	p_data  = '/home/arqueiroz/SSudan/S1_2_H/stochastic/S_Sudan_original_stoch_cap_cost_11'
+	vZrp, vZeev, vZdm, vEVPI = runVSS(p_model, p_data, 'cplex')
 	print ('---------------------------------------------------------')
 	print ('---------------------------------------------------------')
-	vEVPI = runEVPI()
 	print ('---------------------------------------------------------')
 	print ('---------------------------------------------------------')
 	#runECIU()
@@ -26,17 +26,20 @@ import sys
 
 from cStringIO import StringIO
 from itertools import product
+from multiprocessing import Pool, cpu_count
 from pprint import pformat
 from shutil import copy as copyfile, rmtree
 from textwrap import TextWrapper
 
 import pyomo.environ
+from pyomo.core import Constraint, Objective
 from pyomo.core.base.sets import _SetProduct, SimpleSet
 
 SE = sys.stderr
 instance = None
 
 node_count = 0
+layouts = None  # printed indices of each parameter and stage (see set_layouts)
 stringify = lambda x: ', '.join(str(i) for i in x)
 
 class Storage ( ):
@@ -49,6 +52,9 @@ class Storage ( ):
 class Param ( object ):
 	# will be common to all Parameters, so no sense in storing it N times
 	stochasticset = None
+	key_cache  = dict()  # (param, spoint, index) -> (model_keys, my_keys, values)
+	rate_cache = dict()  # (param, spoint, index, rates) -> rate of each key
+	layout_cache = dict()  # (param, spoint) -> printed index of each key, sorted
 
 	  # this saves a noticeable amount of memory, and mild decrease in time
 	__slots__ = ('items', 'name', 'spoint', 'param', 'my_keys', 'model_keys',
@@ -74,7 +80,6 @@ class Param ( object ):
 			indices = [ getname(i) for i in pindex.set_tuple ]
 			skeys = lambda: (' '.join(str(i) for i in k) for k in self.model_keys)
 
-			keys = param.keys()
 			f = lambda x: x[pidx] == spoint
 			r = lambda x: tuple(x[0:pidx] + x[pidx+1:])
 			    # reduce keys to remove stochastic parameter
@@ -84,37 +89,53 @@ class Param ( object ):
 			indices = (param._index.name,)
 			skeys = lambda: (' '.join(str(i) for i in self.model_keys) )
 
-			keys = param.keys()
 			f = lambda x: x[pidx] == spoint
 			r = lambda x: tuple(x[0:pidx] + x[pidx +1:])
 
-		# we filter out the spoint because it's inherently known by TreeNode,
-		# which "owns" /this/ Param
-		model_keys = filter( f, keys )
-		my_keys    = map( r, model_keys )
+		# The keys and model values of a parameter at a stochastic point, and the
+		# rate of each key for a decision, are the same for every node of a stage,
+		# so they are only found once rather than once per node.
+		ckey = (name, spoint, pidx)
+		if ckey not in Param.key_cache:
+			# we filter out the spoint because it's inherently known by TreeNode,
+			# which "owns" /this/ Param
+			model_keys = filter( f, param.keys() )
+			my_keys    = map( r, model_keys )
+			values = list()
+			for actual in model_keys:
+				try:
+					values.append( param[ actual ] )   # pulled from model
+				except ValueError:
+					values.append( 0 )
+			Param.key_cache[ ckey ] = (model_keys, my_keys, values)
+		model_keys, my_keys, values = Param.key_cache[ ckey ]
+
+		rkey = ckey + (tuple( tuple(i) for i in rates ),)
+		if rkey not in Param.rate_cache:
+			my_rates = list()
+			for mine in my_keys:
+				rate = 1
+
+				for pattern, r in rates:
+					keys = pattern.split(',')
+					match = True
+					for p, t in zip(keys, mine):  # "pattern", "test"
+						if '*' == p: continue
+						if t != p:
+							match = False
+							break
+					if match:
+						rate = r
+						break
+				my_rates.append( rate )
+			Param.rate_cache[ rkey ] = my_rates
+		my_rates = Param.rate_cache[ rkey ]
 
 		items = dict()
 
-		for actual, mine in zip(model_keys, my_keys):
-			rate = 1
-
-			for pattern, r in rates:
-				keys = pattern.split(',')
-				match = True
-				for p, t in zip(keys, mine):  # "pattern", "test"
-					if '*' == p: continue
-					if t != p:
-						match = False
-						break
-				if match:
-					rate = r
-					break
-
+		for mine, value, rate in zip(my_keys, values, my_rates):
 			items[ mine ] = Storage()
-			try:
-				items[ mine ].value = param[ actual ]   # pulled from model
-			except ValueError:
-				items[ mine ].value = 0
+			items[ mine ].value = value
 			items[ mine ].rate  = rate
 
 		self.items      = items
@@ -148,58 +169,75 @@ class Param ( object ):
 	__repr__ = __str__
 
 
-	def as_ampl ( self, comment='' ):
-		pindex = self.param.index_set()
-		if comment:
-			comment = '# Decision: %s\n\n' % str(comment)
-
-		keys = self.skeys()
-		if isinstance( keys, str ):
-			keys = [ keys ]
-
-		# Together, these functions return the length of a printed version of a
-		# number, in characters.  They are used to make columns of data line up so
-		# one may have an easier time getting an overall sense of a data file.
-		def get_int_padding ( v ):
-			return len(str(int(v)))
+	def layout ( self ):
+		# The printed (and sorted) indices are the same for every node of a stage,
+		# as (printed index, key) pairs.  Like get_int_padding (see format_param),
+		# this returns the length of a printed index, so that columns line up.
 		def get_str_padding ( index ):
 			def anonymous_function ( obj ):
 				val = obj[ index ]
 				return len(str(val))
 			return anonymous_function
 
-		keys = tuple( tuple(i.split()) for i in keys )
-		vals = tuple( self[i].value for i in self.my_keys )
-		int_padding = max(map( get_int_padding, vals ))
-		str_padding = [
-		  max(map( get_str_padding(i), keys ))
-		  for i in range(len(keys[0]))
-		]
-		str_format = '  %-{}s' * len( self.model_keys[0] )
-		str_format = str_format.format(*str_padding)
+		lkey = (self.name, self.spoint)
+		if lkey not in Param.layout_cache:
+			keys = self.skeys()
+			if isinstance( keys, str ):
+				keys = [ keys ]
 
-		format = '\n%%s   %%%ds%%s' % int_padding
-		# works out to something like '\n  %s   %8d%-6s'
-		#                                 index { val }
+			keys = tuple( tuple(i.split()) for i in keys )
+			str_padding = [
+			  max(map( get_str_padding(i), keys ))
+			  for i in range(len(keys[0]))
+			]
+			str_format = '  %-{}s' * len( self.model_keys[0] )
+			str_format = str_format.format(*str_padding)
 
-		data = StringIO()
-		data.write( comment + 'param  %s  :=' % self.name )
-		for actual_key, this_key in sorted( zip( self.model_keys, self.my_keys )):
-			v = self[this_key].value
-			int_part = str(int(abs(v)))
-			if int_part != str(abs(v)):
-				dec_part = str(abs(v))[len(int_part):]
-			else:
-				dec_part = ''
+			Param.layout_cache[ lkey ] = [
+			  (str_format % tuple(actual_key), this_key)
+			  for actual_key, this_key in sorted( zip( self.model_keys, self.my_keys ))
+			]
+		return Param.layout_cache[ lkey ]
 
-			if v < 0: int_part = '-%d' % int_part
-			index = str_format % tuple(actual_key)
-			data.write( format % (index, int_part, dec_part) )
-		data.write( '\n\t;\n' )
 
-		#return comment + data
-		return data.getvalue()
+	def as_ampl ( self, comment='' ):
+		layout = self.layout()
+		return format_param( self.name, [ index for index, this_key in layout ],
+		  [ self.items[this_key].value for index, this_key in layout ], comment )
+
+
+
+def format_param ( name, indices, vals, comment='' ):
+	# Returns the AMPL data of a parameter, given its printed indices (see
+	# Param.layout) and their values
+	if comment:
+		comment = '# Decision: %s\n\n' % str(comment)
+
+	# Together, these functions return the length of a printed version of a
+	# number, in characters.  They are used to make columns of data line up so
+	# one may have an easier time getting an overall sense of a data file.
+	def get_int_padding ( v ):
+		return len(str(int(v)))
+	int_padding = max(map( get_int_padding, vals ))
+
+	format = '\n%%s   %%%ds%%s' % int_padding
+	# works out to something like '\n  %s   %8d%-6s'
+	#                                 index { val }
+
+	data = StringIO()
+	data.write( comment + 'param  %s  :=' % name )
+	for index, v in zip( indices, vals ):
+		int_part = str(int(abs(v)))
+		if int_part != str(abs(v)):
+			dec_part = str(abs(v))[len(int_part):]
+		else:
+			dec_part = ''
+
+		if v < 0: int_part = '-%d' % int_part
+		data.write( format % (index, int_part, dec_part) )
+	data.write( '\n\t;\n' )
 
+	return data.getvalue()
 
 
 class TreeNode ( object ):
@@ -250,31 +288,66 @@ class TreeNode ( object ):
 		return space + repr(self) + '\n' + x
 
 
-	def write_dat_files ( self ):
+	def write_dat_files ( self, ncpus=1 ):
 		global node_count
 
-		# Step 1: Write my own file, if necessary
-		if self.prob < 1:
-			params = self.params.values()
-			data = params[0].as_ampl( self.name )
-			if len( params ) > 1:
-				data += '\n' + '\n'.join(p.as_ampl() for p in params[1:])
+		# Step 1: Pass the values of every node down to its children (the values of
+		# a node only depend on its ancestors, so files may then be written in any
+		# order)
+		nodes = [ node.dat_values() for node in self.propagate_values() ]
+
+		# Step 2: Write the files, in parallel if requested.  Each worker is sent
+		# the printed indices of every parameter once, and the values of each node
+		# as the argument of write_node, so that it does not depend on the nodes
+		# (and the model instance they refer to) of this process, whether the
+		# workers are forked or spawned (e.g., on Windows).
+		layouts = dict(
+		  (lkey, [ index for index, this_key in layout ])
+		  for lkey, layout in Param.layout_cache.iteritems()
+		)
+		if ncpus > 1:
+			pool = Pool( ncpus, set_layouts, (layouts,) )
+			written = pool.imap_unordered( write_node, nodes, chunksize=8 )
 		else:
-			data = '# Decision: HedgingStrategy (no change from R.dat)\n'
+			pool = None
+			set_layouts( layouts )
+			written = (write_node( node ) for node in nodes)
 
-		with open( self.bname + '.dat', 'w' ) as f:
-			f.write( data )
+		for i in written:
+			node_count += 1
+			inform( '\b' * (len(str(node_count -1))+1) + str(node_count) + ' ' )
 
-		node_count += 1
-		inform( '\b' * (len(str(node_count -1))+1) + str(node_count) + ' ' )
+		if pool:
+			pool.close()
+			pool.join()
 
-		# Step 2: Tell my children to write their files
+
+	def propagate_values ( self ):
+		# Returns this node and its descendants, depth first
+		nodes = [ self ]
 		for c in self.children:
 			for p in self.params:
 				cp = c.params[p]
 				for key in self.params[p]:
 					cp[key].value = self.params[p][key].value * cp[key].rate
-			c.write_dat_files()
+			nodes += c.propagate_values()
+
+		return nodes
+
+
+	def dat_values ( self ):
+		# Returns the file name, the decision and the values of every parameter
+		# (keyed as Param.layout_cache, in the order of its printed indices) of
+		# this node, as plain data that may be sent to another process.  The root
+		# node has no decision.
+		if self.prob < 1:
+			params = [
+			  ((p.name, p.spoint), [ p.items[this_key].value for index, this_key in p.layout() ])
+			  for p in self.params.values()
+			]
+			return self.bname, self.name, params
+
+		return self.bname, None, []
 
 	def get_scenario_data ( self ):
 		nodes     = [ self.bname ]
@@ -298,6 +371,65 @@ class TreeNode ( object ):
 
 		return scenarios, nodes, nodestage, children, probability
 
+def set_layouts ( node_layouts ):
+	# Printed indices of each parameter and stage, used by write_node
+	global layouts
+	layouts = node_layouts
+
+
+def write_node ( node ):
+	# Each file is formatted in memory and written at once
+	bname, decision, params = node
+	if decision is not None:
+		data = '\n'.join(
+		  format_param( lkey[0], layouts[ lkey ], vals, decision if i == 0 else '' )
+		  for i, (lkey, vals) in enumerate( params )
+		)
+	else:
+		data = '# Decision: HedgingStrategy (no change from R.dat)\n'
+
+	with open( bname + '.dat', 'w' ) as f:
+		f.write( data )
+
+	return bname
+
+
+def stage_variables ( stochasticset ):
+	# Returns the names of the variables of each stage (stochastic element), in
+	# the order of ScenarioStructure.dat.  Each sparse index set of the model
+	# (built from Efficiency and processVintages) is scanned once and bucketed
+	# by period, rather than scanning every variable once per stage.
+	# flows in, flows out, new capacity, emissions (added 9/20/2019, based on
+	# pformat_results.py), activity by output and available capacity
+	buckets = dict( (se, tuple(set() for i in range(6))) for se in stochasticset )
+
+	for index in instance.FlowVar_psditvo:
+		b = buckets.get( index[0] )
+		if b is None: continue
+		b[0].add( 'V_FlowIn[{},{},{},{},{},{},{}]'.format( *index ))
+		b[1].add( 'V_FlowOut[{},{},{},{},{},{},{}]'.format( *index ))
+		if index[5] == index[0]:  # processes built in this period
+			b[2].add( 'V_Capacity[{},{}]'.format( index[4], index[5] ))
+
+	for e, p, t in instance.EmissionActivityByPeriodAndTech_ept:
+		if p in buckets:
+			buckets[p][3].add( 'V_EmissionActivityByPeriodAndTech[{},{},{}]'.format( e, p, t ))
+
+	for p, t, c in instance.ActivityByPeriodTechAndOutput_pto:
+		if p in buckets:
+			buckets[p][4].add( 'V_ActivityByPeriodTechAndOutput[{},{},{}]'.format( p, t, c ))
+
+	for p, t in instance.CapacityAvailableVar_pt:
+		if p in buckets:
+			buckets[p][5].add( 'V_CapacityAvailableByPeriodAndTech[{},{}]'.format( p, t ))
+
+	stage_vars = dict()
+	for se, b in buckets.items():
+		stage_vars[ se ] = [ v for names in b for v in sorted( names ) ]
+
+	return stage_vars
+
+
 def write_scenario_file ( stochasticset, tree ):
 	( scenarios,
 	  nodes,
@@ -329,81 +461,10 @@ def write_scenario_file ( stochasticset, tree ):
 	# XXX: Absolute hack, that currently only works for Temoa models.  I have
 	# not yet thought about how to make this generic.  Can it be done?
 
+	stage_vars = stage_variables( stochasticset )
 	stage_var_sets = list()
 	for se in stochasticset:  # se = "stochastic element"
-		flow_keys = [index for index in instance.V_FlowOut.keys()
-		             if index[0] == se]
-		processes = [(t, v) for p, s, d, i, t, v, o in flow_keys
-		             if v == se]
-					 
-		stage_vars = list()
-		stage_vars.extend(
-		  sorted(set('V_FlowIn[{},{},{},{},{},{},{}]'.format( *index )
-		    for index in flow_keys )))
-		stage_vars.extend(
-		  sorted(set('V_FlowOut[{},{},{},{},{},{},{}]'.format( *index )
-		    for index in flow_keys )))
-		stage_vars.extend(
-		  sorted(set('V_Capacity[{},{}]'.format( *index )
-		     for index in processes )))
-			 
-			 
-		
-			 
-		#==========================================================================
-		# New outputs - Added 9/20/2019 (Based on pformat_results.py, lines 105-179)
-			
-		#----------------------------------#
-		# V_EmissionActivityByPeriodAndTech
-		#----------------------------------#
-		emission_keys = [(e,p,t) for e, p, t in instance.V_EmissionActivityByPeriodAndTech.keys()
-			if p == se]		
-		# inform( str(emission_keys) )
-		stage_vars.extend(
-		  sorted(set('V_EmissionActivityByPeriodAndTech[{},{},{}]'.format( *index )
-		     for index in emission_keys )))
-		# stage_vars.extend(
-		     # for index in processes )))
-		# stage_vars.extend(
-		  # sorted(set('V_HourlyStorage[{},{},{},{}]'.format( *index )
-		     # for index in processes )))
-			 
-		#----------------------------------#
-		# V_ActivityByPeriodAndProcess
-		#----------------------------------#
-		# inform( str(instance.V_ActivityByPeriodAndProcess.keys()) )  # Debugging only
-		# activity_keys = [(p,t,v) for p,t,v in instance.V_ActivityByPeriodAndProcess.keys()
-			# if p == se]
-		# stage_vars.extend(
-		  # sorted(set('V_ActivityByPeriodAndProcess[{},{},{}]'.format( *index )
-		     # for index in activity_keys )))
-			 
-		#----------------------------------#
-		# V_ActivityByPeriodTechAndOutput
-		#----------------------------------#
-		# inform( str(instance.V_ActivityByPeriodTechAndOutput.keys()) )  # Debugging only
-		activity_keys = [(p,t,c) for p,t,c in instance.V_ActivityByPeriodTechAndOutput.keys()
-			if p == se]
-		stage_vars.extend(
-		  sorted(set('V_ActivityByPeriodTechAndOutput[{},{},{}]'.format( *index )
-		     for index in activity_keys )))
-		
-		#----------------------------------#
-		# V_CapacityAvailableByPeriodAndTech
-		#----------------------------------#
-		# inform( str(instance.V_CapacityAvailableByPeriodAndTech.keys()) )  # Debugging only
-		capacity_keys = [(p,t) for p,t in instance.V_CapacityAvailableByPeriodAndTech.keys()
-			if p == se]
-		stage_vars.extend(
-		  sorted(set('V_CapacityAvailableByPeriodAndTech[{},{}]'.format( *index )
-		     for index in capacity_keys )))
-
-
-		# To write entire pyomo model to a text file - takes awhile
-		# instance.pprint(filename='pyomo_model.txt')
-		#==========================================================================
-
-		stage_var_sets.append( stages_fmt.format( se, '\n  '.join( stage_vars )))
+		stage_var_sets.append( stages_fmt.format( se, '\n  '.join( stage_vars[se] )))
 
 	stage_var_sets = '\n\n'.join( stage_var_sets )
 
@@ -581,6 +642,16 @@ def test_model_parameters ( M, opts ):
 		raise ValueError( msg.format(M.name, pname) )
 
 
+def remove_model_equations ( M ):
+	# Only the sets, parameters and variable indices of the model are used to
+	# build the tree, so the constraints and objectives (the bulk of the time
+	# spent creating an instance) are removed from the abstract model to avoid
+	# generating their expressions in the concrete instance.
+	for ctype in ( Objective, Constraint ):
+		for component in list( M.component_objects( ctype )):
+			M.del_component( component )
+
+
 def usage ( ):
 	SE.write("""
 synopsis: pyomo_python  {0}  <options_to_import.py>
@@ -647,6 +718,7 @@ def main ( ):
 	sys.path.pop(0)
 
 	test_model_parameters( M, opts )
+	remove_model_equations( M )
 
 	inform( '\r[%6.2f\n' % duration() )
 
@@ -677,8 +749,13 @@ def main ( ):
 	global node_count
 	node_count = 0
 
+	try:
+		ncpus = opts.ncpus
+	except AttributeError:
+		ncpus = cpu_count()
+
 	inform( '[      ] Writing scenario "dot dat" files:       ')
-	tree.write_dat_files()
+	tree.write_dat_files( ncpus )
 	write_scenario_file( all_spoints, tree )
 	inform( '\r[%6.2f] Writing scenario "dot dat" files\n' % duration() )
 
@@ -6,9 +6,21 @@ from .help_functions import create_results_dir
 from .help_functions import create_dir
 from .move_data_to_universal_db import move_data_to_db
 from .temoa_model_build import build
+from .temoa_model_build import clear_build_cache
 from .temoa_model_build import createSensitivityCases
 from .temoa_model_build import createMonteCarloCases
 from .temoa_model_run import run
+from .temoa_model_run import run_in_process
+from .temoa_model_batch import create_batch_cases
+from .temoa_model_batch import run_batch
+from .analyze_sql import open_db
+from .analyze_sql import read_table
+from .analyze_sql import close_db
+from .analyze_sql import expand_scenario_tree
+from .analyze_sql import read_metadata
+from .analyze_sql import sector_techs
+from .analyze_sql import aggregate_outputs
+from .analyze_sql import to_frame
 from .analyze_activity_tod import getActivityTOD
 from .analyze_activity_year import getActivity
 from .analyze_capacity import getCapacity
@@ -16,11 +28,30 @@ from .analyze_capacity_new import getCapacityNew
 from .analyze_costs import getCosts
 from .analyze_emissions import getEmissions
 from .fragility_curves import fragility
+from .fragility_curves import fragility_batch
+from .fragility_curves import fragility_table
+from .fragility_curves import register_fragility
+from .hurricane_damage import HurricaneClimatology
+from .hurricane_damage import sample_cap_reduction
+from .hurricane_damage import write_cap_reduction_nodes
+from .hurricane_damage import write_cap_reduction_db
+from .scenario_tree import ScenarioTree
 from .stochastic_postprocessing import stoch_expand
 from .stochastic_postprocessing import stoch_resample
+from .stochastic_postprocessing import stoch_weight
+from .stochastic_postprocessing import stoch_sample
+from .stochastic_postprocessing import scenario_probs
+from .stochastic_postprocessing import weighted_mean
+from .stochastic_postprocessing import weighted_std
+from .stochastic_postprocessing import weighted_quantile
+from .stochastic_postprocessing import weighted_cdf
+from .stochastic_postprocessing import weighted_hist
+from .stochastic_postprocessing import weighted_stats
 from .combine_data_files import combine
 from .monte_carlo_inputs import createMonteCarloCases_distributions
 from .combined_analysis import analyze_db
+from .analyze_store import analyze_dbs
+from .analyze_store import read_store
 
 # storing where resources folder is
 resource_path = os.path.join(os.path.split(__file__)[0], "resources")
\ No newline at end of file
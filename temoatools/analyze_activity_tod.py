@@ -1,5 +1,4 @@
 import os
-import sqlite3
 import pandas as pd
 import temoatools as tt
 
@@ -111,53 +110,33 @@ def getActivityTOD(folders, dbs, switch='fuel', sector_name='electric', save_dat
 
 
 # ==============================================================================
-def SingleDB(folder, db, switch='fuel', sector_name='electric', conversion=277.777778):
+def SingleDB(folder, db, switch='fuel', sector_name='electric', conversion=277.777778,
+             context=None):
     #    inputs:
     #    1) folder          - path containing db
     #    2) db              - name of database
     #    3) switch          - 'fuel' or 'tech', basis of categorization
     #    4) sectorName      - name of temoa sector to be analyzed
     #    5) conversion      - conversion to GWh, default is 277.778 (from PJ)
+    #    6) context         - optional, from open_db, shares the connection and tables read between analyses
     #    outputs:
     #    1) activity     - pandas DataFrame holding capacity for each model year
     # ==============================================================================
     print("\tAnalyzing db: ", db)
 
-    # save original folder
-    origDir = os.getcwd()
-
-    # move to folder
-    os.chdir(folder)
-
-    # Connect to Database
-    con = sqlite3.connect(db)
-    cur = con.cursor()
+    # Connect to Database, unless a context holding the connection and tables already read is provided
+    close = context is None
+    if close:
+        context = tt.open_db(folder, db)
+    con = context['con']
 
     # Read from database:
-    #   Select All Efficiencies
-    qry = "SELECT * FROM Efficiency"
-    cur.execute(qry)
-    db_efficiency = cur.fetchall()
     #   Select All time_of_day
-    qry = "SELECT * FROM time_of_day"
-    cur.execute(qry)
-    db_time_of_day = cur.fetchall()
+    db_time_of_day = tt.read_table(context, 'time_of_day')
     #   Select All time_season
-    qry = "SELECT * FROM time_season"
-    cur.execute(qry)
-    db_time_season = cur.fetchall()
-    #   Select All time_periods
-    qry = "SELECT * FROM time_periods"
-    cur.execute(qry)
-    db_t_periods = cur.fetchall()
-    #   Select All technologies
-    qry = "SELECT * FROM technologies"
-    cur.execute(qry)
-    db_technologies = cur.fetchall()
-    #   Select All Flows
-    qry = "SELECT * FROM Output_VFlow_Out"
-    cur.execute(qry)
-    db_Output_VFlow_Out = cur.fetchall()
+    db_time_season = tt.read_table(context, 'time_season')
+    #   Technologies, fuels, future periods and scenarios
+    metadata = tt.read_metadata(context)
 
     # Review db_time_of_day to select timesOfDay
     tods = []
@@ -170,26 +149,12 @@ def SingleDB(folder, db, switch='fuel', sector_name='electric', conversion=277.7
         seasons.append(str(season[0]))
     n_seasons = len(seasons)
 
-    # Review db_t_periods to select future periods
-    future_t_periods = []
-    for t_periods, flag in db_t_periods:
-        if flag == 'f':
-            if t_periods not in future_t_periods:
-                future_t_periods.append(t_periods)
-
-    # Review db_technologies to select related sector
-    techs = []
-    for tech, flag, sector, tech_desc, tech_category in db_technologies:
-        if sector == sector_name or sector_name == "all":
-            if tech not in techs:
-                techs.append(tech)
-
-    # Review db_efficiency to create a dictionary of fuels
-    d = {}
-    for input_comm, tech, vintage, output_comm, efficiency, ef_notes in db_efficiency:
-        if tech in techs:
-            if tech not in d.keys():
-                d[tech] = input_comm
+    # Future time periods
+    future_t_periods = metadata['future_periods']
+
+    # Technologies of the related sector and their fuels
+    techs = tt.sector_techs(metadata, sector_name)
+    d = {tech: metadata['fuel'][tech] for tech in techs if tech in metadata['fuel']}
 
     # Sort data and assign as columns and rows
     if switch == 'fuel':
@@ -198,32 +163,22 @@ def SingleDB(folder, db, switch='fuel', sector_name='electric', conversion=277.7
         cols = sorted(techs)
 
     #   Identify Unique Scenarios
-    qry = "SELECT * FROM Output_Objective"
-    cur.execute(qry)
-    db_objective = cur.fetchall()
-    scenarios = []
-    for scenario, objective_name, total_system_cost in db_objective:
-        if scenario not in scenarios:
-            scenarios.append(scenario)
+    scenarios = metadata['scenarios']
 
     # Create pandas DataFrame to hold activity for all scenarios
     index = pd.MultiIndex.from_product([[db], scenarios, cols, future_t_periods[:-1], seasons, tods],
                                        names=['database', 'scenario', 'fuelOrTech', 'year', 'season', 'tod'])
-    df = pd.DataFrame(index=index, columns=['value'], dtype='float64')
-    df = df.fillna(0.0)  # Default value to zero
 
-    # Review db_Output_VFlow_Out to fill data frame
-    for scenario, sector, t_periods, t_season, t_day, input_comm, tech, vintage, output_comm, vflow_out in db_Output_VFlow_Out:
-        if sector == sector_name or sector_name == "all":
-            if switch == 'fuel':
-                df.loc[(db, scenario, d[tech], t_periods, t_season, t_day), 'value'] = \
-                    df.loc[(db, scenario, d[tech], t_periods, t_season, t_day), 'value'] + vflow_out * conversion
-            elif switch == 'tech':
-                df.loc[(db, scenario, tech, t_periods, t_season, t_day), 'value'] = \
-                    df.loc[(db, scenario, tech, t_periods, t_season, t_day), 'value'] + vflow_out * conversion
+    # Sum Output_VFlow_Out within the database and fill data frame (default value of zero)
+    activity = tt.aggregate_outputs(con, 'Output_VFlow_Out', 'vflow_out', ['o.t_periods', 'o.t_season', 'o.t_day'],
+                                    ['year', 'season', 'tod'], switch=switch, sector_name=sector_name,
+                                    conversion=conversion, fuel=metadata['fuel'])
+    activity['database'] = db
+    df = tt.to_frame(activity, index)
 
-    # Return to original directory
-    os.chdir(origDir)
+    # Close connection, unless it is shared through context
+    if close:
+        tt.close_db(context)
 
     # Return results
     return df
@@ -1,5 +1,4 @@
 import os
-import sqlite3
 import pandas as pd
 import temoatools as tt
 
@@ -109,66 +108,35 @@ def getCapacity(folders, dbs, switch='fuel', sector_name='electric', save_data='
 
 
 # ==============================================================================
-def SingleDB(folder, db, switch='fuel', sector_name='electric'):
+def SingleDB(folder, db, switch='fuel', sector_name='electric', context=None):
     #    inputs:
     #    1) folder          - path containing db
     #    2) db              - name of databas
     #    3) switch          - 'fuel' or 'tech', basis of categorization
     #    5) sectorName      - name of temoa sector to be analyzed
+    #    6) context         - optional, from open_db, shares the connection and tables read between analyses
     #
     #    outputs:
     #    1) capacity     - pandas DataFrame holding capacity for each model year
     # ==============================================================================
     print("\tAnalyzing db: ", db)
 
-    # save original folder
-    origDir = os.getcwd()
+    # Connect to Database, unless a context holding the connection and tables already read is provided
+    close = context is None
+    if close:
+        context = tt.open_db(folder, db)
+    con = context['con']
 
-    # move to folder
-    os.chdir(folder)
+    # Read from database:
+    #   Technologies, fuels, future periods and scenarios
+    metadata = tt.read_metadata(context)
 
-    # Connect to Database
-    con = sqlite3.connect(db)
-    cur = con.cursor()
+    # Future time periods
+    future_t_periods = metadata['future_periods']
 
-    # Read from database:
-    #   Select All Efficiencies
-    qry = "SELECT * FROM Efficiency"
-    cur.execute(qry)
-    db_efficiency = cur.fetchall()
-    #   Select All time_periods
-    qry = "SELECT * FROM time_periods"
-    cur.execute(qry)
-    db_t_periods = cur.fetchall()
-    #   Select All technologies
-    qry = "SELECT * FROM technologies"
-    cur.execute(qry)
-    db_technologies = cur.fetchall()
-    #   Select All Capacities
-    qry = "SELECT * FROM Output_CapacityByPeriodAndTech"
-    cur.execute(qry)
-    db_Output_CapacityByPeriodAndTech = cur.fetchall()
-
-    # Review db_t_periods to select future time periods
-    future_t_periods = []
-    for t_periods, flag in db_t_periods:
-        if flag == 'f':
-            if t_periods not in future_t_periods:
-                future_t_periods.append(t_periods)
-
-    # Review db_technologies to select related sector
-    techs = []
-    for tech, flag, sector, tech_desc, tech_category in db_technologies:
-        if sector == sector_name or sector_name == "all":
-            if tech not in techs:
-                techs.append(tech)
-
-    # Review db_efficiency to create a dictionary of fuels
-    d = {}
-    for input_comm, tech, vintage, output_comm, efficiency, ef_notes in db_efficiency:
-        if tech in techs:
-            if tech not in d.keys():
-                d[tech] = input_comm
+    # Technologies of the related sector and their fuels
+    techs = tt.sector_techs(metadata, sector_name)
+    d = {tech: metadata['fuel'][tech] for tech in techs if tech in metadata['fuel']}
 
     # Sort data and assign as columns and rows
     if switch == 'fuel':
@@ -176,33 +144,23 @@ def SingleDB(folder, db, switch='fuel', sector_name='electric'):
     elif switch == 'tech':
         cols = sorted(techs)
 
-    future_t_periods = sorted(future_t_periods)
     rows = future_t_periods[:-1]
 
     #   Identify Unique Scenarios
-    qry = "SELECT * FROM Output_Objective"
-    cur.execute(qry)
-    db_objective = cur.fetchall()
-    scenarios = []
-    for scenario, objective_name, total_system_cost in db_objective:
-        if scenario not in scenarios:
-            scenarios.append(scenario)
+    scenarios = metadata['scenarios']
 
     # Create pandas DataFrame to hold yearlyEmissions for all scenarios
     index = pd.MultiIndex.from_product([[db], scenarios, cols], names=['database', 'scenario', 'fuelOrTech'])
-    df = pd.DataFrame(index=index, columns=future_t_periods[:-1], dtype='float64')
-    df = df.fillna(0.0)  # Default value to zero
-
-    # Review db_Output_CapacityByPeriodAndTech to fill data frame
-    for scenario, sector, t_periods, tech, capacity in db_Output_CapacityByPeriodAndTech:
-        if sector == sector_name or sector_name == "all":
-            if switch == 'fuel':
-                df.loc[(db, scenario, d[tech]), t_periods] = df.loc[(db, scenario, d[tech]), t_periods] + capacity
-            elif switch == 'tech':
-                df.loc[(db, scenario, tech), t_periods] = df.loc[(db, scenario, tech), t_periods] + capacity
-
-    # return to original folder
-    os.chdir(origDir)
+
+    # Sum Output_CapacityByPeriodAndTech within the database and fill data frame (default value of zero)
+    capacity = tt.aggregate_outputs(con, 'Output_CapacityByPeriodAndTech', 'capacity', ['o.t_periods'], ['year'],
+                                    switch=switch, sector_name=sector_name, fuel=metadata['fuel'])
+    capacity['database'] = db
+    df = tt.to_frame(capacity, index, pivot='year', columns=rows)
+
+    # Close connection, unless it is shared through context
+    if close:
+        tt.close_db(context)
 
     # return capacity as a DataFrame
     return df
@@ -1,6 +1,6 @@
 import os
-import sqlite3
 import pandas as pd
+import numpy as np
 import temoatools as tt
 
 debug = False
@@ -101,12 +101,13 @@ def getCosts(folders, dbs, elc_dmd='ELC_DMD', conversion=0.359971, save_data='N'
     # ==============================================================================
 
 
-def SingleDB(folder, db, elc_dmd='ELC_DMD', conversion=0.359971):
+def SingleDB(folder, db, elc_dmd='ELC_DMD', conversion=0.359971, context=None):
     #    inputs:
     #    1) folder          - path containing db
     #    2) db              - names of databases
     #    3) elc_dmd         - quantity that represents electricity demand
     #    4) conversion      - converts from cost units per activity to cents/kWH
+    #    5) context         - optional, from open_db, shares the connection and tables read between analyses
     #
     #    outputs:
     #    1) yearlyCosts     - pandas DataFrame holding yearly costs
@@ -114,308 +115,176 @@ def SingleDB(folder, db, elc_dmd='ELC_DMD', conversion=0.359971):
     # ==============================================================================
     print("\tAnalyzing db: ", db)
 
-    # Save original directory
-    origDir = os.getcwd()
-
-    # Move to folder
-    os.chdir(folder)
-
-    # Connect to Database
-    con = sqlite3.connect(db)
+    # Connect to Database, unless a context holding the connection and tables already read is provided
+    close = context is None
+    if close:
+        context = tt.open_db(folder, db)
+    con = context['con']
     cur = con.cursor()
 
-    #   Identify Unique Scenarios
-    qry = 'SELECT * FROM Output_Objective'
-    cur.execute(qry)
-    db_objective = cur.fetchall()
-    scenarios = []
-    for scenario, objective_name, total_system_cost in db_objective:
-        if scenario not in scenarios:
-            scenarios.append(scenario)
-
-    # Review time_periods, only interested in future periods
-    qry = 'SELECT * FROM time_periods'
-    cur.execute(qry)
-    db_t_periods = cur.fetchall()
-
-    t_periods = []
-    for t_period, flag in db_t_periods:
-        if flag == 'f':
-            t_periods.append(t_period)
-
-    t_periods = sorted(t_periods)
-    t_periods = t_periods[:-1]
-
-    # Review technologies  
-    qry = "SELECT * FROM technologies"
-    cur.execute(qry)
-    db_tech = cur.fetchall()
-
-    techs = []
-    for tech, flag, sector, tech_desc, tech_category in db_tech:
-        techs.append(tech)
-
-    # ------------
-    # CostInvest
-    # ------------
-    # Access database
-    qry = "SELECT * FROM CostInvest"
-    cur.execute(qry)
-    db_CostInvest = cur.fetchall()
-
-    # Create dataframe to hold technology costs (initialized to zero)
-    rows = t_periods
-    cols = techs
-    df_CostInvest = pd.DataFrame(data=0.0, index=rows, columns=cols, dtype='float64')
-
-    # Store Data
-    for tech, vintage, cost_invest, cost_invest_units, cost_invest_notes in db_CostInvest:
-        if vintage in t_periods and tech in techs:
-            df_CostInvest.loc[vintage, tech] = cost_invest
+    #   Identify Unique Scenarios and future time periods
+    metadata = tt.read_metadata(context)
+    scenarios = metadata['scenarios']
+    t_periods = metadata['future_periods'][:-1]
 
-    # ------------
-    # CostFixed
-    # ------------
-    # Access database
-    qry = "SELECT * FROM CostFixed"
-    cur.execute(qry)
-    db_CostFixed = cur.fetchall()
-
-    # Create dataframe to hold technology costs (initialized to zero)
-    rows = t_periods
-    cols = techs
-    df_CostFixed = pd.DataFrame(data=0.0, index=rows, columns=cols, dtype='float64')
+    # Technologies (table order sets the summation order and the LCOE discount rate)
+    techs = metadata['techs']
 
-    # Store Data
-    for periods, tech, vintage, cost_fixed, cost_fixed_units, cost_fixed_notes in db_CostFixed:
-        if periods in t_periods and tech in techs:
-            df_CostFixed.loc[periods, tech] = cost_fixed
+    # Indices used to place database rows into arrays
+    s_index = pd.Index(scenarios)
+    t_index = pd.Index(techs)
+    p_index = pd.Index(t_periods)
+    periods = np.array(t_periods, dtype='float64')
 
     # ------------
-    # CostVariable
+    # Costs (technology x period arrays, initialized to zero)
     # ------------
-    # Access database
-    qry = "SELECT * FROM CostVariable"
-    cur.execute(qry)
-    db_CostVariable = cur.fetchall()
+    cur.execute("SELECT tech, vintage, cost_invest FROM CostInvest")
+    CostInvest = to_array(cur.fetchall(), [t_index, p_index])
 
-    # Create dataframe to hold technology costs (initialized to zero)
-    rows = t_periods
-    cols = techs
-    df_CostVariable = pd.DataFrame(data=0.0, index=rows, columns=cols, dtype='float64')
+    cur.execute("SELECT tech, periods, cost_fixed FROM CostFixed")
+    CostFixed = to_array(cur.fetchall(), [t_index, p_index])
 
-    # Store Data
-    for periods, tech, vintage, cost_variable, cost_variable_units, cost_variable_notes in db_CostVariable:
-        if periods in t_periods and tech in techs:
-            df_CostVariable.loc[periods, tech] = cost_variable
+    cur.execute("SELECT tech, periods, cost_variable FROM CostVariable")
+    CostVariable = to_array(cur.fetchall(), [t_index, p_index])
 
     # ------------
-    # Global Discount Rate
+    # Discount Rate - Global and technology specific, assumes it is constant
     # ------------
     qry = "SELECT * FROM GlobalDiscountRate"
     cur.execute(qry)
     db_rate = cur.fetchall()
     rate_global = db_rate[0][0]
 
-    # ------------
-    # Discount Rate - Technology specific
-    # ------------
     qry = "SELECT * FROM DiscountRate"
     cur.execute(qry)
     db_rate_tech = cur.fetchall()
-    rate_tech = db_rate_tech
-    df_rate_tech = pd.DataFrame(rate_tech, columns=['tech', 'vintage', 'tech_rate', 'tech_rate_notes'])
+    df_rate_tech = pd.DataFrame(db_rate_tech, columns=['tech', 'vintage', 'tech_rate', 'tech_rate_notes'])
+    rate_tech = df_rate_tech.tech_rate.astype('float64').groupby(df_rate_tech.tech).mean()
+
+    rates = np.array([rate_tech[tech] if tech in rate_tech.index else rate_global for tech in techs])
 
     # ------------
     # LifetimeLoanTech
     # ------------
-    # Access database
-    qry = "SELECT * FROM LifetimeLoanTech"
-    cur.execute(qry)
-    db_loanLife = cur.fetchall()
-
-    # Create dataframe to hold yearly installs (initialized to zero)
-    rows = techs
-    cols = ["loan"]
-    df_loanLife = pd.DataFrame(data=0.0, index=rows, columns=cols, dtype='float64')
+    cur.execute("SELECT tech, loan FROM LifetimeLoanTech")
+    loanLife = to_array(cur.fetchall(), [t_index])
 
-    # Store Data
-    for tech, loan, loan_notes, in db_loanLife:
-        df_loanLife.loc[tech, "loan"] = loan
+    # ------------
+    # Activity and electricity demand (scenario x technology x period arrays)
+    # ------------
+    qry = "SELECT scenario, tech, t_periods, output_comm, vflow_out FROM Output_VFlow_Out"
+    cur.execute(qry)
+    db_activity = cur.fetchall()
+    activity = to_array([(s, tech, p, v) for s, tech, p, comm, v in db_activity], [s_index, t_index, p_index],
+                        accumulate=True)
+    ELC_DMD = to_array([(s, p, v) for s, tech, p, comm, v in db_activity if comm == elc_dmd], [s_index, p_index],
+                       accumulate=True)
 
-    # Create pandas DataFrame to hold yearlyEmissions for all scenarios
-    index = pd.MultiIndex.from_product([[db], scenarios], names=['database', 'scenario'])
-    yearlyCosts = pd.DataFrame(index=index, columns=t_periods, dtype='float64')
-    yearlyCosts = yearlyCosts.fillna(0.0)  # Default value to zero
-    LCOE = pd.DataFrame(index=index, columns=['LCOE'], dtype='float64')
-    LCOE = LCOE.fillna(0.0)  # Default value to zero
+    # ------------
+    # New Capacity
+    # ------------
+    cur.execute("SELECT scenario, tech, vintage, capacity FROM Output_V_Capacity")
+    newCapacity = to_array(cur.fetchall(), [s_index, t_index, p_index])
 
     # ------------
-    # Iterate through scenarios
+    # Active Capacity
     # ------------
+    cur.execute("SELECT scenario, tech, t_periods, capacity FROM Output_CapacityByPeriodAndTech")
+    activeCapacity = to_array(cur.fetchall(), [s_index, t_index, p_index])
+
     for s in scenarios:
         print("\t\tAnalyzing Scenario: ", s)
 
-        # Create dataframe to hold yearly costs (initialized to zero)
-        rows = t_periods
-        cols = ['CostInvest', 'CostFixed', 'CostVariable', 'CostTotal', 'ELC_DMD', 'ELC_Cost']
-        df = pd.DataFrame(data=0.0, index=rows, columns=cols, dtype='float64')
-
-        # ------------
-        # Activity
-        # ------------
-        # Access database
-        qry = "SELECT * FROM Output_VFlow_Out"
-        cur.execute(qry)
-        db_activity = cur.fetchall()
-
-        # Create dataframe to hold activity (initialized to zero)
-        rows = t_periods
-        cols = techs
-        df_activity = pd.DataFrame(data=0.0, index=rows, columns=cols, dtype='float64')
-
-        # Store Data
-        for scenario, sector, t_period, t_season, t_day, input_comm, tech, vintage, output_comm, vflow_out in db_activity:
-            if scenario == s:
-                # Store Activity for each technology
-                if t_period in t_periods and tech in techs:
-                    df_activity.loc[t_period, tech] = df_activity.loc[t_period, tech] + vflow_out
-                # Store electricity demand
-                if output_comm == elc_dmd:
-                    df.loc[t_period, 'ELC_DMD'] = df.loc[t_period, 'ELC_DMD'] + vflow_out
-
-        # ------------
-        # New Capacity
-        # ------------
-        # Access database
-        qry = "SELECT * FROM Output_V_Capacity"
-        cur.execute(qry)
-        db_newCapacity = cur.fetchall()
-
-        # Create dataframe to hold yearly installs (initialized to zero)
-        rows = t_periods
-        cols = techs
-        df_newCapacity = pd.DataFrame(data=0.0, index=rows, columns=cols, dtype='float64')
-
-        # Store Data
-        for scenario, sector, tech, vintage, capacity, in db_newCapacity:
-            if scenario == s:
-                if vintage in t_periods and tech in techs:
-                    df_newCapacity.loc[vintage, tech] = capacity
-
-        # ------------
-        # Active Capacity
-        # ------------
-        # Access database
-        qry = "SELECT * FROM Output_CapacityByPeriodAndTech"
-        cur.execute(qry)
-        db_activeCapacity = cur.fetchall()
-
-        # Create dataframe to hold yearly installs (initialized to zero)
-        rows = t_periods
-        cols = techs
-        df_activeCapacity = pd.DataFrame(data=0.0, index=rows, columns=cols, dtype='float64')
-
-        # Store Data
-        for scenario, sector, t_period, tech, capacity, in db_activeCapacity:
-            if scenario == s:
-                if t_period in t_periods and tech in techs:
-                    df_activeCapacity.loc[t_period, tech] = capacity
-
+    with np.errstate(divide='ignore', invalid='ignore'):
         # ------------
         # Analysis - Investments
         # ------------
-        # Create dataframe (initialized to zero)
-        rows = t_periods
-        cols = techs
-        df_investments = pd.DataFrame(data=0.0, index=rows, columns=cols, dtype='float64')
-
-        for year in t_periods:
-            for tech in techs:
-                costInvest = df_newCapacity.loc[year, tech] * df_CostInvest.loc[year, tech]
-                df_investments.loc[year, tech] = df_investments.loc[year, tech] + costInvest
+        investments = newCapacity * CostInvest
 
         # ------------
         # Analysis - Translate Investments to Loans
+        # Assume Fixed-Rate Payment (https://www.investopedia.com/terms/f/fixed-rate-payment.asp)
         # ------------
-        # Create dataframe (initialized to zero)
-        rows = t_periods
-        cols = techs
-        df_loanPayments = pd.DataFrame(data=0.0, index=rows, columns=cols, dtype='float64')
-
-        for tech in techs:
-
-            # select appropriate discount rate, assumes it is constant
-            if tech in df_rate_tech.tech.unique():
-                rate = df_rate_tech[df_rate_tech.tech == tech].tech_rate.mean()
-            else:
-                rate = rate_global
-
-            for buildYear in t_periods:
-
-                if df_investments.loc[buildYear, tech] > 0:
-                    loan = df_investments.loc[buildYear, tech]
-                    N = df_loanLife.loc[tech, "loan"]
-                    # Assume Fixed-Rate Payment (https://www.investopedia.com/terms/f/fixed-rate-payment.asp)
-                    annualPayment = rate / (1 - (1 + rate) ** -N) * loan
-                    if debug == True:
-                        print("Tech: " + tech + ",Year: " + str(buildYear) + ",YearlyPayment: " + str(annualPayment))
+        # Annuity factor of each technology, computed with scalar powers (numpy array powers can differ in the last bit)
+        annuity = np.array([rate / (1 - (1 + rate) ** -N) for rate, N in zip(rates, loanLife)], dtype='float64')
+        payments = np.where(investments > 0, annuity[:, np.newaxis] * investments, 0.0)
 
-                    for year in t_periods:
-                        if buildYear <= year and year <= buildYear + N:
-                            df_loanPayments.loc[year, tech] = df_loanPayments.loc[year, tech] + annualPayment
+        # Payments for each build year are made from the build year until the loan is repaid
+        loanPayments = np.zeros(investments.shape)
+        for b, buildYear in enumerate(periods):
+            repaying = (buildYear <= periods) & (periods <= buildYear + loanLife[:, np.newaxis])
+            loanPayments = loanPayments + np.where(repaying, payments[:, :, b:b + 1], 0.0)
 
         # ------------
-        # Analysis - Translate to yearly costs
+        # Analysis - Translate to yearly costs (summed over technologies)
         # ------------
-        for year in t_periods:
-            for tech in techs:
-                # CostInvest (loan payments)
-                costInvest = df_loanPayments.loc[year, tech]
-                df.loc[year, 'CostInvest'] = df.loc[year, 'CostInvest'] + costInvest
+        costFixed = activeCapacity * CostFixed
+        costVariable = activity * CostVariable
+        CostTotal = ordered_sum(loanPayments + costFixed + costVariable, axis=1)
 
-                # CostFixed
-                costFixed = df_activeCapacity.loc[year, tech] * df_CostFixed.loc[year, tech]
-                df.loc[year, 'CostFixed'] = df.loc[year, 'CostFixed'] + costFixed
-
-                # CostVariable
-                costVariable = df_activity.loc[year, tech] * df_CostVariable.loc[year, tech]
-                df.loc[year, 'CostVariable'] = df.loc[year, 'CostVariable'] + costVariable
-
-                # Sum Costs
-                totalTechCost = costInvest + costFixed + costVariable
-                df.loc[year, 'CostTotal'] = df.loc[year, 'CostTotal'] + totalTechCost
-
-            # Calculate Yearly Cost of Electricity
-            df.loc[year, 'ELC_Cost'] = df.loc[year, 'CostTotal'] / df.loc[year, 'ELC_DMD'] * conversion
-
-        # yearlyCosts_single = df.ELC_Cost
+        # Calculate Yearly Cost of Electricity
+        ELC_Cost = CostTotal / ELC_DMD * conversion
 
         # ------------
-        # Analysis - Calculate LCOE (based on initial year)
+        # Analysis - Calculate LCOE (based on initial year) using the discount rate of the last technology
         # based on: https://www.energy.gov/sites/prod/files/2015/08/f25/LCOE.pdf
         # ------------
-        num = 0.0
-        denom = 0.0
-
-        for year in t_periods:
-            t = year - t_periods[0]
-            num = num + df.loc[year, 'CostTotal'] / (1.0 + rate) ** t
-            denom = denom + df.loc[year, 'ELC_DMD'] / (1.0 + rate) ** t
-
+        rate = rates[-1]
+        # Discount factor of each period, with its integer number of years since the first period as exponent
+        discount = np.array([(1.0 + rate) ** (year - t_periods[0]) for year in t_periods], dtype='float64')
+        num = ordered_sum(CostTotal / discount, axis=1)
+        denom = ordered_sum(ELC_DMD / discount, axis=1)
         LCOE_single = num / denom * conversion
 
-        # df.loc[t_periods[0],'LCOE'] = LCOE
-
-        # Store yearlyCosts_single and LCOE_single
-        for year in df.index:
-            yearlyCosts.loc[(db, s), year] = df.loc[year, 'ELC_Cost']
-        LCOE.loc[(db, s),] = LCOE_single
+    # Store yearlyCosts and LCOE for all scenarios
+    index = pd.MultiIndex.from_product([[db], scenarios], names=['database', 'scenario'])
+    yearlyCosts = pd.DataFrame(ELC_Cost, index=index, columns=t_periods, dtype='float64')
+    LCOE = pd.DataFrame(LCOE_single, index=index, columns=['LCOE'], dtype='float64')
 
-    # Return to original directory
-    os.chdir(origDir)
+    # Close connection, unless it is shared through context
+    if close:
+        tt.close_db(context)
 
     # ------------
     # Return Calculations
     # ------------
     return yearlyCosts, LCOE
+
+
+# ==============================================================================
+def to_array(rows, indices, accumulate=False):
+    #    inputs:
+    #    1) rows            - database rows, each holds one key per index followed by a value
+    #    2) indices         - list of pandas Index, one per array dimension
+    #    3) accumulate      - True sums values with the same keys, False keeps the last value
+    #
+    #    outputs:
+    #    1) array           - numpy array (initialized to zero), rows with keys not in indices are ignored
+    # ==============================================================================
+    shape = tuple(len(index) for index in indices)
+    array = np.zeros(shape, dtype='float64')
+    if len(rows) == 0:
+        return array
+
+    columns = list(zip(*rows))
+    keys = [index.get_indexer(list(column)) for index, column in zip(indices, columns[:-1])]
+    values = np.array(columns[-1], dtype='float64')
+    keep = np.all([key >= 0 for key in keys], axis=0)
+    keys = tuple(key[keep] for key in keys)
+    values = values[keep]
+
+    if accumulate:
+        # Unbuffered, in row order
+        np.add.at(array, keys, values)
+    else:
+        # Last occurrence of each key
+        flat = np.ravel_multi_index(keys, shape)
+        last = len(flat) - 1 - np.unique(flat[::-1], return_index=True)[1]
+        array[tuple(key[last] for key in keys)] = values[last]
+    return array
+
+
+def ordered_sum(array, axis):
+    # Sum in index order (numpy sum uses pairwise summation), keeps results identical to looping over entries
+    return np.add.accumulate(array, axis=axis).take(-1, axis=axis)
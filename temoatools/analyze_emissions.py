@@ -1,5 +1,4 @@
 import os
-import sqlite3
 import pandas as pd
 import temoatools as tt
 
@@ -110,12 +109,13 @@ def getEmissions(folders, dbs, conversion=1E-6, save_data='N', create_plots='N',
 
 
 # ==============================================================================
-def SingleDB(folder, db, conversion=1E-6):
+def SingleDB(folder, db, conversion=1E-6, context=None):
     #    inputs:
     #    1) folder          - path containing db
     #    2) db              - name of database
     #    3) conversion      - converts from emission units to Mton
     #           default is conversion from kton to Mton is 1E-6
+    #    4) context         - optional, from open_db, shares the connection and tables read between analyses
     #
     #    outputs:
     #    1) yearlyEmissions     - pandas DataFrame holding yearly emissions
@@ -123,47 +123,23 @@ def SingleDB(folder, db, conversion=1E-6):
     # ==============================================================================
     print("\tAnalyzing db: ", db)
 
-    # Save original directory
-    origDir = os.getcwd()
-
-    # Move to folder
-    os.chdir(folder)
-
-    # Connect to Database
-    con = sqlite3.connect(db)
+    # Connect to Database, unless a context holding the connection and tables already read is provided
+    close = context is None
+    if close:
+        context = tt.open_db(folder, db)
+    con = context['con']
     cur = con.cursor()
 
-    #   Identify Unique Scenarios
-    qry = "SELECT * FROM Output_Objective"
-    cur.execute(qry)
-    db_objective = cur.fetchall()
-    scenarios = []
-    for scenario, objective_name, total_system_cost in db_objective:
-        if scenario not in scenarios:
-            scenarios.append(scenario)
-
-    #   Select All time_periods
-    qry = "SELECT * FROM time_periods"
-    cur.execute(qry)
-    db_t_periods = cur.fetchall()
-
-    # Review db_t_periods to select future time periods
-    future_t_periods = []
-    for t_periods, flag in db_t_periods:
-        if flag == 'f':
-            if t_periods not in future_t_periods:
-                future_t_periods.append(t_periods)
-
-    future_t_periods = sorted(future_t_periods)
-    future_t_periods = future_t_periods[:-1]  # no calculations are performed for the last time_period
+    #   Identify Unique Scenarios and future time periods
+    metadata = tt.read_metadata(context)
+    scenarios = metadata['scenarios']
+    future_t_periods = metadata['future_periods'][:-1]  # no calculations are performed for the last time_period
 
     # Read from database:
     qry = "SELECT * FROM Output_Emissions"
     cur.execute(qry)
     db_Output_Emissions = cur.fetchall()
 
-    # Close connection
-    con.close()
 
     # Create pandas DataFrame to hold yearlyEmissions
     index = pd.MultiIndex.from_product([[db], scenarios], names=['database', 'scenario'])
@@ -188,7 +164,8 @@ def SingleDB(folder, db, conversion=1E-6):
         # Sum average emissions
         avgEmissions.loc[(db, s),] = yearlyEmissions.loc[(db, s),].mean()
 
-    # Return to original directory
-    os.chdir(origDir)
+    # Close connection, unless it is shared through context
+    if close:
+        tt.close_db(context)
 
     return yearlyEmissions, avgEmissions
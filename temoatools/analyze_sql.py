@@ -0,0 +1,238 @@
+import os
+import json
+import hashlib
+import sqlite3
+import pandas as pd
+
+# Fuel of each technology, taken as the input_comm of its first row in Efficiency
+fuel_qry = "SELECT tech, input_comm AS fuel FROM Efficiency WHERE rowid IN (SELECT MIN(rowid) FROM Efficiency GROUP BY tech)"
+
+
+# ==============================================================================
+def open_db(folder, db):
+    #    inputs:
+    #    1) folder          - path containing db
+    #    2) db              - name of database
+    #
+    #    outputs:
+    #    1) context         - dictionary holding the name of the database, a connection to it and the tables read
+    #                         from it (see read_table), shared by the SingleDB functions of each analysis. Results
+    #                         stored by scenario tree node are read by scenario (see expand_scenario_tree)
+    # ==============================================================================
+    con = sqlite3.connect(os.path.join(folder, db))
+    expand_scenario_tree(con)
+    return {'db': db, 'con': con, 'tables': {}}
+
+
+def read_table(context, table):
+    # All rows of table, only read from the database the first time
+    if table not in context['tables']:
+        cur = context['con'].cursor()
+        cur.execute("SELECT * FROM " + table)
+        context['tables'][table] = cur.fetchall()
+    return context['tables'][table]
+
+
+def close_db(context):
+    context['con'].close()
+    context['tables'] = {}
+
+
+# ==============================================================================
+# Stochastic runs stored by scenario tree node (temoa write_ef_results) keep each row of a shared node once, under the
+# scenario name "<run>.<node>", and list the nodes of each scenario "<run>.<scenario>" in Output_Scenario_Tree.
+# ==============================================================================
+output_tables = ['Output_VFlow_In', 'Output_VFlow_Out', 'Output_Curtailment', 'Output_V_Capacity',
+                 'Output_CapacityByPeriodAndTech', 'Output_Emissions', 'Output_Costs', 'Output_Objective']
+
+
+def expand_scenario_tree(con):
+    #    inputs:
+    #    1) con             - sqlite3 connection to a solved database
+    #
+    #    outputs:
+    #    1) expanded        - True if the database stores results by scenario tree node. The output tables are then
+    #                         shadowed, for this connection only, by temporary views of the same name that list the rows
+    #                         of each node once for every scenario passing through it, under the scenario name. Rows of
+    #                         other scenarios (e.g. solve) are kept as they are.
+    # ==============================================================================
+    cur = con.cursor()
+    cur.execute("SELECT name FROM main.sqlite_master WHERE type='table'")
+    db_tables = set(row[0] for row in cur.fetchall())
+    if 'Output_Scenario_Tree' not in db_tables:
+        return False
+
+    for table in output_tables:
+        if table not in db_tables:
+            continue
+        cur.execute("PRAGMA main.table_info(" + table + ")")
+        columns = ['o."' + col[1] + '"' for col in cur.fetchall()][1:]  # columns begin with scenario
+        cur.execute('CREATE TEMP VIEW IF NOT EXISTS "' + table + '" AS' +
+                    ' SELECT n.scenario AS scenario, ' + ', '.join(columns) +
+                    ' FROM main."' + table + '" AS o JOIN main.Output_Scenario_Tree AS n ON o.scenario = n.node' +
+                    ' UNION ALL SELECT * FROM main."' + table + '"' +
+                    ' WHERE scenario NOT IN (SELECT node FROM main.Output_Scenario_Tree)')
+    return True
+
+
+# ==============================================================================
+# Metadata of a database (technologies, fuels, periods and scenarios), built once per process and database. Setting
+# metadata_dir (e.g. tt.analyze_sql.metadata_dir = 'metadata') also caches it on disk in that directory, so that later
+# runs do not read it again. Writing to the database (e.g. solving it again) invalidates the cache.
+# ==============================================================================
+metadata_cache = {}
+metadata_dir = None
+
+
+def read_metadata(context):
+    #    inputs:
+    #    1) context         - from open_db
+    #
+    #    outputs:
+    #    1) metadata        - dictionary holding:
+    #                         techs          - technologies, in table order
+    #                         fuel           - tech -> fuel (input_comm of its first row in Efficiency)
+    #                         sector         - tech -> sector
+    #                         category       - tech -> tech_category
+    #                         future_periods - sorted future periods (flag 'f'), including the last one
+    #                         scenarios      - scenarios of Output_Objective, in table order
+    # ==============================================================================
+    if 'metadata' in context:
+        return context['metadata']
+
+    path = os.path.abspath(context['con'].execute("PRAGMA database_list").fetchone()[2])
+    st = os.stat(path)
+    key = [path, st.st_size, st.st_mtime]
+
+    metadata = metadata_cache.get(tuple(key))
+    if metadata is None and metadata_dir is not None:
+        metadata = read_metadata_file(metadata_file(path), key)
+    if metadata is None:
+        metadata = build_metadata(context)
+        if metadata_dir is not None:
+            write_metadata_file(metadata_file(path), key, metadata)
+    metadata_cache[tuple(key)] = metadata
+    context['metadata'] = metadata
+    return metadata
+
+
+def metadata_file(path):
+    # Cache file of the database at path, in metadata_dir (named after the database and a hash of its full path)
+    digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(metadata_dir, os.path.basename(path) + '.' + digest + '.metadata.json')
+
+
+def read_metadata_file(cache_file, key):
+    # Metadata cached in cache_file for key, None if missing, stale or unreadable (e.g. being written)
+    try:
+        with open(cache_file, 'r') as f:
+            cached = json.load(f)
+        if cached['key'] == key:
+            return cached['metadata']
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def write_metadata_file(cache_file, key, metadata):
+    # Written to a temporary file first and then moved into place, so that readers (e.g. other analyze_dbs workers)
+    # never see a partially written file
+    temp_file = cache_file + '.' + str(os.getpid()) + '.tmp'
+    try:
+        if not os.path.isdir(metadata_dir):
+            os.makedirs(metadata_dir)
+        with open(temp_file, 'w') as f:
+            json.dump({'key': key, 'metadata': metadata}, f)
+        getattr(os, 'replace', os.rename)(temp_file, cache_file)
+    except (IOError, OSError):
+        # e.g. read-only folder, or (python 2 on Windows) another process wrote the cache first: the metadata is only
+        # kept in memory
+        if os.path.isfile(temp_file):
+            os.remove(temp_file)
+
+
+def build_metadata(context):
+    # Metadata of read_metadata, read from the database
+    metadata = {'techs': [], 'fuel': {}, 'sector': {}, 'category': {}, 'future_periods': [], 'scenarios': []}
+    for tech, flag, sector, tech_desc, tech_category in read_table(context, 'technologies'):
+        if tech not in metadata['sector']:
+            metadata['techs'].append(tech)
+            metadata['sector'][tech] = sector
+            metadata['category'][tech] = tech_category
+    for row in context['con'].execute(fuel_qry):
+        metadata['fuel'][row[0]] = row[1]
+    metadata['future_periods'] = sorted(set(p for p, flag in read_table(context, 'time_periods') if flag == 'f'))
+    for row in read_table(context, 'Output_Objective'):
+        if row[0] not in metadata['scenarios']:
+            metadata['scenarios'].append(row[0])
+    return metadata
+
+
+def sector_techs(metadata, sector_name):
+    # Technologies of a sector ('all' for all sectors), in table order
+    return [tech for tech in metadata['techs'] if sector_name == 'all' or metadata['sector'][tech] == sector_name]
+
+
+# ==============================================================================
+def aggregate_outputs(con, table, value, keys, names, switch='fuel', sector_name='electric', conversion=1.0,
+                      fuel=None):
+    #    inputs:
+    #    1) con             - sqlite3 connection to a solved database
+    #    2) table           - name of temoa output table, e.g. 'Output_VFlow_Out'
+    #    3) value           - column of table to be summed, e.g. 'vflow_out'
+    #    4) keys            - SQL expressions (columns of table prefixed by 'o.') to group by, in addition to
+    #                         scenario and fuel or technology
+    #    5) names           - column names of keys in the output
+    #    6) switch          - 'fuel' or 'tech', basis of categorization
+    #    7) sector_name     - name of temoa sector to be analyzed, 'all' to include all sectors
+    #    8) conversion      - multiplier applied to value before summing
+    #    9) fuel            - optional, tech -> fuel from read_metadata, otherwise fuels are looked up in Efficiency
+    #
+    #    outputs:
+    #    1) df              - pandas DataFrame (tidy) with columns scenario, fuelOrTech, names and value
+    # ==============================================================================
+    if switch == 'fuel' and fuel is not None:
+        # Sum by technology, then by fuel
+        df = aggregate_outputs(con, table, value, keys, names, switch='tech', sector_name=sector_name,
+                               conversion=conversion)
+        df['fuelOrTech'] = df['fuelOrTech'].map(fuel)
+        df = df.dropna(subset=['fuelOrTech'])
+        return df.groupby(['scenario', 'fuelOrTech'] + names, as_index=False, sort=False)['value'].sum()
+
+    if switch == 'fuel':
+        fuelOrTech = 'f.fuel'
+        join = ' JOIN (' + fuel_qry + ') AS f ON f.tech = o.tech'
+    else:
+        fuelOrTech = 'o.tech'
+        join = ''
+
+    group = ['o.scenario', fuelOrTech] + keys
+    select = [col + ' AS "' + name + '"' for col, name in zip(group, ['scenario', 'fuelOrTech'] + names)]
+    qry = 'SELECT ' + ', '.join(select) + ', SUM(o.' + value + ' * ?) AS value' + \
+          ' FROM ' + table + ' AS o' + join + \
+          ' WHERE o.sector = ? OR ? = \'all\'' + \
+          ' GROUP BY ' + ', '.join(group)
+    df = pd.read_sql_query(qry, con, params=(conversion, sector_name, sector_name))
+    df['value'] = df['value'].astype('float64')
+    return df
+
+
+# ==============================================================================
+def to_frame(df, index, pivot=None, columns=None):
+    #    inputs:
+    #    1) df              - pandas DataFrame from aggregate_outputs, with a database column added
+    #    2) index           - pandas MultiIndex of the output, named after columns of df
+    #    3) pivot           - None returns a single 'value' column, otherwise the column of df whose
+    #                         values become the columns of the output (e.g. 'year')
+    #    4) columns         - values of pivot kept as columns of the output
+    #
+    #    outputs:
+    #    1) df              - pandas DataFrame (initialized to zero) holding the values of df
+    # ==============================================================================
+    if pivot is None:
+        return df.set_index(list(index.names))[['value']].reindex(index, fill_value=0.0)
+
+    full = pd.MultiIndex.from_tuples([i + (c,) for i in index for c in columns], names=list(index.names) + [pivot])
+    values = df.set_index(list(index.names) + [pivot])['value'].reindex(full, fill_value=0.0)
+    return pd.DataFrame(values.values.reshape(len(index), len(columns)), index=index, columns=columns,
+                        dtype='float64')
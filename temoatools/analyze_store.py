@@ -0,0 +1,164 @@
+import os
+import glob
+import pandas as pd
+import temoatools as tt
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# File extension of each supported format
+extensions = {'parquet': '.parquet', 'feather': '.feather', 'csv': '.csv'}
+
+
+# ============================================================================#
+# Analyze many databases in parallel, streaming results into a partitioned store
+# ============================================================================#
+def analyze_dbs(folders, dbs, store_path, scenarios='default', iterations=0, switch='fuel', tod_analysis=False,
+                ncpus=1, file_format='parquet', overwrite=False, debug=False):
+    #    inputs:
+    #    1) folders         - paths containing dbs (list or single string if all in the same path)
+    #    2) dbs             - names of databases (list)
+    #    3) store_path      - directory holding the results, one file per database is written to
+    #                         store_path/scenario=<scenario>/iteration=<iteration>/
+    #    4) scenarios       - scenario of each database (list or single string if all the same)
+    #    5) iterations      - iteration of each database (list or single value if all the same)
+    #    6) switch          - 'fuel' or 'tech', basis of categorization
+    #    7) tod_analysis    - if True, performs time of day analysis
+    #    8) ncpus           - number of worker processes
+    #    9) file_format     - 'parquet' or 'feather' (both require pyarrow) or 'csv'
+    #    10) overwrite      - False skips databases whose results are already in the store
+    #
+    #    outputs:
+    #    1) summary         - pandas DataFrame with the database, scenario, iteration, file and status of each database
+    #                         (results are kept in the store rather than in memory, see read_store)
+    # ==============================================================================
+    if file_format not in extensions.keys():
+        raise ValueError("file_format must be one of: " + ', '.join(extensions.keys()))
+    # parquet and feather require the optional dependency pyarrow (pip install temoatools[store])
+    if file_format in ['parquet', 'feather']:
+        import pyarrow
+
+    # If only a single db provided, change to a list
+    if type(dbs) == str:
+        dbs = [dbs]
+    # If only a single folder, scenario or iteration provided, create a list of the same value
+    if type(folders) == str:
+        folders = [folders] * len(dbs)
+    if type(scenarios) == str:
+        scenarios = [scenarios] * len(dbs)
+    if not isinstance(iterations, (list, tuple, pd.Series)):
+        iterations = [iterations] * len(dbs)
+
+    store_path = os.path.abspath(store_path)
+    if not os.path.exists(store_path):
+        os.makedirs(store_path)
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=ncpus) as executor:
+        futures = {}
+        for folder, db, scenario, iteration in zip(folders, dbs, scenarios, iterations):
+            filename = partition_file(store_path, scenario, iteration, db, file_format)
+            if os.path.isfile(filename) and not overwrite:
+                rows.append([db, scenario, iteration, filename, 'skipped'])
+                continue
+            future = executor.submit(analyze_to_store, folder, db, filename, scenario, iteration, switch,
+                                     tod_analysis, file_format)
+            futures[future] = [db, scenario, iteration, filename]
+
+        # Only the status of each database is returned to this process
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                status = future.result()
+            except Exception as e:
+                status = 'error: ' + str(e)
+            if debug:
+                print(row[0] + ': ' + status)
+            rows.append(row + [status])
+
+    return pd.DataFrame(rows, columns=['database', 'scenario', 'iteration', 'file', 'status'])
+
+
+# ============================================================================#
+# Analyze a single database and write its results (called within worker processes)
+# ============================================================================#
+def analyze_to_store(folder, db, filename, scenario, iteration, switch, tod_analysis, file_format):
+    output = tt.analyze_db(folder, db, scenario=scenario, iteration=iteration, switch=switch,
+                           tod_analysis=tod_analysis)
+
+    # scenario and iteration are stored in the directory names
+    output = output.drop(columns=['scenario', 'iteration'])
+
+    # Mixed columns (e.g. year holds integers and nan) are stored as text
+    for col in ['quantity_type', 'tech_or_fuel', 'year', 'season', 'tod']:
+        output[col] = output[col].where(output[col].isnull(), output[col].astype(str))
+
+    # Write to a temporary file first so that the store never holds a partially written file
+    directory = os.path.dirname(filename)
+    if not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    temp_filename = filename + '.tmp'
+    if file_format == 'parquet':
+        output.to_parquet(temp_filename, index=False)
+    elif file_format == 'feather':
+        output.reset_index(drop=True).to_feather(temp_filename)
+    else:
+        output.to_csv(temp_filename, index=False)
+    os.replace(temp_filename, filename)
+    return 'complete'
+
+
+# ============================================================================#
+# Read results from a store created by analyze_dbs
+# ============================================================================#
+def read_store(store_path, scenarios=None, iterations=None, quantities=None, file_format='parquet'):
+    #    inputs:
+    #    1) store_path      - directory holding the results
+    #    2) scenarios       - list of scenarios to read, None reads all
+    #    3) iterations      - list of iterations to read, None reads all
+    #    4) quantities      - list of quantities to keep (e.g. ['LCOE', 'emissions_by_year']), None keeps all
+    #    5) file_format     - 'parquet', 'feather' or 'csv', as used by analyze_dbs
+    #
+    #    outputs:
+    #    1) output          - pandas DataFrame with the same columns as analyze_db
+    # ==============================================================================
+    if scenarios is not None:
+        scenarios = [str(scenario) for scenario in scenarios]
+    if iterations is not None:
+        iterations = [str(iteration) for iteration in iterations]
+
+    pattern = os.path.join(store_path, 'scenario=*', 'iteration=*', '*' + extensions[file_format])
+    outputs = []
+    for filename in sorted(glob.glob(pattern)):
+        iteration_dir = os.path.dirname(filename)
+        scenario = os.path.basename(os.path.dirname(iteration_dir))[len('scenario='):]
+        iteration = os.path.basename(iteration_dir)[len('iteration='):]
+        if scenarios is not None and scenario not in scenarios:
+            continue
+        if iterations is not None and iteration not in iterations:
+            continue
+
+        if file_format == 'parquet':
+            df = pd.read_parquet(filename)
+        elif file_format == 'feather':
+            df = pd.read_feather(filename)
+        else:
+            df = pd.read_csv(filename, dtype=str)
+            df['value'] = df['value'].astype('float64')
+        if quantities is not None:
+            df = df[df.quantity.isin(quantities)].copy()
+        df['scenario'] = scenario
+        df['iteration'] = iteration
+        outputs.append(df)
+
+    if len(outputs) == 0:
+        return pd.DataFrame(columns=['database', 'iteration', 'quantity', 'quantity_type', 'scenario', 'season',
+                                     'tech_or_fuel', 'tod', 'value', 'year'])
+    output = pd.concat(outputs, ignore_index=True, sort=True)
+    return output
+
+
+# ============================================================================#
+# Helper functions
+# ============================================================================#
+def partition_file(store_path, scenario, iteration, db, file_format):
+    return os.path.join(store_path, 'scenario=' + str(scenario), 'iteration=' + str(iteration),
+                        tt.remove_ext(db) + extensions[file_format])
@@ -69,9 +69,14 @@ def analyze_db(folder, db, scenario='default', iteration=0, switch='fuel', tod_a
         t0 = time.time()
 
     # -----------------------------------
-    # create dataframe to hold outputs
+    # open database once, tables read by one analysis are reused by the others
     # -----------------------------------
-    output = pd.DataFrame()
+    context = tt.open_db(folder, db)
+
+    # -----------------------------------
+    # list of dataframes holding outputs, combined at the end
+    # -----------------------------------
+    outputs = []
 
     # -----------------------------------
     # check for appropriate value of switch
@@ -82,21 +87,21 @@ def analyze_db(folder, db, scenario='default', iteration=0, switch='fuel', tod_a
     # -----------------------------------
     # yearly_costs and LCOE
     # -----------------------------------
-    yearly_costs, LCOE = tt.getCosts(folder, db)
+    yearly_costs, LCOE = tt.analyze_costs.SingleDB(folder, db, context=context)
 
     # LCOE
     row = get_series(scenario, iteration, db)
     row['quantity'] = 'LCOE'
     row['value'] = LCOE['LCOE'].values[0]
-    output = output.append(row, ignore_index=True)
+    outputs.append(pd.DataFrame([row]))
 
     # yearly_costs
-    yearly_costs = yearly_costs.drop(columns=['database', 'scenario'])
+    yearly_costs = yearly_costs.reset_index(drop=True)
     df = get_df(scenario, iteration, db, yearly_costs.shape[1])
     df.loc[:, 'quantity'] = 'costs_by_year'
     df.loc[:, 'year'] = yearly_costs.columns
     df.loc[:, 'value'] = yearly_costs.loc[0, :].values
-    output = output.append(df, ignore_index=True)
+    outputs.append(df)
 
     if debug:
         t1 = time.time()
@@ -104,21 +109,21 @@ def analyze_db(folder, db, scenario='default', iteration=0, switch='fuel', tod_a
     # -----------------------------------
     # yearly_emissions and average_emissions
     # -----------------------------------
-    yearly_emissions, average_emissions = tt.getEmissions(folder, db)
+    yearly_emissions, average_emissions = tt.analyze_emissions.SingleDB(folder, db, context=context)
 
     # average_emissions
     row = get_series(scenario, iteration, db)
     row['quantity'] = 'average_emissions'
     row['value'] = average_emissions['avgEmissions'].values[0]
-    output = output.append(row, ignore_index=True)
+    outputs.append(pd.DataFrame([row]))
 
     # yearly_emissions
-    yearly_emissions = yearly_emissions.drop(columns=['database', 'scenario'])
+    yearly_emissions = yearly_emissions.reset_index(drop=True)
     df = get_df(scenario, iteration, db, yearly_costs.shape[1])
     df.loc[:, 'quantity'] = 'emissions_by_year'
     df.loc[:, 'year'] = yearly_emissions.columns
     df.loc[:, 'value'] = yearly_emissions.loc[0, :].values
-    output = output.append(df, ignore_index=True)
+    outputs.append(df)
 
     if debug:
         t2 = time.time()
@@ -127,8 +132,8 @@ def analyze_db(folder, db, scenario='default', iteration=0, switch='fuel', tod_a
     # capacity_by_year
     # -----------------------------------
     # analyze
-    capacity_by_year = tt.getCapacity(folder, db, switch=switch)
-    capacity_by_year = capacity_by_year.drop(columns=['database', 'scenario'])
+    capacity_by_year = tt.analyze_capacity.SingleDB(folder, db, switch=switch, context=context)
+    capacity_by_year = capacity_by_year.reset_index().drop(columns=['database', 'scenario'])
     # reorganize
     temp = pd.melt(capacity_by_year, id_vars=['fuelOrTech'], var_name='year')
     # store results
@@ -138,7 +143,7 @@ def analyze_db(folder, db, scenario='default', iteration=0, switch='fuel', tod_a
     df.loc[:, 'tech_or_fuel'] = temp.loc[:, 'fuelOrTech'].values
     df.loc[:, 'year'] = temp.loc[:, 'year'].values
     df.loc[:, 'value'] = temp.loc[:, 'value'].values
-    output = output.append(df, ignore_index=True)
+    outputs.append(df)
 
     if debug:
         t3 = time.time()
@@ -147,8 +152,8 @@ def analyze_db(folder, db, scenario='default', iteration=0, switch='fuel', tod_a
     # activity_by_year
     # -----------------------------------
     # analyze
-    activity_by_year = tt.getActivity(folder, db, switch=switch)
-    activity_by_year = activity_by_year.drop(columns=['database', 'scenario'])
+    activity_by_year = tt.analyze_activity_year.SingleDB(folder, db, switch=switch, context=context)
+    activity_by_year = activity_by_year.reset_index().drop(columns=['database', 'scenario'])
     # reorganize
     temp = pd.melt(activity_by_year, id_vars=['fuelOrTech'], var_name='year')
     # store results
@@ -158,7 +163,7 @@ def analyze_db(folder, db, scenario='default', iteration=0, switch='fuel', tod_a
     df.loc[:, 'tech_or_fuel'] = temp.loc[:, 'fuelOrTech'].values
     df.loc[:, 'year'] = temp.loc[:, 'year'].values
     df.loc[:, 'value'] = temp.loc[:, 'value'].values
-    output = output.append(df, ignore_index=True)
+    outputs.append(df)
 
     if debug:
         t4 = time.time()
@@ -168,8 +173,8 @@ def analyze_db(folder, db, scenario='default', iteration=0, switch='fuel', tod_a
     # -----------------------------------
     if tod_analysis:
         # analyze
-        activity_by_tod = tt.getActivityTOD(folder, db, switch=switch)
-        activity_by_tod = activity_by_tod.drop(columns=['database', 'scenario'])
+        activity_by_tod = tt.analyze_activity_tod.SingleDB(folder, db, switch=switch, context=context)
+        activity_by_tod = activity_by_tod.reset_index().drop(columns=['database', 'scenario'])
         # store results
         df = get_df(scenario, iteration, db, activity_by_tod.shape[0])
         df.loc[:, 'quantity'] = 'activity_by_tod'
@@ -179,7 +184,14 @@ def analyze_db(folder, db, scenario='default', iteration=0, switch='fuel', tod_a
         df.loc[:, 'season'] = activity_by_tod.loc[:, 'season'].values
         df.loc[:, 'tod'] = activity_by_tod.loc[:, 'tod'].values
         df.loc[:, 'value'] = activity_by_tod.loc[:, 'value'].values
-        output = output.append(df, ignore_index=True)
+        outputs.append(df)
+
+    tt.close_db(context)
+
+    # -----------------------------------
+    # combine outputs (single concatenation, columns kept in the order of get_series and get_df)
+    # -----------------------------------
+    output = pd.concat(outputs, ignore_index=True, sort=False)
 
     if debug:
         t5 = time.time()
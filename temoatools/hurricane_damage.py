@@ -0,0 +1,224 @@
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from .fragility_curves import fragility_table
+from .scenario_tree import ScenarioTree
+
+
+# ============================================================================#
+# Climatology of hurricanes, from a record of storms such as hurricaneData.csv (Name, Year, Category, MaxWind_mph)
+#
+# The record is split into periods of `step` years (the length of a model time period) and the strongest storm of
+# each period is kept, a period without storms having a windspeed of 0 mph. Each period belongs to a group of storm
+# categories (e.g. the hurricane scenarios of a stochastic run), so that the probability of a group is the fraction of
+# periods in the group and the windspeeds of a group are sampled from the strongest storms of its periods.
+# ============================================================================#
+class HurricaneClimatology(object):
+
+    def __init__(self, groups, prob, wind_mph):
+        #    inputs:
+        #    1) groups          - names of the groups of storms (list), e.g. ['H1', 'H2', 'H3']
+        #    2) prob            - probability of each group in a period
+        #    3) wind_mph        - windspeeds [mph] observed for each group (list of arrays)
+        # ==============================================================================
+        self.groups = list(groups)
+        self.prob = np.asarray(prob, dtype='float64')
+        self.wind_mph = [np.asarray(w, dtype='float64') for w in wind_mph]
+
+    @classmethod
+    def from_csv(cls, filename, categories=None, start=None, stop=None, step=5):
+        #    inputs:
+        #    1) filename        - record of storms with the columns Year, Category and MaxWind_mph
+        #    2) categories      - dictionary of storm category to group, 'None' for periods without storms,
+        #                         e.g. {'None': 'H1', 'TS': 'H1', 'H1': 'H1', 'H2': 'H2', 'H3': 'H2', 'H4': 'H3', ...}.
+        #                         By default each category is its own group.
+        #    3) start           - first year of the record to use (exclusive), by default the year of the first storm
+        #    4) stop            - last year of the record to use, by default the year of the last storm
+        #    5) step            - length of a period [years]
+        #
+        #    outputs:
+        #    1) climatology     - HurricaneClimatology
+        # ==============================================================================
+        df = pd.read_csv(filename, encoding='utf-8-sig')
+        if start is None:
+            start = df.Year.min() - 1
+        if stop is None:
+            stop = df.Year.max()
+
+        # Strongest storm of each period
+        bins = np.arange(start, stop + step, step)
+        n_periods = len(bins) - 1
+        df['period'] = np.searchsorted(bins, df.Year.values, side='left') - 1
+        df = df.loc[(df.period >= 0) & (df.period < n_periods)]
+        strongest = df.sort_values('MaxWind_mph', ascending=False).drop_duplicates('period').set_index('period')
+        category = strongest.Category.reindex(range(n_periods)).fillna('None').values
+        wind = strongest.MaxWind_mph.reindex(range(n_periods)).fillna(0.0).values
+
+        if categories is None:
+            categories = {c: c for c in set(category)}
+        group = np.array([categories[c] for c in category])
+        groups = sorted(set(categories.values()))
+        prob = [np.mean(group == g) for g in groups]
+        wind_mph = [wind[group == g] for g in groups]
+        return cls(groups, prob, wind_mph)
+
+    def sample(self, n_samples, group=None, seed=None):
+        #    inputs:
+        #    1) n_samples       - number of storms to sample
+        #    2) group           - only sample storms of this group, by default the group is sampled as well
+        #    3) seed            - seed of the random number generator, for repeatable samples
+        #
+        #    outputs:
+        #    1) group           - position of the group of each storm in self.groups (array)
+        #    2) wind_mph        - windspeed of each storm [mph] (array)
+        # ==============================================================================
+        rng = np.random.RandomState(seed)
+        if group is None:
+            group = rng.choice(len(self.groups), size=n_samples, p=self.prob / self.prob.sum())
+        else:
+            group = np.full(n_samples, self.groups.index(group), dtype='int64')
+
+        # Draw a windspeed among those observed for the group of each storm
+        n_obs = np.array([len(w) for w in self.wind_mph])
+        offset = np.concatenate([[0], np.cumsum(n_obs)[:-1]])
+        obs = np.concatenate(self.wind_mph + [np.zeros(1)])
+        pick = offset[group] + (rng.random_sample(n_samples) * n_obs[group]).astype('int64')
+        # Groups without observations only have calm periods
+        pick[n_obs[group] == 0] = len(obs) - 1
+        return group, obs[pick]
+
+
+# ==============================================================================
+# Capacity remaining after a storm
+# ==============================================================================
+def sample_cap_reduction(climatology, techs, n_samples=10000, cutoff=0.0, seed=None):
+    #    inputs:
+    #    1) climatology     - HurricaneClimatology
+    #    2) techs           - dictionary of technology to fragility curve, e.g. {'EX_WIND': 'wind_nonyaw', ...}
+    #    3) n_samples       - number of storms sampled for each group
+    #    4) cutoff          - lowest fraction of capacity remaining (zero values crash temoa)
+    #    5) seed            - seed of the random number generator, for repeatable samples
+    #
+    #    outputs:
+    #    1) rates           - expected fraction of capacity remaining after a storm (CapReduction), DataFrame with one
+    #                         row per technology and one column per group
+    # ==============================================================================
+    curves = sorted(set(techs.values()))
+    table = fragility_table(curves)
+    rates = pd.DataFrame(index=list(techs.keys()), columns=climatology.groups, dtype='float64')
+    for i, group in enumerate(climatology.groups):
+        seed_group = None if seed is None else seed + i
+        wind_mph = climatology.sample(n_samples, group=group, seed=seed_group)[1]
+        remaining = 1.0 - table.lookup(wind_mph).mean(axis=1)
+        rates[group] = remaining[[table.index[techs[tech]] for tech in rates.index]]
+    return rates.clip(lower=cutoff, upper=1.0)
+
+
+def node_cap_reduction(df, rates, events, event_years):
+    #    inputs:
+    #    1) df              - CapReduction of a node, DataFrame with the columns p, t, v and val
+    #    2) rates           - fraction of capacity remaining after a storm, DataFrame (technology x event)
+    #    3) events          - events on the path from the root to the node (list), e.g. ['H1', 'H3']
+    #    4) event_years     - year of each event
+    #
+    #    outputs:
+    #    1) df              - CapReduction of the node: capacity of vintage v remaining after every event of the
+    #                         same year or later, 1.0 for technologies without rates
+    # ==============================================================================
+    df = df.copy()
+    df['val'] = 1.0
+    if len(events) == 0:
+        return df
+    # remaining[t, i] is the capacity remaining after events i, i+1, ... (a column of ones after the last event)
+    r = rates.loc[:, list(events)].values.astype('float64')
+    remaining = np.ones((len(rates), len(events) + 1))
+    remaining[:, :-1] = np.cumprod(r[:, ::-1], axis=1)[:, ::-1]
+
+    tech = rates.index.get_indexer(df.t)
+    first = np.searchsorted(np.asarray(event_years), df.v.values, side='left')
+    known = tech >= 0
+    df.loc[known, 'val'] = remaining[tech[known], first[known]]
+    return df
+
+
+def write_cap_reduction_nodes(path, rates, types, stochastic_points):
+    #    inputs:
+    #    1) path            - directory of the scenario tree (with ScenarioStructure.dat and the node .dat files)
+    #    2) rates           - fraction of capacity remaining after a storm, DataFrame (technology x type)
+    #    3) types           - type of each branch of the tree (list), as in the generate_scenario_tree options
+    #    4) stochastic_points - year of each stage of the tree, as in the generate_scenario_tree options
+    #
+    #    outputs:
+    #    1) tree            - ScenarioTree, also saved to scenario_tree.csv for post-processing
+    # ==============================================================================
+    tree = ScenarioTree.from_structure(os.path.join(path, 'ScenarioStructure.dat'))
+    tree.save(os.path.join(path, 'scenario_tree.csv'))
+
+    # Iterate through the nodes of the tree (all but the root, R.dat)
+    for node, stage in zip(tree.nodes, tree.stage):
+        if stage > 0:
+            fname = os.path.join(path, node + '.dat')
+            events = [types[b] for b in tree.branches(node)]
+
+            # Data rows lie between the param header and the closing ';'
+            with open(fname, 'r') as f:
+                rows = [line.split() for line in f.readlines()[3:-1]]
+            df = pd.DataFrame(rows, columns=['p', 't', 'v', 'val']).astype(
+                {'p': 'int64', 'v': 'int64', 'val': 'float64'})
+            df = node_cap_reduction(df, rates, events, stochastic_points[:len(events)])
+
+            with open(fname, 'w') as f:
+                f.write('# Decision: ')
+                for event in events:
+                    f.write(event + ', ')
+                f.write('\n\nparam CapReduction:=\n')
+                df.to_csv(f, header=False, index=False, sep='\t')
+                f.write('\t;\n')
+    return tree
+
+
+def write_cap_reduction_db(db, rates, prob, periods=None, vintages=None):
+    #    inputs:
+    #    1) db              - temoa database (.sqlite) to write the CapReduction table to
+    #    2) rates           - fraction of capacity remaining after a storm, DataFrame (technology x group)
+    #    3) prob            - probability of each group in a period (pd.Series, or list in the order of the columns)
+    #    4) periods         - future periods, by default the 'f' periods of time_periods (the last one only marks the end
+    #                         of the horizon)
+    #    5) vintages        - vintages, by default all periods of time_periods
+    #
+    #    outputs:
+    #    1) df              - CapReduction written, DataFrame with the columns periods, tech, vintage and cap_reduction:
+    #                         expected capacity remaining after the storms of every period from the vintage up to
+    #                         (excluding) the period, storms of different periods being independent
+    # ==============================================================================
+    conn = sqlite3.connect(db)
+    cur = conn.cursor()
+    if periods is None or vintages is None:
+        time_periods = pd.read_sql_query("SELECT t_periods, flag FROM time_periods ORDER BY t_periods", conn)
+        if periods is None:
+            periods = time_periods.loc[time_periods.flag == 'f', 't_periods'].values[:-1]
+        if vintages is None:
+            vintages = time_periods.t_periods.values
+
+    # Expected capacity remaining after the storm of one period, averaged over the groups
+    prob = pd.Series(np.asarray(prob, dtype='float64'), index=rates.columns) if not isinstance(prob, pd.Series) else prob
+    expected = rates.values.dot(prob.reindex(rates.columns).values / prob.sum())
+
+    periods = np.asarray(periods)
+    vintages = np.asarray(vintages)
+    records = []
+    for i, p in enumerate(periods):
+        for v in vintages[vintages <= p]:
+            # Storms of the periods from the vintage up to (excluding) p
+            n_storms = np.sum((periods >= v) & (periods < p))
+            for tech, value in zip(rates.index, expected ** n_storms):
+                records.append((int(p), tech, int(v), float(value), ''))
+
+    cur.execute("CREATE TABLE IF NOT EXISTS CapReduction (periods integer, tech text, vintage integer, "
+                "cap_reduction real, cap_reduction_notes text, PRIMARY KEY(periods, tech, vintage))")
+    cur.execute("DELETE FROM CapReduction")
+    cur.executemany("INSERT INTO CapReduction VALUES (?,?,?,?,?)", records)
+    conn.commit()
+    conn.close()
+    return pd.DataFrame(records, columns=['periods', 'tech', 'vintage', 'cap_reduction', 'cap_reduction_notes'])
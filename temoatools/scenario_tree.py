@@ -0,0 +1,211 @@
+import numpy as np
+import pandas as pd
+
+
+# ============================================================================#
+# Scenario tree of a stochastic temoa run
+#
+# Nodes are stored in arrays (node -> parent, stage, branch, conditional and cumulative probability) so that
+# paths and probabilities are looked up rather than parsed from node names such as "Rs0s1s2", which only works
+# for trees with up to 10 branches per stage. Nodes are kept in the order of ScenarioStructure.dat (root first,
+# each node before its children).
+# ============================================================================#
+class ScenarioTree(object):
+
+    def __init__(self, nodes, parent, stage, branch, cond_prob, scenarios=None):
+        #    inputs:
+        #    1) nodes           - names of the nodes (list), e.g. ['R', 'Rs0', 'Rs1']
+        #    2) parent          - position of the parent of each node, -1 for the root
+        #    3) stage           - stage of each node, 0 for the root
+        #    4) branch          - position of each node among the children of its parent, 0 for the root
+        #    5) cond_prob       - probability of each node given its parent
+        #    6) scenarios       - dictionary of scenario name to leaf node name, by default "S0s1" for "Rs0s1"
+        # ==============================================================================
+        self.nodes = list(nodes)
+        self.parent = np.asarray(parent, dtype='int64')
+        self.stage = np.asarray(stage, dtype='int64')
+        self.branch = np.asarray(branch, dtype='int64')
+        self.cond_prob = np.asarray(cond_prob, dtype='float64')
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        n_stages = int(self.stage.max()) + 1 if len(self.nodes) > 0 else 0
+
+        # Cumulative probability and ancestors (row i holds the path from the root to node i, -1 after node i),
+        # filled one stage at a time since parents are always in the previous stage
+        self.prob = self.cond_prob.copy()
+        self.ancestors = np.full((len(self.nodes), n_stages), -1, dtype='int64')
+        self.ancestors[self.stage == 0, 0] = np.nonzero(self.stage == 0)[0]
+        for s in range(1, n_stages):
+            ind = np.nonzero(self.stage == s)[0]
+            self.prob[ind] = self.prob[self.parent[ind]] * self.cond_prob[ind]
+            self.ancestors[ind, :s] = self.ancestors[self.parent[ind], :s]
+            self.ancestors[ind, s] = ind
+
+        # Leaves and the scenario ending at each of them
+        is_parent = np.zeros(len(self.nodes), dtype=bool)
+        is_parent[self.parent[self.parent >= 0]] = True
+        self.leaves = np.nonzero(~is_parent)[0]
+        if scenarios is None:
+            scenarios = {'S' + self.nodes[i][2:]: self.nodes[i] for i in self.leaves}
+        self.scenarios = dict(scenarios)
+        self.scenario_index = {s: self.index[node] for s, node in self.scenarios.items()}
+
+    # ==============================================================================
+    # Construction
+    # ==============================================================================
+    @classmethod
+    def from_branches(cls, branches):
+        #    inputs:
+        #    1) branches        - conditional probabilities of the children of every node, one list per stage
+        #                         (the leaves are one stage deeper), e.g. [[0.5, 0.5], [0.2, 0.3, 0.5]]
+        #
+        #    outputs:
+        #    1) tree            - ScenarioTree named as by generate_scenario_tree.py (R, Rs0, Rs0s0, ...)
+        # ==============================================================================
+        nodes, parent, stage, branch, cond_prob = [], [], [], [], []
+        # Depth first, so that nodes are in the same order as ScenarioStructure.dat
+        stack = [('R', -1, 0, 0, 1.0)]
+        while len(stack) > 0:
+            node = stack.pop()
+            i = len(nodes)
+            for lst, value in zip([nodes, parent, stage, branch, cond_prob], node):
+                lst.append(value)
+            if node[2] < len(branches):
+                children = [(node[0] + 's' + str(b), i, node[2] + 1, b, p) for b, p in enumerate(branches[node[2]])]
+                stack.extend(reversed(children))
+        return cls(nodes, parent, stage, branch, cond_prob)
+
+    @classmethod
+    def from_options(cls, opts, periods=None):
+        #    inputs:
+        #    1) opts            - options module of generate_scenario_tree.py (types, conditional_probability and
+        #                         stochastic_points are used)
+        #    2) periods         - all periods of the model, by default the stochastic points, periods that are
+        #                         not stochastic points have a single child with a probability of 1
+        # ==============================================================================
+        spoints = list(opts.stochastic_points)
+        if periods is None:
+            periods = spoints
+        periods = sorted(periods)
+        branches = []
+        for period in periods[:-1]:
+            if period in spoints:
+                branches.append([opts.conditional_probability[t] for t in opts.types])
+            else:
+                branches.append([1.0])
+        return cls.from_branches(branches)
+
+    @classmethod
+    def from_structure(cls, filename):
+        #    inputs:
+        #    1) filename        - path to ScenarioStructure.dat
+        # ==============================================================================
+        sets, params = read_structure(filename)
+        nodes = sets['Nodes']
+        index = {node: i for i, node in enumerate(nodes)}
+        stages = {s: i for i, s in enumerate(sets['Stages'])}
+
+        parent = np.full(len(nodes), -1, dtype='int64')
+        branch = np.zeros(len(nodes), dtype='int64')
+        for name, children in sets.items():
+            if name.startswith('Children['):
+                ind = [index[child] for child in children]
+                parent[ind] = index[name[len('Children['):-1]]
+                branch[ind] = np.arange(len(ind))
+
+        node_stage = pairs(params['NodeStage'])
+        stage = [stages[node_stage[node]] for node in nodes]
+        cond_prob = pairs(params['ConditionalProbability'])
+        cond_prob = [float(cond_prob[node]) for node in nodes]
+        return cls(nodes, parent, stage, branch, cond_prob, scenarios=pairs(params['ScenarioLeafNode']))
+
+    # ==============================================================================
+    # Serialization (one row per node, saved next to the results)
+    # ==============================================================================
+    def to_frame(self):
+        leaf_scenario = {node: s for s, node in self.scenarios.items()}
+        return pd.DataFrame({'node': self.nodes,
+                             'parent': [self.nodes[p] if p >= 0 else '' for p in self.parent],
+                             'stage': self.stage, 'branch': self.branch, 'cond_prob': self.cond_prob,
+                             'prob': self.prob, 'scenario': [leaf_scenario.get(n, '') for n in self.nodes]})
+
+    def save(self, filename):
+        self.to_frame().to_csv(filename, index=False, float_format='%.17g')
+
+    @classmethod
+    def load(cls, filename):
+        df = pd.read_csv(filename, dtype={'node': str, 'parent': str, 'scenario': str}, keep_default_na=False,
+                         float_precision='round_trip')
+        index = {node: i for i, node in enumerate(df.node)}
+        parent = [index[p] if p != '' else -1 for p in df.parent]
+        scenarios = {s: node for s, node in zip(df.scenario, df.node) if s != ''}
+        return cls(df.node, parent, df.stage.values, df.branch.values, df.cond_prob.values, scenarios=scenarios)
+
+    # ==============================================================================
+    # Queries
+    # ==============================================================================
+    def path(self, node):
+        # Names of the nodes from the root to node (a node or scenario name)
+        i = self.lookup(node)
+        return [self.nodes[j] for j in self.ancestors[i, :self.stage[i] + 1]]
+
+    def branches(self, node):
+        # Branch taken at each stage to reach node, e.g. [0, 2] for "Rs0s2"
+        i = self.lookup(node)
+        return list(self.branch[self.ancestors[i, 1:self.stage[i] + 1]])
+
+    def probability(self, node):
+        return self.prob[self.lookup(node)]
+
+    def lookup(self, name):
+        # Position of a node or scenario, scenario names may be prefixed as in the results, e.g. "WA_0.S0s1"
+        if name in self.index:
+            return self.index[name]
+        return self.scenario_index[str(name).split('.')[-1]]
+
+    def scenario_prob(self, scenarios):
+        #    inputs:
+        #    1) scenarios       - names of scenarios or nodes (array-like), e.g. the scenario column of results
+        #
+        #    outputs:
+        #    1) prob            - numpy array of the cumulative probabilities, nan for names not in the tree
+        # ==============================================================================
+        scenarios = pd.Series(scenarios)
+        unique = scenarios.unique()
+        prob = {}
+        for name in unique:
+            try:
+                prob[name] = self.prob[self.lookup(name)]
+            except KeyError:
+                prob[name] = np.nan
+        return scenarios.map(prob).values.astype('float64')
+
+    def assign_prob(self, df, column='scenario', prob='prob'):
+        # Adds the probability of the scenario of each row of df as a new column
+        df.loc[:, prob] = self.scenario_prob(df.loc[:, column].values)
+        return df
+
+
+# ============================================================================#
+# Helper functions
+# ============================================================================#
+def read_structure(filename):
+    # Sets and params of a ScenarioStructure.dat file, as dictionaries of name to list of values
+    with open(filename, 'r') as f:
+        lines = [line.split('#')[0] for line in f]
+    sets = {}
+    params = {}
+    for statement in ' '.join(lines).split(';'):
+        tokens = statement.split()
+        if len(tokens) < 3 or ':=' not in tokens:
+            continue
+        values = tokens[tokens.index(':=') + 1:]
+        if tokens[0] == 'set':
+            sets[tokens[1]] = values
+        elif tokens[0] == 'param':
+            params[tokens[1]] = values
+    return sets, params
+
+
+def pairs(values):
+    # Dictionary of a param listed as key value pairs
+    return dict(zip(values[0::2], values[1::2]))
@@ -1,6 +1,9 @@
 import os
+import shutil
+import numpy as np
 import pandas as pd
 import time
+import temoatools as tt
 
 
 # ===========================================
@@ -8,42 +11,263 @@ import time
 #
 # If running the stochastic model with the same hurricane wind speeds
 # but different probabilities, then instead of re-running the temoa solution
-# the results can be copied and weighted to get new distributions
+# the results can be copied and weighted to get new distributions.
+# The results are streamed in chunks, so memory use does not grow with the size of the results, and only the
+# rows of the databases in db_shift are copied, with the database name (before the first ".") remapped in the database
+# and scenario columns, e.g. {"WA_0": "WA_1"} copies "WA_0.sqlite" as "WA_1.sqlite" and "WA_0.S0s1" as "WA_1.S0s1"
 # ===========================================
-def stoch_expand(path, filename, db_shift):
-    # Move to results directory
-    cwd = os.getcwd()
-    os.chdir(path)
-
-    # Read-in existing results
-    filein = filename + ".csv"
-    f = open(filein, 'r')
-    filedata = f.read()
-    f.close()
-
-    # Make a replacement on a copy of filedata, to preserve original results
-    newdata = filedata
-    # Remove first line of newdata, so that when combined we do not have the headings twice
-    ind = newdata.find("\n") + 2
-    newdata = newdata[ind:]
-    # Add a row number for the first line
-    newdata = "0" + newdata
-
-    # Replace db names with db_shift
-    for key in db_shift.keys():
-        newdata = newdata.replace(key, db_shift[key])
-
-    # Combine data
-    combdata = filedata + newdata
-
-    # Write out updated results
-    fileout = filename + "_exp.csv"
-    f = open(fileout, 'w')
-    f.write(combdata)
-    f.close()
-
-    # Return to original folder
-    os.chdir(cwd)
+def stoch_expand(path, filename, db_shift, view=False, chunksize=100000):
+    #    inputs:
+    #    1) path            - results directory
+    #    2) filename        - name of the results csv (without extension), e.g. "activity_by_fuel"
+    #    3) db_shift        - dictionary of the database of the results to the database of the copy, e.g. {"WA_0": "WA_1"}
+    #    4) view            - False writes the original and copied rows to filename_exp.csv (appending the copies chunk
+    #                         by chunk), True only writes the mapping table filename_exp_map.csv, that read_weighted
+    #                         (stoch_weight and stoch_resample) expands when reading filename_exp
+    #    5) chunksize       - number of rows processed at a time
+    #
+    #    outputs:
+    #    1) fileout         - path of the file written
+    # ==============================================================================
+    filein = os.path.join(path, filename + ".csv")
+
+    if view:
+        fileout = os.path.join(path, filename + "_exp_map.csv")
+        mapping = pd.DataFrame({"source": filename, "database": list(db_shift.keys()),
+                                "shifted": list(db_shift.values())}, columns=["source", "database", "shifted"])
+        mapping.to_csv(fileout, index=False)
+        return fileout
+
+    # Original results are copied as they are
+    fileout = os.path.join(path, filename + "_exp.csv")
+    with open(filein, 'rb') as fin, open(fileout, 'wb') as fout:
+        shutil.copyfileobj(fin, fout)
+        if fout.tell() > 0:
+            fin.seek(-1, os.SEEK_END)
+            if fin.read(1) != b"\n":
+                fout.write(b"\n")
+
+    # Copies of the rows of the shifted databases are appended, values are read as text so they are written unchanged
+    for chunk in pd.read_csv(filein, chunksize=chunksize, dtype=str, keep_default_na=False):
+        shifted = shift_databases(chunk, db_shift)
+        if len(shifted) > 0:
+            shifted.to_csv(fileout, mode='a', header=False, index=False)
+    return fileout
+
+
+def shift_databases(df, db_shift):
+    # Rows of df whose database is in db_shift, with the database and the prefix of the scenario names remapped. Names
+    # are matched on the database name before the first ".", keeping their suffix, e.g. with {"WA_0": "WA_1"}
+    # "WA_0.sqlite" -> "WA_1.sqlite" and "WA_0.S0s1" -> "WA_1.S0s1"
+    def shift_name(name):
+        name = str(name)
+        if name in db_shift:
+            return db_shift[name]
+        key = tt.remove_ext(name)
+        if key in db_shift:
+            return db_shift[key] + name[len(key):]
+        return None
+
+    databases = df["database"].unique()
+    shifted = dict((database, shift_name(database)) for database in databases)
+    df = df.loc[df["database"].map(shifted).notnull()].copy()
+    df.loc[:, "database"] = df["database"].map(shifted)
+    if "scenario" in df.columns and len(df) > 0:
+        scenarios = dict((scenario, shift_name(scenario)) for scenario in df["scenario"].unique())
+        df.loc[:, "scenario"] = [scenarios[s] if scenarios[s] is not None else s for s in df["scenario"]]
+    return df
+
+
+# ===========================================
+# Scenario probabilities
+# ===========================================
+def scenario_probs(scenarios, node_prob):
+    #    inputs:
+    #    1) scenarios       - names of scenarios (array-like), e.g. "WA_0.S0s1s2" for case 0 of database WA
+    #    2) node_prob       - dictionary by case of either a ScenarioTree or the conditional probabilities of
+    #                         the branches of every node, e.g. {"0": [0.52, 0.32, 0.16]}
+    #
+    #    outputs:
+    #    1) prob            - numpy array of the probability of each scenario
+    # ==============================================================================
+    scenarios = pd.Series(scenarios).reset_index(drop=True)
+    # Case number follows the "_" of the database name, up to the ".", e.g. "10" for "WA_10.S0s1"
+    cases = scenarios.map(lambda s: tt.remove_ext(s[s.find("_") + 1:]))
+    prob = np.full(len(scenarios), np.nan)
+    for case in cases.unique():
+        ind = (cases == case).values
+        tree = node_prob[case]
+        if not isinstance(tree, tt.ScenarioTree):
+            # Same branches at every stage, as deep as the scenario names
+            n_stages = scenarios[ind].map(lambda s: s.split(".")[-1].count("s") + 1).max()
+            tree = tt.ScenarioTree.from_branches([tree] * n_stages)
+        prob[ind] = tree.scenario_prob(scenarios[ind].values)
+    return prob
+
+
+def read_weighted(filename, node_prob):
+    # Results of filename.csv (without scenario==solve) with the probability of each scenario in a "prob" column,
+    # an expansion saved as a mapping table (stoch_expand with view=True) is applied to its source results
+    if not os.path.exists(filename + ".csv") and os.path.exists(filename + "_map.csv"):
+        mapping = pd.read_csv(filename + "_map.csv")
+        source = os.path.join(os.path.dirname(filename), mapping["source"].values[0])
+        df = pd.read_csv(source + ".csv")
+        db_shift = dict(zip(mapping["database"], mapping["shifted"]))
+        df = pd.concat([df, shift_databases(df, db_shift)], ignore_index=True)
+    else:
+        df = pd.read_csv(filename + ".csv")
+    # Remove scenario==solve
+    df.drop(df.loc[df['scenario'] == "solve"].index, inplace=True)
+
+    df.loc[:, "prob"] = scenario_probs(df.loc[:, "scenario"].values, node_prob)
+    return df
+
+
+# ===========================================
+# Weight stochastic results
+#
+# Keeps one row per scenario and result with the exact probability of the scenario, so that statistics can be
+# computed directly (weighted_stats, weighted_quantile, weighted_cdf, weighted_hist) or, when a plotting function
+# needs a population, samples can be drawn on demand (stoch_sample)
+# ===========================================
+def stoch_weight(path, filename, node_prob):
+    #    inputs:
+    #    1) path            - results directory
+    #    2) filename        - name of the results csv (without extension), e.g. "activity_by_fuel_exp"
+    #    3) node_prob       - dictionary by case of a ScenarioTree or node probabilities, e.g. {"0": [0.52, 0.32, 0.16]}
+    #
+    #    outputs:
+    #    1) df              - pandas DataFrame of the results with a "prob" column, also saved as filename_weighted.csv
+    # ==============================================================================
+    print(filename)
+    df = read_weighted(os.path.join(path, filename), node_prob)
+
+    # Check if successful (total probability per database==1)
+    check_prob(df)
+
+    df.to_csv(os.path.join(path, filename + "_weighted.csv"))
+    return df
+
+
+def check_prob(df):
+    for db in df.database.unique():
+        print("db: ", db)
+        print(
+            "sum = ", df.loc[df.database == db, "prob"].sum(), "(Should be equal to 1 for cost and emissions)")
+
+
+# ===========================================
+# Weighted statistics
+#
+# values and weights are array-like of the same length, weights are normalized so they need not sum to 1
+# ===========================================
+def weighted_mean(values, weights):
+    values = np.asarray(values, dtype='float64')
+    weights = np.asarray(weights, dtype='float64')
+    return np.sum(values * weights) / np.sum(weights)
+
+
+def weighted_std(values, weights):
+    values = np.asarray(values, dtype='float64')
+    weights = np.asarray(weights, dtype='float64')
+    mean = weighted_mean(values, weights)
+    return np.sqrt(np.sum(weights * (values - mean) ** 2) / np.sum(weights))
+
+
+def weighted_cdf(values, weights):
+    #    outputs:
+    #    1) cdf             - pandas DataFrame with the sorted unique values ("value") and the probability of a
+    #                         result being less than or equal to each value ("cdf"), ready for a step plot
+    # ==============================================================================
+    values = np.asarray(values, dtype='float64')
+    weights = np.asarray(weights, dtype='float64')
+    unique, inverse = np.unique(values, return_inverse=True)
+    prob = np.bincount(inverse, weights=weights, minlength=len(unique))
+    cdf = np.cumsum(prob) / np.sum(weights)
+    return pd.DataFrame({'value': unique, 'cdf': cdf})
+
+
+def weighted_quantile(values, weights, q):
+    # Inverse of the weighted cdf, the smallest value whose cumulative probability reaches q (q may be a list)
+    values = np.asarray(values, dtype='float64')
+    weights = np.asarray(weights, dtype='float64')
+    order = np.argsort(values, kind='mergesort')
+    cdf = np.cumsum(weights[order]) / np.sum(weights)
+    # Tolerance so that rounding of the cumulative sum does not move a quantile to the next value
+    ind = np.searchsorted(cdf, np.asarray(q, dtype='float64') - 1e-12, side='left')
+    return values[order][np.minimum(ind, len(values) - 1)]
+
+
+def weighted_hist(values, weights, bins=10):
+    #    outputs:
+    #    1) hist            - pandas DataFrame with the edges ("left", "right") and probability ("prob") of each bin
+    # ==============================================================================
+    weights = np.asarray(weights, dtype='float64')
+    prob, edges = np.histogram(np.asarray(values, dtype='float64'), bins=bins, weights=weights / np.sum(weights))
+    return pd.DataFrame({'left': edges[:-1], 'right': edges[1:], 'prob': prob})
+
+
+def weighted_stats(df, by, value='value', weight='prob', quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+    #    inputs:
+    #    1) df              - pandas DataFrame with one row per scenario and result, e.g. from stoch_weight
+    #    2) by              - columns identifying each result, e.g. ['database', 'fuelOrTech', 'Year']
+    #    3) value           - column holding the results
+    #    4) weight          - column holding the probability of each row
+    #    5) quantiles       - quantiles to compute
+    #
+    #    outputs:
+    #    1) stats           - pandas DataFrame with the weighted mean, std and quantiles (e.g. "5%") of each result
+    # ==============================================================================
+    if type(by) == str:
+        by = [by]
+    keys = []
+    rows = []
+    for key, group in df.groupby(by, sort=False):
+        keys.append(key if isinstance(key, tuple) else (key,))
+        values = group[value].values
+        weights = group[weight].values
+        rows.append([weighted_mean(values, weights), weighted_std(values, weights)] +
+                    list(weighted_quantile(values, weights, quantiles)))
+
+    columns = ['mean', 'std'] + [format(100 * q, 'g') + '%' for q in quantiles]
+    stats = pd.DataFrame(keys, columns=by)
+    return pd.concat([stats, pd.DataFrame(rows, columns=columns, dtype='float64')], axis=1)
+
+
+# ===========================================
+# Sample stochastic results
+#
+# Draws a population from weighted results only when it is needed (e.g. by seaborn plotting functions), all rows
+# of a sampled scenario are kept together and numbered by "entry"
+# ===========================================
+def stoch_sample(df, n_samples=10000, by='database', weight='prob', seed=None):
+    #    inputs:
+    #    1) df              - pandas DataFrame with a "scenario" column and probabilities, e.g. from stoch_weight
+    #    2) n_samples       - number of scenarios drawn for each value of by
+    #    3) by              - column (or list of columns) whose groups are sampled separately, None samples all rows
+    #    4) weight          - column holding the probability of each scenario
+    #    5) seed            - seed of the random number generator, for repeatable samples
+    #
+    #    outputs:
+    #    1) samples         - generator of pandas DataFrames, one per group of by, holding the sampled rows
+    # ==============================================================================
+    rng = np.random.RandomState(seed)
+    groups = [(None, df)] if by is None else df.groupby(by, sort=False)
+    entry = 0
+    for key, group in groups:
+        # One probability per scenario
+        scenarios = group.drop_duplicates('scenario')
+        p = scenarios[weight].values.astype('float64')
+        draws = rng.choice(len(scenarios), size=n_samples, p=p / p.sum())
+
+        # Positions of the rows of each scenario, repeated in the order drawn
+        rows = group.groupby('scenario', sort=False).indices
+        positions = [rows[s] for s in scenarios['scenario'].values]
+        ind = np.concatenate([positions[d] for d in draws])
+        sample = group.iloc[ind].reset_index(drop=True)
+        sample['entry'] = np.repeat(np.arange(entry + 1, entry + n_samples + 1), [len(positions[d]) for d in draws])
+        entry = entry + n_samples
+        yield sample
 
 
 # ===========================================
@@ -52,91 +276,36 @@ def stoch_expand(path, filename, db_shift):
 # The stochastic model solves each node, but does not provide results in a format that weights the results.
 # This script resamples the results based on the calculated probabilities and a Monte Carlo population
 # of 10,000 so that plotting functions from seaborn can be used to easily visualize the results
+# (the population is large, stoch_weight with weighted_stats or stoch_sample is preferred for new analyses)
 # ===========================================
-def stoch_resample(path, filename, node_prob):
-    # Move to results directory
-    cwd = os.getcwd()
-    os.chdir(path)
-
-    # ------------------
-    # Process files
-    # ------------------
+def stoch_resample(path, filename, node_prob, n_population=10000):
     # Start counting time
     t0 = time.time()
-    t_prev = t0
 
     print(filename)
+    df = read_weighted(os.path.join(path, filename), node_prob)
+    df.loc[:, "entry"] = 0  # to store entry number
 
-    csv_filename = filename + ".csv"
-    # Load and process data
-    df = pd.read_csv(csv_filename)
-    # Remove scenario==solve
-    df.drop(df.loc[df['scenario'] == "solve"].index, inplace=True)
+    # Copies of each scenario: int(n_population * prob), all rows of a scenario share an entry number
+    positions = pd.Series(np.arange(len(df)), index=df.index).groupby(df["scenario"].values, sort=False)
+    ind = []
+    entries = []
+    entry = 0
+    for s, position in positions:
+        repeats = int(n_population * df["prob"].values[position.values[0]])
+        ind.append(np.tile(position.values, repeats))
+        entries.append(np.repeat(np.arange(entry + 1, entry + repeats + 1), len(position)))
+        entry = entry + repeats
+
+    df2 = df.iloc[np.concatenate(ind)].reset_index(drop=True) if len(ind) > 0 else df.iloc[[]]
+    df2.loc[:, "entry"] = np.concatenate(entries) if len(entries) > 0 else []
 
-    # Create new columns
-    df.loc[:, "prob"] = 0.0  # to store probabilities (prob)
-    df.loc[:, "entry"] = 0  # to store entry number
-    entry = 0  # Reset entry number
-    # Create a new dataframe to store results
-    n_population = 10000
-    df2 = pd.DataFrame()
-
-    # ------------------
-    # Compute Probabilities
-    # ------------------
-    # Test cases
-    # s = "D_#.S0s0s0s0"
-    # s = "D_#.S1s1s1s1"
-    # s = "D_#.S2s2s2s2"
-
-    for s in df.loc[:, "scenario"].unique():
-
-        # Find each row for this scenario
-        indices = df.loc[:, "scenario"] == s
-        # Find positions of '_' and 'S' in scenario name to identify case_num and p_case
-        ind1 = s.find("_") + 1
-        ind2 = s.find("S") + 1
-        case_num = s[ind1]
-        p_case = node_prob[case_num]
-        # Compute probability of this scenario recursively
-        prob = p_case[int(s[ind2])]
-        while ind2 < len(s) - 1:
-            ind2 = ind2 + 2
-            prob = prob * p_case[int(s[ind2])]
-
-        # Store prob
-        df.loc[indices, "prob"] = prob
-
-        # Copy repeats into a new database
-        repeats = int(n_population * prob)
-        for i in range(repeats):
-            entry = entry + 1
-            df.loc[indices, "entry"] = entry
-            df2 = df2.append(df.loc[indices, :], ignore_index=True)
-
-        # Update user on time elapsed
-        t = time.time()
-        dt = t - t_prev
-        print(s, ": elapsed time (s): ", str(round(dt, 2)))
-        t_prev = t
-
-    # ------------------
     # Check if successful (total probability per database==1)
-    # ------------------
-    for db in df.database.unique():
-        print("db: ", db)
-        print(
-            "sum = ", df.loc[df.database == db, "prob"].sum(), "(Should be equal to 1 for cost and emissions)")
+    check_prob(df)
 
-    # ------------------
     # Save results as csv
-    # ------------------
-    csv_file = filename + "_resampled.csv"
-    df2.to_csv(csv_file)
+    df2.to_csv(os.path.join(path, filename + "_resampled.csv"))
 
     # Update total time
     t = time.time()
     print("Total time (s): ", str(round(t - t0, 2)))
-
-    # Return to original folder
-    os.chdir(cwd)
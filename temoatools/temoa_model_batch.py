@@ -0,0 +1,207 @@
+import os
+import time
+import sqlite3
+import pandas as pd
+import numpy as np
+import temoatools as tt
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Columns of the manifest that records the status of each case
+manifest_cols = ['case', 'scenarioName', 'status', 'objective', 'attempts', 'time_build', 'time_solve', 'message']
+
+
+# ============================================================================#
+# Create a table of cases to build and run
+# ============================================================================#
+def create_batch_cases(scenarioName, cases=None, case_type='sensitivity', mc_type='perturbations'):
+    #    inputs:
+    #    1) scenarioName    - name of scenario in scenarioXLSX
+    #    2) cases           - output from createSensitivityCases, createMonteCarloCases or
+    #                         createMonteCarloCases_distributions, None runs the scenario by itself
+    #    3) case_type       - 'sensitivity' (one case per row) or 'monte_carlo' (one case per numbered column)
+    #    4) mc_type         - 'perturbations' (cases hold multipliers) or 'values' (cases hold exact values)
+    #
+    #    outputs:
+    #    1) batch_cases     - pandas DataFrame with one row per case and perturbed variable
+    # ==============================================================================
+    cols = ['case', 'scenarioName', 'caseNum', 'mc_type', 'type', 'variable', 'tech', 'multiplier', 'value']
+    rows = []
+
+    # Scenario only
+    if cases is None:
+        rows.append([scenarioName, scenarioName, 0, 'perturbations', 'Baseline', 'Baseline', 'Baseline', 0.0, np.nan])
+
+    # Sensitivity - each row of cases is a separate model
+    elif case_type == 'sensitivity':
+        for caseNum in range(len(cases)):
+            case = scenarioName + '_Sens_' + str(caseNum)
+            rows.append([case, scenarioName, caseNum, 'perturbations', cases.loc[caseNum, 'type'],
+                         cases.loc[caseNum, 'variable'], cases.loc[caseNum, 'tech'],
+                         cases.loc[caseNum, 'multiplier'], np.nan])
+
+    # Monte Carlo - each numbered column of cases is a separate model
+    elif case_type == 'monte_carlo':
+        caseNums = [col for col in cases.columns if str(col).isdigit()]
+        for caseNum in caseNums:
+            case = scenarioName + '_MC_' + str(caseNum)
+            for i in cases.index:
+                if mc_type == 'values':
+                    multiplier, value = np.nan, cases.loc[i, caseNum]
+                else:
+                    multiplier, value = cases.loc[i, caseNum], np.nan
+                rows.append([case, scenarioName, caseNum, mc_type, cases.loc[i, 'type'], cases.loc[i, 'variable'],
+                             cases.loc[i, 'tech'], multiplier, value])
+
+    return pd.DataFrame(rows, columns=cols)
+
+
+# ============================================================================#
+# Build and run a table of cases using a pool of processes
+# ============================================================================#
+def run_batch(modelInputs, scenarioXLSX, batch_cases, temoa_path, path=os.path.normcase('.'), ncpus=1, solver='',
+              max_attempts=2, manifest='manifest.csv', in_process=True, incremental=True, debug=False):
+    #    inputs:
+    #    1) modelInputs     - database with model inputs (within data subdirectory), from move_data_to_db
+    #    2) scenarioXLSX    - identifies which technologies are used for each scenario (within data subdirectory)
+    #    3) batch_cases     - pandas DataFrame of cases, from create_batch_cases (can be concatenated)
+    #    4) temoa_path      - path to temoa directory that contains temoa_model/
+    #    5) path            - project directory that contains data/, databases/ and configs/ are created within it
+    #    6) ncpus           - number of worker processes
+    #    7) solver          - leave as '' to use system default, other options include 'cplex', 'gurobi'
+    #    8) max_attempts    - number of times a case is attempted before it is recorded as failed
+    #    9) manifest        - csv file (within path) that records the status of each case, cases already solved
+    #                         in an existing manifest are skipped so that an interrupted batch can be resumed
+    #    10) in_process     - True uses run_in_process, False uses run (a new python process for each case)
+    #    11) incremental    - True builds cases incrementally (see build), each worker process reuses the inputs and
+    #                         database of the first case it builds for each scenario
+    #
+    #    outputs:
+    #    1) manifest_df     - pandas DataFrame holding the status of each case
+    # ==============================================================================
+    path = os.path.abspath(path)
+    tt.create_dir(project_path=path, optional_dir='')
+    manifest_path = os.path.join(path, manifest)
+
+    # Status of each case, cases solved in a previous batch are kept as-is
+    records = {}
+    if os.path.isfile(manifest_path):
+        df = pd.read_csv(manifest_path)
+        df['message'] = df['message'].fillna('')
+        for i in df.index:
+            record = df.loc[i, manifest_cols].to_dict()
+            if record['status'] == 'optimal' and os.path.isfile(database_path(path, record['case'])):
+                records[record['case']] = record
+
+    # Cases remaining
+    todo = []
+    for case, case_rows in batch_cases.groupby('case', sort=False):
+        if case in records:
+            if debug:
+                print('Skipping solved case: ' + case)
+            continue
+        records[case] = {'case': case, 'scenarioName': case_rows.scenarioName.iloc[0], 'status': 'pending',
+                         'objective': np.nan, 'attempts': 0, 'time_build': np.nan, 'time_solve': np.nan,
+                         'message': ''}
+        todo.append((case, case_rows.reset_index(drop=True)))
+    write_manifest(records, manifest_path)
+
+    # Evaluate cases, failed cases are resubmitted until max_attempts is reached
+    with ProcessPoolExecutor(max_workers=ncpus) as executor:
+        futures = {}
+        for case, case_rows in todo:
+            future = executor.submit(evaluate_case, modelInputs, scenarioXLSX, case, case_rows, temoa_path, path,
+                                     solver, in_process, incremental)
+            futures[future] = (case, case_rows)
+
+        while len(futures) > 0:
+            future = next(as_completed(futures))
+            case, case_rows = futures.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'status': 'error', 'objective': np.nan, 'time_build': np.nan, 'time_solve': np.nan,
+                          'message': str(e)}
+
+            record = records[case]
+            record.update(result)
+            record['attempts'] = record['attempts'] + 1
+            if debug:
+                print(case + ': ' + record['status'] + ' (attempt ' + str(record['attempts']) + ')')
+
+            if record['status'] != 'optimal' and record['attempts'] < max_attempts:
+                future = executor.submit(evaluate_case, modelInputs, scenarioXLSX, case, case_rows, temoa_path,
+                                         path, solver, in_process, incremental)
+                futures[future] = (case, case_rows)
+
+            # Update manifest after every case, so that an interrupted batch can be resumed
+            write_manifest(records, manifest_path)
+
+    return pd.DataFrame(list(records.values()), columns=manifest_cols)
+
+
+# ============================================================================#
+# Build and run a single case (called within worker processes)
+# ============================================================================#
+def evaluate_case(modelInputs, scenarioXLSX, case, case_rows, temoa_path, path, solver, in_process,
+                  incremental=False):
+    result = {'status': 'error', 'objective': np.nan, 'time_build': np.nan, 'time_solve': np.nan, 'message': ''}
+    scenarioName = case_rows.loc[0, 'scenarioName']
+    mc_type = case_rows.loc[0, 'mc_type']
+
+    # Build Model
+    t0 = time.time()
+    try:
+        MCinputs = case_rows.loc[:, ['type', 'variable', 'tech', 'multiplier', 'value']]
+        tt.build(modelInputs, scenarioXLSX, scenarioName, case, MCinputs=MCinputs, path=path, mc_type=mc_type,
+                 incremental=incremental, out_path=path)
+    except Exception as e:
+        result['message'] = 'build: ' + str(e)
+        return result
+    t1 = time.time()
+    result['time_build'] = t1 - t0
+
+    # Run Model
+    if in_process:
+        run_result = tt.run_in_process(case, temoa_path=temoa_path, solver=solver, path=path)
+        result['status'] = run_result['status']
+        result['message'] = run_result['message']
+        if run_result['objective'] is not None:
+            result['objective'] = run_result['objective']
+    else:
+        tt.run(case, temoa_path=temoa_path, solver=solver, path=path)
+        result['objective'] = solved_objective(database_path(path, case))
+        if not np.isnan(result['objective']):
+            result['status'] = 'optimal'
+    result['time_solve'] = time.time() - t1
+
+    return result
+
+
+# ============================================================================#
+# Helper functions
+# ============================================================================#
+def database_path(path, case):
+    return os.path.join(path, 'databases', case + '.sqlite')
+
+
+def solved_objective(db_path):
+    # Objective stored by Temoa in the output database, nan if not solved
+    try:
+        con = sqlite3.connect(db_path)
+        cur = con.cursor()
+        cur.execute("SELECT total_system_cost FROM Output_Objective WHERE scenario='solve'")
+        rows = cur.fetchall()
+        con.close()
+    except sqlite3.Error:
+        rows = []
+    if len(rows) == 0:
+        return np.nan
+    return rows[0][0]
+
+
+def write_manifest(records, manifest_path):
+    # Write to a temporary file first so that the manifest is never left half-written
+    df = pd.DataFrame(list(records.values()), columns=manifest_cols)
+    temp_path = manifest_path + '.tmp'
+    df.to_csv(temp_path, index=False)
+    os.replace(temp_path, manifest_path)
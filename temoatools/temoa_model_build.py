@@ -49,16 +49,42 @@ demand_commodity = 'ELC_DMD'
 # Function to build a temoa model
 # =============================================================================
 def build(modelInputs, scenarioXLSX, scenarioName, outFilename, sensitivity={}, MCinputs={},
-          path=os.path.normcase('.'), mc_type='perturbations'):
+          path=os.path.normcase('.'), mc_type='perturbations', incremental=False, out_path=os.path.normcase('.')):
+    #    inputs:
+    #    1) modelInputs     - name of input database (within path/data)
+    #    2) scenarioXLSX    - name of scenario workbook (within path/data)
+    #    3) scenarioName    - name of scenario (column of scenarioXLSX)
+    #    4) outFilename     - name of database to create (within out_path/databases), without extension
+    #    5) sensitivity     - optional, one row from createSensitivityCases
+    #    6) MCinputs        - optional, rows from createMonteCarloCases
+    #    7) path            - directory that contains data/
+    #    8) mc_type         - 'perturbations' or 'values', how MCinputs are applied
+    #    9) incremental     - True reuses the inputs, technologies and database of previous builds in this process
+    #                         with the same modelInputs, scenarioXLSX and scenarioName: only technologies and tables
+    #                         changed by sensitivity/MCinputs are recomputed and rewritten (see clear_build_cache)
+    #    10) out_path       - directory in which databases/ is created, by default the working directory (as for run)
+    #
+    #    outputs:
+    #    1) inputs          - dictionary of input tables, after sensitivity/MCinputs are applied
+    # ==============================================================================
     data_path = os.path.join(path, 'data')
-    # Get empty dictionary of local variables
-    local = getEmptyLocalDict()
 
-    # Process scenarios
-    local = processScenarios(scenarioXLSX, scenarioName, local, data_path)
+    if incremental:
+        # Inputs and scenario are read once, tables are copied as sensitivity/MCinputs modify them
+        cache = getBuildCache(modelInputs, scenarioXLSX, scenarioName, data_path)
+        local = copy.deepcopy(cache['local'])
+        inputs = {table: df.copy() for table, df in cache['inputs'].items()}
+        # Outputs of each technology of the base case are reused while its inputs are unchanged (see addTech)
+        local['tech_outputs'] = cache['tech_outputs']
+    else:
+        # Get empty dictionary of local variables
+        local = getEmptyLocalDict()
 
-    # Read-in inputs as dictionary
-    inputs = inputs2Dict(modelInputs, data_path)
+        # Process scenarios
+        local = processScenarios(scenarioXLSX, scenarioName, local, data_path)
+
+        # Read-in inputs as dictionary
+        inputs = inputs2Dict(modelInputs, data_path)
 
     # ---------------------------------
     # Apply Sensitivity to inputs
@@ -100,22 +126,64 @@ def build(modelInputs, scenarioXLSX, scenarioName, outFilename, sensitivity={},
     # Connections
     local, outputs = processConnections(inputs, local, outputs)
 
-    # Copy temoa_schema_mod.db and write(commit) outputs to it
-    Write2Temoa(outputs, outFilename)
+    if incremental:
+        # Clone the database of the first build and rewrite the tables that differ from it
+        Write2Temoa(outputs, outFilename, path=out_path, base=cache['base'])
+    else:
+        # Copy temoa_schema_mod.db and write(commit) outputs to it
+        Write2Temoa(outputs, outFilename, path=out_path)
 
     return inputs
 
 
+# =============================================================================
+# Cache of inputs, technology outputs and base database used by incremental builds
+# =============================================================================
+build_cache = {}
+
+
+def getBuildCache(modelInputs, scenarioXLSX, scenarioName, data_path):
+    modelInputs = os.path.abspath(os.path.join(data_path, modelInputs))
+    scenarioXLSX = os.path.abspath(os.path.join(data_path, scenarioXLSX))
+    # Modifying either file invalidates the cache
+    key = (modelInputs, os.path.getmtime(modelInputs), scenarioXLSX, os.path.getmtime(scenarioXLSX), scenarioName)
+    if key not in build_cache:
+        local = processScenarios(scenarioXLSX, scenarioName, getEmptyLocalDict(), data_path)
+        inputs = inputs2Dict(modelInputs, data_path)
+        build_cache[key] = {'local': local, 'inputs': inputs, 'tech_outputs': getBaseTechOutputs(inputs, local),
+                            'base': {}}
+    return build_cache[key]
+
+
+def getBaseTechOutputs(inputs, local):
+    # Outputs of the technologies of the base case (without sensitivity/MCinputs). Only these are kept by incremental
+    # builds: perturbed technologies have new inputs in almost every case, so caching them would hold the tables of
+    # every case built by the process.
+    base_local = copy.deepcopy(local)
+    base_local['tech_outputs'] = {}
+    base_local['cache_tech_outputs'] = True
+    base_inputs = {table: df.copy() for table, df in inputs.items()}
+    outputs = getEmptyTemoaDict()
+    base_local, outputs = processSystem(base_inputs, base_local, outputs)
+    base_local, outputs = processPowerPlants(base_inputs, base_local, outputs)
+    base_local, outputs = processFuels(base_inputs, base_local, outputs)
+    base_local, outputs = processConnections(base_inputs, base_local, outputs)
+    return base_local['tech_outputs']
+
+
+def clear_build_cache():
+    for cache in build_cache.values():
+        if 'con' in cache['base']:
+            cache['base']['con'].close()
+    build_cache.clear()
+
+
 # =============================================================================
 # Move modelInputs to a dictionary using pandas
 # =============================================================================
 def inputs2Dict(modelInputs, path):
-    # Keep track of working directory
-    workDir = os.getcwd()
-    os.chdir(path)
-
     # Set-up sqlite connection
-    conn = sqlite3.connect(modelInputs)
+    conn = sqlite3.connect(os.path.join(path, modelInputs))
 
     # tables to read-in from SQL
     tables = ["representativeDays", "timesOfDay", "Connections", "ConnectionsExisting",
@@ -141,9 +209,6 @@ def inputs2Dict(modelInputs, path):
     # Set index using connection for easier access
     inputs['Connections'] = inputs['Connections'].set_index('connection')
 
-    # Return to original directory
-    os.chdir(workDir)
-
     # Return dictionary of inputs
     return inputs
 
@@ -163,12 +228,13 @@ def getEmptyTemoaDict():
 # =============================================================================
 # Write outputs to an empty temoa database
 # =============================================================================
-def Write2Temoa(outputs, outFilename):
-    # Keep track of working directory
-    workDir = os.getcwd()
+def Write2Temoa(outputs, outFilename, path=os.path.normcase('.'), base=None):
+    # path - directory in which databases/ is created, by default the working directory
+    # base - optional dictionary, empty on the first call, afterwards holds the outputs and an in-memory copy of the
+    #        database written on the first call. The copy is cloned and only tables whose outputs differ are rewritten.
 
     # Directory to hold empty (unrun) database files
-    databaseDir = os.path.join(workDir, "databases")
+    databaseDir = os.path.join(path, "databases")
     try:
         os.stat(databaseDir)
     except:
@@ -183,13 +249,25 @@ def Write2Temoa(outputs, outFilename):
     # Delete old *.sqlite file (if it already exists) and copy/rename copy of temoa_schema.sqlite
     if os.path.isfile(outputdB):
         os.remove(outputdB)
-    shutil.copyfile(emptydB, outputdB)
-
-    # Set-up sqlite connection
+    patch = base is not None and len(base) > 0
+    if patch:
+        # Only tables that differ from the base database are rewritten
+        tables = [(table, numEntries) for table, numEntries in temoaTables
+                  if not outputs[table] == base['outputs'][table]]
+    else:
+        shutil.copyfile(emptydB, outputdB)
+        tables = temoaTables
+
+    # Set-up sqlite connection, a larger page cache speeds up inserting large tables (e.g. CapacityFactorTech)
     conn = sqlite3.connect(outputdB)
     c = conn.cursor()
+    c.execute('PRAGMA cache_size = -65536')
 
-    for table, numEntries in temoaTables:
+    # Clone the base database, tables that are rewritten are emptied first
+    if patch:
+        base['con'].backup(conn)
+
+    for table, numEntries in tables:
 
         # Create SQL command based on number of entries
         command = 'INSERT INTO ' + table + ' VALUES (?'
@@ -199,6 +277,8 @@ def Write2Temoa(outputs, outFilename):
 
         # Execute SQL Command
         try:
+            if patch:
+                c.execute('DELETE FROM ' + table)
             if len(outputs[table]) == 1 and numEntries == 1:
                 c.execute(command, outputs[table])
             else:
@@ -208,10 +288,14 @@ def Write2Temoa(outputs, outFilename):
 
     # Close Connection
     conn.commit()
-    conn.close()
 
-    # Return to working directory
-    os.chdir(workDir)
+    # Keep an in-memory copy of the first database written
+    if base is not None and len(base) == 0:
+        base['outputs'] = outputs
+        base['con'] = sqlite3.connect(':memory:', check_same_thread=False)
+        conn.backup(base['con'])
+
+    conn.close()
 
 
 # =============================================================================
@@ -233,28 +317,28 @@ def getEmptyLocalDict():
 # Process Scenarios
 # =============================================================================
 def processScenarios(scenarioXLSX, scenarioName, local, path):
-    # Keep track of working directory
-    workDir = os.getcwd()
-    os.chdir(path)
+    scenarioXLSX = os.path.join(path, scenarioXLSX)
+
+    # Read all sheets with a single pass over the workbook
+    sheets = pd.read_excel(scenarioXLSX, sheet_name=['PowerPlants', 'Fuels', 'Connections', 'SolverSettings'])
 
     # Unpack PowerPlants
-    print(os.getcwd())
-    df = pd.read_excel(scenarioXLSX, sheet_name='PowerPlants')
+    df = sheets['PowerPlants']
     ind = df.loc[:, scenarioName] == 'Y'
     local['plants_to_include'] = df.Scenario[ind]
 
     # Unpack Fuels
-    df = pd.read_excel(scenarioXLSX, sheet_name='Fuels')
+    df = sheets['Fuels']
     ind = df.loc[:, scenarioName] == 'Y'
     local['fuels_to_include'] = df.Scenario[ind]
 
     # Unpack Connections
-    df = pd.read_excel(scenarioXLSX, sheet_name='Connections')
+    df = sheets['Connections']
     ind = df.loc[:, scenarioName] == 'Y'
     local['connections_to_include'] = df.Scenario[ind]
 
     # Unpack SolverSettings (all or Y/N)
-    df = pd.read_excel(scenarioXLSX, sheet_name='SolverSettings')
+    df = sheets['SolverSettings']
     df = df.set_index('Scenario')
     # Option to include baseload constraint (Does not work with LCOE script)
     local['include_baseload'] = df.loc['include_baseload', scenarioName]
@@ -282,9 +366,6 @@ def processScenarios(scenarioXLSX, scenarioName, local, path):
     # Minimum Capacity limit
     local['include_min_capacity_limit'] = df.loc['include_min_capacity_limit', scenarioName]
 
-    # Return to working directory
-    os.chdir(workDir)
-
     # return local
     return local
 
@@ -439,15 +520,12 @@ def processPowerPlants(inputs, local, outputs):
         tech['LastBuild'] = inputs['PowerPlantsConstraints'].loc[techType, 'LastBuild']
 
         # Existing
-        tech['existing_capacity_year'] = []
-        tech['existing_capacity_rating'] = []
-        for index, row in inputs['PowerPlantsExisting'].iterrows():
-            if row['powerplant'] == techType:
-                tech['existing_capacity_year'].append(row['YearInstalled'])
-                tech['existing_capacity_rating'].append(row['Capacity'])
+        existing = inputs['PowerPlantsExisting'][inputs['PowerPlantsExisting'].powerplant == techType]
+        tech['existing_capacity_year'] = existing.YearInstalled.tolist()
+        tech['existing_capacity_rating'] = existing.Capacity.tolist()
 
         # Update outputs for this technology
-        local, outputs = processTech(inputs, local, outputs, tech)
+        local, outputs = addTech(inputs, local, outputs, tech)
 
         # Add fuel as a commodity
         if not tech['fuel'] in local['commodities']:
@@ -527,15 +605,12 @@ def processFuels(inputs, local, outputs):
         tech['LastBuild'] = inputs['Fuels'].loc[techType, 'LastBuild']
 
         # Existing
-        tech['existing_capacity_year'] = []
-        tech['existing_capacity_rating'] = []
-        for index, row in inputs['FuelsExisting'].iterrows():
-            if row['fuel'] == techType:
-                tech['existing_capacity_year'].append(row['YearInstalled'])
-                tech['existing_capacity_rating'].append(row['Capacity'])
+        existing = inputs['FuelsExisting'][inputs['FuelsExisting'].fuel == techType]
+        tech['existing_capacity_year'] = existing.YearInstalled.tolist()
+        tech['existing_capacity_rating'] = existing.Capacity.tolist()
 
         # Update outputs for this technology
-        local, outputs = processTech(inputs, local, outputs, tech)
+        local, outputs = addTech(inputs, local, outputs, tech)
 
         # Fuel Specific Tasks
         # Add fuel as a commodity (if not previously added)
@@ -601,15 +676,12 @@ def processConnections(inputs, local, outputs):
         tech['LastBuild'] = inputs['Connections'].loc[techType, 'LastBuild']
 
         # Existing
-        tech['existing_capacity_year'] = []
-        tech['existing_capacity_rating'] = []
-        for index, row in inputs['ConnectionsExisting'].iterrows():
-            if row['connection'] == techType:
-                tech['existing_capacity_year'].append(row['YearInstalled'])
-                tech['existing_capacity_rating'].append(row['Capacity'])
+        existing = inputs['ConnectionsExisting'][inputs['ConnectionsExisting'].connection == techType]
+        tech['existing_capacity_year'] = existing.YearInstalled.tolist()
+        tech['existing_capacity_rating'] = existing.Capacity.tolist()
 
         # Update outputs for this technology
-        local, outputs = processTech(inputs, local, outputs, tech)
+        local, outputs = addTech(inputs, local, outputs, tech)
 
         # Connection Specific Tasks
         # Add fuel as a commodity
@@ -631,6 +703,64 @@ def goodValue(value):
     return (not value is None) and (not str(value) == 'nan')
 
 
+# =============================================================================
+# Add a technology to outputs, reusing its base case outputs in incremental builds if its inputs are unchanged
+# =============================================================================
+# Entries of local used by processTech
+techLocals = ['active_future_periods', 'MaxLoan_yrs', 'include_baseload', 'include_reserve_margin', 'include_ramping',
+              'include_growth_limit', 'include_RPS', 'include_min_capacity_limit', 'MaxGrowthRate', 'MinGrowthSeed']
+
+
+def addTech(inputs, local, outputs, tech):
+    # Not an incremental build
+    if 'tech_outputs' not in local:
+        return processTech(inputs, local, outputs, tech)
+
+    key = repr((sorted(tech.items()), [local[entry] for entry in techLocals]))
+    if key in local['tech_outputs']:
+        tech_outputs, new_years = local['tech_outputs'][key]
+    else:
+        # Process the technology on its own, existing years it adds to time_periods are kept in allTimePeriods
+        tech_local = {entry: local[entry] for entry in techLocals}
+        tech_local['allTimePeriods'] = copy.copy(local['future_periods'])
+        tech_local, tech_outputs = processTech(inputs, tech_local, getEmptyTemoaDict(), tech)
+        new_years = tech_local['allTimePeriods'][len(local['future_periods']):]
+        # Only the outputs of the base case are kept (see getBaseTechOutputs)
+        if local.get('cache_tech_outputs', False):
+            local['tech_outputs'][key] = (tech_outputs, new_years)
+
+    # Existing years are only added to time_periods the first time they appear in the model
+    for year, row in zip(new_years, tech_outputs['time_periods']):
+        if year not in local['allTimePeriods']:
+            local['allTimePeriods'].append(year)
+            outputs['time_periods'].append(row)
+    for table, numEntries in temoaTables:
+        if not table == 'time_periods':
+            outputs[table].extend(tech_outputs[table])
+
+    return local, outputs
+
+
+# =============================================================================
+# Values that increase at a constant yearly % rate from start_year (one per year)
+# =============================================================================
+def escalate(value, incr, years, start_year):
+    if not goodValue(incr):
+        return [value] * len(years)
+    N = np.array(years, dtype='float64') - start_year
+    return (value * np.exp(N * incr / 100.0)).tolist()
+
+
+# =============================================================================
+# Indices of (period, vintage) pairs where the vintage is active, ordered by period then vintage
+# =============================================================================
+def activeVintages(periods, vintages, lifetime):
+    period = np.array(periods, dtype='float64')[:, np.newaxis]
+    vintage = np.array(vintages, dtype='float64')[np.newaxis, :]
+    active = (vintage <= period) & ((period - vintage) < lifetime)
+    return np.nonzero(active)
+
+
 # =============================================================================
 # Process Technologies
 # =============================================================================
@@ -693,13 +823,10 @@ def processTech(inputs, local, outputs, tech):
             start_year = tech['FirstBuild']
         else:
             start_year = local['active_future_periods'][0]
-        for year in local['active_future_periods']:
-            if goodValue(tech['CapacityCreditIncr']):
-                N = float(year - start_year)
-                capacity_credit = tech['CapacityCredit'] * np.exp(N * tech['CapacityCreditIncr'] / 100.0)
-            else:
-                capacity_credit = tech['CapacityCredit']
-            outputs['CapacityCredit'].append((str(year), tech['name'], capacity_credit))
+        capacity_credit = escalate(tech['CapacityCredit'], tech['CapacityCreditIncr'], local['active_future_periods'],
+                                   start_year)
+        outputs['CapacityCredit'].extend(
+            [(str(year), tech['name'], value) for year, value in zip(local['active_future_periods'], capacity_credit)])
 
     # CapacityToActivity
     if tech['c2a'] == 'Y':
@@ -708,35 +835,37 @@ def processTech(inputs, local, outputs, tech):
     # CapacityFactorTech
     if tech['sector'] == 'electric':  # Only apply to powerplant technologies
 
+        # select entries that use this fuel
+        df = inputs['capacityFactorTOD'][inputs['capacityFactorTOD'].fuel == tech['fuel']]
+
         # Constant capacity factor
-        if not tech['fuel'] in list(inputs['capacityFactorTOD'].fuel):
-            for representativeDay in inputs['representativeDays'].representativeDay:
-                for timeOfDay in inputs['timesOfDay'].timeOfDay:
-                    outputs['CapacityFactorTech'].append(
-                        (representativeDay, timeOfDay, tech['name'], tech['capacity_factor'], " "))
+        if len(df) == 0:
+            outputs['CapacityFactorTech'].extend(
+                [(representativeDay, timeOfDay, tech['name'], tech['capacity_factor'], " ")
+                 for representativeDay in inputs['representativeDays'].representativeDay
+                 for timeOfDay in inputs['timesOfDay'].timeOfDay])
         # Capacity factor that varies with timeOfday and representativeDay
         else:
-            # select entries that use this fuel
-            df = inputs['capacityFactorTOD'][inputs['capacityFactorTOD'].fuel == tech['fuel']]
-            # calculate current annual capacity factor
+            # calculate current annual capacity factor, days without entries are nan
+            day_mean = {day: cf.mean() for day, cf in df.groupby('representativeDay', sort=False).capacityFactor}
             cf_current = 0.0
             for day, time_frac in zip(inputs['representativeDays'].representativeDay,
                                       inputs['representativeDays'].timeFrac):
-                cf_current = cf_current + time_frac * df[df.representativeDay == day].capacityFactor.mean() / 100.0
-            for index, row in inputs['capacityFactorTOD'].iterrows():
-                if row['fuel'] == tech['fuel']:
-                    value = (row['capacityFactor'] / 100.0) * tech['capacity_factor'] / cf_current
-                    # enforce that value is between 0 and 1
-                    if value < 0.0:
-                        value = 0.0
-                        print('Warning: Capacity factor less than 0.0, set to 0.0: ' + tech['name'] + ' '
-                              + row['representativeDay'] + ' ' + row['timeOfDay'])
-                    elif value > 1.0:
-                        value = 1.0
-                        print('Warning: Capacity factor greater than 1.0, set to 1.0: ' + tech['name'] + ' '
-                              + row['representativeDay'] + ' ' + row['timeOfDay'])
-                    outputs['CapacityFactorTech'].append((row['representativeDay'], row['timeOfDay'], tech['name'],
-                                                          value, " "))
+                cf_current = cf_current + time_frac * day_mean.get(day, np.nan) / 100.0
+            # scale each entry to the capacity factor of the technology
+            values = (df.capacityFactor.values / 100.0) * tech['capacity_factor'] / cf_current
+            # enforce that value is between 0 and 1
+            for i in np.nonzero((values < 0.0) | (values > 1.0))[0]:
+                if values[i] < 0.0:
+                    print('Warning: Capacity factor less than 0.0, set to 0.0: ' + tech['name'] + ' '
+                          + df.representativeDay.iloc[i] + ' ' + df.timeOfDay.iloc[i])
+                else:
+                    print('Warning: Capacity factor greater than 1.0, set to 1.0: ' + tech['name'] + ' '
+                          + df.representativeDay.iloc[i] + ' ' + df.timeOfDay.iloc[i])
+            values = np.clip(values, 0.0, 1.0)
+            outputs['CapacityFactorTech'].extend(
+                [(representativeDay, timeOfDay, tech['name'], value, " ")
+                 for representativeDay, timeOfDay, value in zip(df.representativeDay, df.timeOfDay, values.tolist())])
 
     # CostFixed
     if goodValue(tech['cost_fixed']):
@@ -744,16 +873,10 @@ def processTech(inputs, local, outputs, tech):
             start_year = tech['FirstBuild']
         else:
             start_year = local['active_future_periods'][0]
-        for period in local['active_future_periods']:
-            for vintage in buildYears:
-                if (vintage <= period) and ((period - vintage) < tech['lifetime']):
-                    if goodValue(tech['CostFixedIncr']):
-                        N = float(period - start_year)
-                        costFixed = tech['cost_fixed'] * np.exp(N * tech['CostFixedIncr'] / 100.0)
-                    else:
-                        costFixed = tech['cost_fixed']
-                    outputs['CostFixed'].append(
-                        (str(period), tech['name'], str(vintage), costFixed, "M USD/GW", " "))
+        costFixed = escalate(tech['cost_fixed'], tech['CostFixedIncr'], local['active_future_periods'], start_year)
+        outputs['CostFixed'].extend(
+            [(str(local['active_future_periods'][p]), tech['name'], str(buildYears[v]), costFixed[p], "M USD/GW", " ")
+             for p, v in zip(*activeVintages(local['active_future_periods'], buildYears, tech['lifetime']))])
 
     # CostInvest
     if goodValue(tech['cost_invest']):
@@ -761,13 +884,9 @@ def processTech(inputs, local, outputs, tech):
             start_year = tech['FirstBuild']
         else:
             start_year = local['active_future_periods'][0]
-        for year in futureBuildYears:
-            if goodValue(tech['CostInvestIncr']):
-                N = float(year - start_year)
-                costInvest = tech['cost_invest'] * np.exp(N * tech['CostInvestIncr'] / 100.0)
-            else:
-                costInvest = tech['cost_invest']
-            outputs['CostInvest'].append((tech['name'], str(year), costInvest, "M USD/GW", " "))
+        costInvest = escalate(tech['cost_invest'], tech['CostInvestIncr'], futureBuildYears, start_year)
+        outputs['CostInvest'].extend(
+            [(tech['name'], str(year), value, "M USD/GW", " ") for year, value in zip(futureBuildYears, costInvest)])
 
     # CostVariable
     if goodValue(tech['cost_variable']):
@@ -775,16 +894,11 @@ def processTech(inputs, local, outputs, tech):
             start_year = tech['FirstBuild']
         else:
             start_year = local['active_future_periods'][0]
-        for period in local['active_future_periods']:
-            for vintage in buildYears:
-                if (vintage <= period) and ((period - vintage) < tech['lifetime']):
-                    if goodValue(tech['CostVariableIncr']):
-                        N = float(period - start_year)
-                        costVar = tech['cost_variable'] * np.exp(N * tech['CostVariableIncr'] / 100.0)
-                    else:
-                        costVar = tech['cost_variable']
-                    outputs['CostVariable'].append(
-                        (str(period), tech['name'], str(vintage), costVar, "M USD/PJ", " "))
+        costVar = escalate(tech['cost_variable'], tech['CostVariableIncr'], local['active_future_periods'],
+                           start_year)
+        outputs['CostVariable'].extend(
+            [(str(local['active_future_periods'][p]), tech['name'], str(buildYears[v]), costVar[p], "M USD/PJ", " ")
+             for p, v in zip(*activeVintages(local['active_future_periods'], buildYears, tech['lifetime']))])
 
     # Discount Rate Tech
     if goodValue(tech['DiscountRate']):
@@ -946,8 +1060,8 @@ def createSensitivityCases(scenarioXLSX, scenarioName, sensitivityInputs, multip
     # Process sensitivityInputs
     # ----------
 
-    # Move to directory with inputs
-    os.chdir(data_path)
+    sensitivityInputs = os.path.join(data_path, sensitivityInputs)
+
     # Globals
     df = pd.read_excel(sensitivityInputs, sheet_name='Globals')
     ind = df.loc[:, 'include'] == 'Y'
@@ -968,8 +1082,6 @@ def createSensitivityCases(scenarioXLSX, scenarioName, sensitivityInputs, multip
     ind = df.loc[:, 'include'] == 'Y'
     params['conn_vars'] = df.variable[ind]
 
-    # Return to original directory
-    os.chdir('..')
     # ----------
     # Create sensitivity cases
     # ----------
@@ -1049,8 +1161,7 @@ def createMonteCarloCases(scenarioXLSX, scenarioName, sensitivityInputs, multipl
     # ----------
     # Process sensitivityInputs
     # ----------
-    # Move to directory with inputs
-    os.chdir(data_path)
+    sensitivityInputs = os.path.join(data_path, sensitivityInputs)
 
     # Globals
     df = pd.read_excel(sensitivityInputs, sheet_name='Globals')
@@ -1072,8 +1183,6 @@ def createMonteCarloCases(scenarioXLSX, scenarioName, sensitivityInputs, multipl
     ind = df.loc[:, 'include'] == 'Y'
     params['conn_vars'] = df.variable[ind]
 
-    # Return to original directory
-    os.chdir('..')
     # ----------
     # Create sensitivity cases
     # ----------
@@ -1,15 +1,26 @@
 import os
+import sys
+import time
+import subprocess
 import shutil
+import importlib
 import temoatools as tt
 from pathlib import Path
 
+# Temoa model modules that have already been imported, keyed by temoa_path
+temoa_modules = {}
+
 
 # ============================================================================#
 # Run Temoa Model using a config File
 # ============================================================================#
-def run(model_filename, temoa_path=os.path.normcase('C:/temoa/temoa'), saveEXCEL=False, debug=False, solver=''):
-    # Keep track of main(working) directory
-    workDir = os.getcwd()
+def run(model_filename, temoa_path=os.path.normcase('C:/temoa/temoa'), saveEXCEL=False, debug=False, solver='',
+        path=os.path.normcase('.')):
+    # Temoa runs in a new python process whose working directory is configs/ (the working directory of the
+    # calling process is left unchanged, so that several cases can be run at once)
+
+    # Project directory, holds databases/ and configs/
+    workDir = os.path.abspath(path)
 
     # Model Directory
     model_directory = os.path.join(workDir, "databases")
@@ -20,10 +31,10 @@ def run(model_filename, temoa_path=os.path.normcase('C:/temoa/temoa'), saveEXCEL
         os.stat(configDir)
     except:
         os.mkdir(configDir)
-    os.chdir(configDir)
 
     # Create configuration file
-    config_file = CreateConfigFile(model_directory, model_filename, saveEXCEL=saveEXCEL, debug=debug, solver=solver)
+    config_file = CreateConfigFile(model_directory, model_filename, saveEXCEL=saveEXCEL, debug=debug, solver=solver,
+                                   config_directory=configDir)
 
     if debug:
         print("config_file: " + config_file)
@@ -39,7 +50,7 @@ def run(model_filename, temoa_path=os.path.normcase('C:/temoa/temoa'), saveEXCEL
     if debug:
         print(command)
     try:
-        os.system(command)
+        subprocess.call(command, shell=True, cwd=configDir)
     except:
         print(command)
         error = True
@@ -59,26 +70,143 @@ def run(model_filename, temoa_path=os.path.normcase('C:/temoa/temoa'), saveEXCEL
     #     os.chdir('db_io\\' + model_filename + '_solve_model')
     #     shutil.move('solve.xls', model_directory + '\\' + model_filename + '.xls')
 
-    # Return to working directory
-    os.chdir(workDir)
-
     return error
 
 
+# ============================================================================#
+# Run Temoa Model within the current Python process
+# ============================================================================#
+def run_in_process(model_filename, temoa_path=os.path.normcase('C:/temoa/temoa'), saveEXCEL=False, debug=False,
+                   solver='', path=os.path.normcase('.')):
+    #    inputs:
+    #    1) model_filename  - name of database in databases/ to solve, results are written back to it
+    #    2) temoa_path      - path to temoa directory that contains temoa_model/
+    #    3) saveEXCEL       - True or False, default is False
+    #    4) debug           - True or False, prints Temoa progress messages
+    #    5) solver          - leave as '' to use system default, other options include 'cplex', 'gurobi'
+    #    6) path            - project directory that contains databases/, configs/ is created within it
+    #                         (along with configs/<model_filename>_logs for the Temoa log and LP files)
+    #
+    #    outputs:
+    #    1) result          - dictionary holding the model_filename, status ('optimal', 'infeasible', ... or
+    #                         'error'), objective (total system cost), timings (seconds) and message
+    # ==============================================================================
+    t0 = time.time()
+    result = {'model_filename': model_filename, 'status': 'error', 'objective': None, 'timings': {},
+              'message': ''}
+
+    # Project directory, holds databases/ and configs/
+    workDir = os.path.abspath(path)
+
+    # Model Directory
+    model_directory = os.path.join(workDir, "databases")
+
+    # Directory to hold configuration files
+    configDir = os.path.join(workDir, "configs")
+    try:
+        os.stat(configDir)
+    except:
+        os.mkdir(configDir)
+
+    try:
+        # Import Temoa, only performed on the first run in this process
+        temoa = load_temoa(temoa_path)
+        t1 = time.time()
+        result['timings']['import'] = t1 - t0
+
+        # Create configuration file
+        config_file = CreateConfigFile(model_directory, model_filename, saveEXCEL=saveEXCEL, debug=debug,
+                                       solver=solver, config_directory=configDir)
+        config_path_full = os.path.join(configDir, config_file)
+
+        # Read configuration file and convert database to a .dat file
+        temoa_solver = temoa.TemoaSolver(temoa.model, config_path_full)
+        options = temoa_solver.options
+        try:
+            txt_file = open(os.path.join(options.path_to_logs, "Complete_OutputLog.log"), "w")
+        except:
+            txt_file = open(os.path.join(configDir, "Complete_OutputLog.log"), "w")
+        instance = temoa.TemoaSolverInstance(temoa.model, temoa_solver.optimizer, options, txt_file)
+        t2 = time.time()
+        result['timings']['setup'] = t2 - t1
+
+        # Create model instance from the abstract model
+        for k in instance.create_temoa_instance():
+            if debug:
+                print(k)
+        t3 = time.time()
+        result['timings']['create_instance'] = t3 - t2
+
+        # Solve and write results to the database
+        for k in instance.solve_temoa_instance():
+            if debug:
+                print(k)
+        t4 = time.time()
+        result['timings']['solve'] = t4 - t3
+        txt_file.close()
+
+        # Store solution status
+        if hasattr(instance, 'result'):
+            result['status'] = str(instance.result.solver.termination_condition)
+            if result['status'] == 'optimal':
+                from pyomo.environ import value
+                result['objective'] = value(instance.instance.TotalCost)
+        else:
+            result['status'] = 'not solved'
+            result['message'] = 'no available solver'
+
+    except Exception as e:
+        result['status'] = 'error'
+        result['message'] = str(e)
+        if debug:
+            print(model_filename + ': ' + str(e))
+
+    result['timings']['total'] = time.time() - t0
+    return result
+
+
+# ============================================================================#
+# Import Temoa Model (once per process)
+# ============================================================================#
+def load_temoa(temoa_path):
+    temoa_path = os.path.abspath(temoa_path)
+    if temoa_path not in temoa_modules:
+        # temoa_model uses module level imports (e.g. from temoa_rules import *)
+        if len(temoa_modules) > 0:
+            raise Exception('Temoa already imported from ' + list(temoa_modules.keys())[0] +
+                            ', only one temoa_path can be used per process')
+        model_path = os.path.join(temoa_path, 'temoa_model')
+        if model_path not in sys.path:
+            sys.path.insert(0, model_path)
+        temoa_modules[temoa_path] = importlib.import_module('temoa_model')
+    return temoa_modules[temoa_path]
+
+
 # ============================================================================#
 # Create Config File
 # ============================================================================#
 def CreateConfigFile(model_directory, model_filename, saveEXCEL=False, saveTEXTFILE=False, keep_pyomo_lp_file=False,
-                     debug=False, solver=''):
+                     debug=False, solver='', config_directory=os.path.normcase('.'), logs_directory=None):
     # Locate Database
     full_filename = tt.remove_ext(model_filename) + '.sqlite'
     dBpath = os.path.join(model_directory, full_filename)
 
+    # Directory for the Temoa log and LP files of this case, by default configs/<model_filename>_logs, so that
+    # cases run at the same time do not overwrite (or delete) each other's files
+    if logs_directory is None:
+        logs_directory = os.path.join(config_directory, tt.remove_ext(model_filename) + '_logs')
+    logs_directory = os.path.abspath(logs_directory)
+    for directory in [logs_directory, os.path.join(logs_directory, 'lp_files')]:
+        try:
+            os.stat(directory)
+        except:
+            os.mkdir(directory)
+
     # Write Config File
     config_file = "config_" + tt.remove_ext(model_filename) + ".txt"
     if debug == True:
         print("config_file: " + str(config_file))
-    f = open(config_file, "w")
+    f = open(os.path.join(config_directory, config_file), "w")
     # ---
     f.write("#-----------------------------------------------------\n")
     f.write("# This is an automatically generated configuration file for Temoa using")
@@ -105,6 +233,10 @@ def CreateConfigFile(model_directory, model_filename, saveEXCEL=False, saveTEXTF
     f.write("# This is the location where database files reside\n")
     f.write("--path_to_db_io=" + model_directory + "\n")
     f.write("\n")
+    f.write("# Path to the debug logs folder (Optional)\n")
+    f.write("# Log and LP files of this run are written here\n")
+    f.write("--path_to_logs=" + logs_directory + "\n")
+    f.write("\n")
     f.write("# Spreadsheet Output (Optional)\n")
     f.write("# Direct model output to a spreadsheet\n")
     f.write("# Scenario name specified above is used to name the spreadsheet\n")
@@ -0,0 +1,178 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import temoatools as tt
+from temoatools.analyze_activity_tod import SingleDB as activity_tod_db
+from temoatools.analyze_activity_year import SingleDB as activity_year_db
+from temoatools.analyze_capacity import SingleDB as capacity_db
+from temoatools.analyze_capacity_new import SingleDB as capacity_new_db
+
+schema = """
+CREATE TABLE technologies (tech text primary key, flag text, sector text, tech_desc text, tech_category text);
+CREATE TABLE time_periods (t_periods integer primary key, flag text);
+CREATE TABLE time_season (t_season text primary key);
+CREATE TABLE time_of_day (t_day text primary key);
+CREATE TABLE Efficiency (input_comm text, tech text, vintage integer, output_comm text, efficiency real,
+                         eff_notes text);
+CREATE TABLE Output_VFlow_Out (scenario text, sector text, t_periods integer, t_season text, t_day text,
+                               input_comm text, tech text, vintage integer, output_comm text, vflow_out real);
+CREATE TABLE Output_CapacityByPeriodAndTech (scenario text, sector text, t_periods integer, tech text,
+                                             capacity real);
+CREATE TABLE Output_V_Capacity (scenario text, sector text, tech text, vintage integer, capacity real);
+CREATE TABLE Output_Objective (scenario text, objective_name text, total_system_cost real);
+"""
+
+# Technologies (sector, fuels in Efficiency order): the fuel of a technology is the input_comm of its first row
+techs = [('EC_NG', 'electric', ['GAS']), ('EC_COAL', 'electric', ['COAL', 'GAS']), ('EC_SOLPV', 'electric', ['SOL']),
+         ('EC_NG_CC', 'electric', ['GAS']), ('T_ELC', 'transmission', ['ELC']), ('IMP_GAS', 'supply', ['ethos'])]
+existing = [2000, 2010]
+periods = [2020, 2030, 2040, 2050]  # the last future period only marks the end of the horizon
+seasons = ['summer', 'winter']
+tods = ['day', 'night']
+scenarios = ['solve', 'WA_0.S0s1', 'WA_0.S1s0']
+
+
+def create_db(path):
+    # Random results, with several rows summed into most cells of the analyses
+    rng = np.random.RandomState(1)
+    con = sqlite3.connect(path)
+    con.executescript(schema)
+    con.executemany("INSERT INTO technologies VALUES(?, ?, ?, ?, ?)",
+                    [(t, 'p', sector, '', '') for t, sector, fuels in techs])
+    con.executemany("INSERT INTO time_periods VALUES(?, ?)",
+                    [(p, 'e') for p in existing] + [(p, 'f') for p in periods])
+    con.executemany("INSERT INTO time_season VALUES(?)", [(s,) for s in seasons])
+    con.executemany("INSERT INTO time_of_day VALUES(?)", [(d,) for d in tods])
+    con.executemany("INSERT INTO Efficiency VALUES(?, ?, ?, ?, ?, ?)",
+                    [(f, t, v, 'ELC', 0.5, '') for t, sector, fuels in techs for f in fuels for v in [2000, 2020]])
+    con.executemany("INSERT INTO Output_Objective VALUES(?, ?, ?)",
+                    [(s, 'TotalCost', rng.uniform(100.0, 200.0)) for s in scenarios])
+
+    vflow, capacity, v_capacity = [], [], []
+    for s in scenarios:
+        for t, sector, fuels in techs:
+            if rng.uniform() < 0.2:
+                continue  # technology without results in this scenario
+            vintages = [v for v in existing + periods[:-1] if rng.uniform() < 0.6]
+            for v in vintages:
+                v_capacity.append((s, sector, t, v, rng.uniform(0.0, 10.0)))
+                for p in periods[:-1]:
+                    if p >= v:
+                        capacity.append((s, sector, p, t, rng.uniform(0.0, 10.0)))
+                        for season in seasons:
+                            for tod in tods:
+                                vflow.append((s, sector, p, season, tod, fuels[-1], t, v, 'ELC',
+                                              rng.uniform(0.0, 5.0)))
+    con.executemany("INSERT INTO Output_VFlow_Out VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", vflow)
+    con.executemany("INSERT INTO Output_CapacityByPeriodAndTech VALUES(?, ?, ?, ?, ?)", capacity)
+    con.executemany("INSERT INTO Output_V_Capacity VALUES(?, ?, ?, ?, ?)", v_capacity)
+    con.commit()
+    con.close()
+
+
+def old_single_db(folder, db, table, switch, sector_name, keys, conversion=1.0):
+    # Row by row sums of the SingleDB functions before aggregate_outputs, keys are 'year' (a column per future period,
+    # the last one excluded), 'tod' (rows per year, season and time of day) or 'vintage' (as 'year', plus 'Initial')
+    con = sqlite3.connect(os.path.join(folder, db))
+    cur = con.cursor()
+    future_t_periods = sorted(set(p for p, flag in cur.execute("SELECT * FROM time_periods") if flag == 'f'))
+    sector_techs = []
+    for tech, flag, sector, tech_desc, tech_category in cur.execute("SELECT * FROM technologies"):
+        if (sector == sector_name or sector_name == "all") and tech not in sector_techs:
+            sector_techs.append(tech)
+    d = {}
+    for input_comm, tech, vintage, output_comm, efficiency, ef_notes in cur.execute("SELECT * FROM Efficiency"):
+        if tech in sector_techs and tech not in d.keys():
+            d[tech] = input_comm
+    cols = sorted(set(d.values())) if switch == 'fuel' else sorted(sector_techs)
+    db_scenarios = []
+    for scenario, objective_name, total_system_cost in cur.execute("SELECT * FROM Output_Objective"):
+        if scenario not in db_scenarios:
+            db_scenarios.append(scenario)
+
+    if keys == 'tod':
+        index = pd.MultiIndex.from_product([[db], db_scenarios, cols, future_t_periods[:-1], seasons, tods],
+                                           names=['database', 'scenario', 'fuelOrTech', 'year', 'season', 'tod'])
+        df = pd.DataFrame(index=index, columns=['value'], dtype='float64').fillna(0.0)
+    else:
+        columns = future_t_periods[:-1] + (['Initial'] if keys == 'vintage' else [])
+        index = pd.MultiIndex.from_product([[db], db_scenarios, cols], names=['database', 'scenario', 'fuelOrTech'])
+        df = pd.DataFrame(index=index, columns=columns, dtype='float64').fillna(0.0)
+
+    for row in cur.execute("SELECT * FROM " + table).fetchall():
+        if table == 'Output_VFlow_Out':
+            scenario, sector, t_periods, t_season, t_day, input_comm, tech, vintage, output_comm, value = row
+        elif table == 'Output_CapacityByPeriodAndTech':
+            scenario, sector, t_periods, tech, value = row
+        else:
+            scenario, sector, tech, vintage, value = row
+            t_periods = vintage if vintage in future_t_periods else 'Initial'
+        if sector == sector_name or sector_name == "all":
+            key = d[tech] if switch == 'fuel' else tech
+            if keys == 'tod':
+                loc = ((db, scenario, key, t_periods, t_season, t_day), 'value')
+            else:
+                loc = ((db, scenario, key), t_periods)
+            df.loc[loc] = df.loc[loc] + value * conversion
+    con.close()
+    return df
+
+
+class TestAggregateOutputs(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.db = 'WA_0.sqlite'
+        create_db(os.path.join(self.folder, self.db))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def check(self, df, expected):
+        pd.testing.assert_index_equal(df.index, expected.index)
+        pd.testing.assert_index_equal(df.columns, expected.columns)
+        np.testing.assert_allclose(df.values, expected.values, rtol=1e-12, atol=1e-12)
+
+    def test_single_db(self):
+        # SingleDB functions match the row by row sums they replaced
+        for switch in ['fuel', 'tech']:
+            for sector_name in ['electric', 'all']:
+                conversion = 277.777778
+                self.check(activity_year_db(self.folder, self.db, switch=switch, sector_name=sector_name),
+                           old_single_db(self.folder, self.db, 'Output_VFlow_Out', switch, sector_name, 'year',
+                                         conversion))
+                self.check(activity_tod_db(self.folder, self.db, switch=switch, sector_name=sector_name),
+                           old_single_db(self.folder, self.db, 'Output_VFlow_Out', switch, sector_name, 'tod',
+                                         conversion))
+                self.check(capacity_db(self.folder, self.db, switch=switch, sector_name=sector_name),
+                           old_single_db(self.folder, self.db, 'Output_CapacityByPeriodAndTech', switch, sector_name,
+                                         'year'))
+                self.check(capacity_new_db(self.folder, self.db, switch=switch, sector_name=sector_name),
+                           old_single_db(self.folder, self.db, 'Output_V_Capacity', switch, sector_name, 'vintage'))
+
+    def test_fuel(self):
+        # Sums by fuel through the fuel of read_metadata match the sums joined with Efficiency in SQL
+        context = tt.open_db(self.folder, self.db)
+        fuel = tt.read_metadata(context)['fuel']
+        self.assertEqual(fuel['EC_COAL'], 'COAL')
+        for sector_name in ['electric', 'all']:
+            joined = tt.aggregate_outputs(context['con'], 'Output_VFlow_Out', 'vflow_out', ['o.t_periods'], ['year'],
+                                          sector_name=sector_name)
+            mapped = tt.aggregate_outputs(context['con'], 'Output_VFlow_Out', 'vflow_out', ['o.t_periods'], ['year'],
+                                          sector_name=sector_name, fuel=fuel)
+            keys = ['scenario', 'fuelOrTech', 'year']
+            joined = joined.set_index(keys).sort_index()
+            mapped = mapped.set_index(keys).sort_index()
+            pd.testing.assert_index_equal(joined.index, mapped.index)
+            np.testing.assert_allclose(joined['value'].values, mapped['value'].values, rtol=1e-12)
+        tt.close_db(context)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+import numpy as np
+
+import temoatools as tt
+from temoatools import fragility_curves
+
+# Probability of failure of every curve at 40, 80, 120, 160 and 200 mph, from the if/elif implementation of
+# fragility() that the registry replaced
+wind_mph = np.array([40.0, 80.0, 120.0, 160.0, 200.0])
+tabulated = {
+    'cecbh_destr': [0, 0, 0, 0, 0],
+    'cecbh_moderate': [0.004006206002, 0.06635276042, 0.8640551557, 0.9929261918, 1],
+    'cecbh_severe': [0.002324501902, 0.005130605496, 0.005791981158, 0.008769636116, 1],
+    'cecbl_destr': [0, 0, 0, 0, 0],
+    'cecbl_moderate': [0.005172068045, 0.008095898592, 0.171424512, 0.8465412944, 1],
+    'cecbl_severe': [0.00289973665, 0.005738064, 0.03223317174, 0.5169517515, 1],
+    'cecbm_destr': [0, 0, 0, 0, 0],
+    'cecbm_moderate': [0.004866098687, 0.006940661484, 0.4465402109, 0.9708909718, 1],
+    'cecbm_severe': [0, 0, 0, 0.01946794995, 1],
+    'dist_20yr': [0, 0, 0.04117680569, 0.7928940305, 0.9916874933],
+    'dist_40yr': [0, 0.004363316485, 0.1261469435, 0.8171969496, 0.9875494718],
+    'dist_60yr': [0, 0.006613458897, 0.3788260382, 0.8692522074, 0.987730061],
+    'dist_TX': [0.0005387061177, 0.002902042812, 0.01563348217, 0.08421852484, 0.4536903455],
+    'dist_cond_TX': [0.001551338348, 0.05597122327, 0.4559345367, 1, 1],
+    'inf_stiff': [0, 0, 0, 0, 0],
+    'secbh_destr': [0, 0, 0, 0, 0],
+    'secbh_moderate': [0.004710614332, 0.06819989325, 0.8667030155, 0.9908411124, 1],
+    'secbh_severe': [0, 0, 0.006232763059, 0.5509652508, 1],
+    'secbl_destr': [0, 0, 0, 0.03986437675, 0.377028643],
+    'secbl_moderate': [0.005429286186, 0.008502601, 0.1753318475, 0.8537486263, 1],
+    'secbl_severe': [0.003355426177, 0.006150611456, 0.03585715945, 0.5507744028, 1],
+    'secbm_destr': [0, 0, 0, 0.07353172285, 0.639024356],
+    'secbm_moderate': [0.004734070023, 0.006715713322, 0.4523717286, 0.9715137271, 1],
+    'secbm_severe': [0, 0, 0, 0.1545608867, 0.837398374],
+    'solar_res': [0, 0, 0.3135047314, 0.932960894, 1],
+    'solar_utility': [0, 0, 0, 0.525139665, 1],
+    'sub_HAZUS_severe_k1': [3.09949674e-20, 3.09457596e-06, 0.03462986752, 0.5402877865, 0.9439452409],
+    'sub_HAZUS_severe_k2': [4.574970931e-30, 4.685965798e-09, 0.006720968372, 0.4396628483, 0.9502950007],
+    'sub_HAZUS_severe_k3': [1.891406824e-28, 4.467500952e-09, 0.003702134408, 0.3090012845, 0.8833298153],
+    'sub_HAZUS_severe_k4': [2.56060663e-27, 3.807033215e-09, 0.002119730865, 0.2147298856, 0.792530482],
+    'sub_HAZUS_severe_k5': [3.277686929e-25, 1.124573379e-08, 0.002302861386, 0.1904148403, 0.7394383195],
+    'sub_MX': [0.01558684346, 0.05389117762, 0.1864454559, 0.7825501865, 1],
+    'trans_TX': [5.62129513e-06, 0.0001579947947, 0.00444067685, 0.1248117758, 1],
+    'trans_UK_base': [0, 0, 0.05294081497, 0.3100872101, 0.6548328793],
+    'trans_UK_robust': [0, 0, 0.01363710575, 0.1348541765, 0.4199798628],
+    'wind_nonyaw': [0, 0, 0.03866285195, 0.88971957, 1],
+    'wind_yaw': [0, 0, 0, 0.01244273145, 0.4903779239],
+}
+
+
+class TestFragilityCurves(unittest.TestCase):
+
+    def test_tabulated(self):
+        self.assertEqual(sorted(fragility_curves._registry), sorted(tabulated))
+        for curve, p_failure in tabulated.items():
+            np.testing.assert_allclose(tt.fragility(wind_mph, curve), p_failure, rtol=1e-9, atol=1e-15,
+                                       err_msg=curve)
+            # Scalar windspeeds return floats
+            self.assertIsInstance(tt.fragility(wind_mph[2], curve), float)
+            self.assertAlmostEqual(tt.fragility(wind_mph[2], curve), p_failure[2], places=9)
+
+    def test_interp_points(self):
+        # Interpolated curves pass through the points of their tables (except steps, where x is repeated)
+        for curve in sorted(tabulated):
+            c = fragility_curves._registry[curve]
+            if isinstance(c, fragility_curves.InterpCurve):
+                step = np.diff(c.x) <= 0
+                points = ~(np.append(step, False) | np.insert(step, 0, False))
+                np.testing.assert_allclose(tt.fragility(c.x[points] / c.factor, curve), c.y[points], rtol=1e-9,
+                                           err_msg=curve)
+
+    def test_unknown_curve(self):
+        np.testing.assert_array_equal(tt.fragility(wind_mph, 'no_such_curve'), np.zeros(len(wind_mph)))
+
+    def test_batch_and_table(self):
+        curves = sorted(tabulated) + ['trans_TX']
+        p_failure = tt.fragility_batch(wind_mph, curves)
+        for row, curve in zip(p_failure, curves):
+            np.testing.assert_allclose(row, tabulated[curve], rtol=1e-9, atol=1e-15, err_msg=curve)
+
+        # Windspeeds on the grid of the lookup table are looked up exactly
+        table = tt.fragility_table(curves, max_mph=250.0, step=0.5)
+        self.assertIs(table, tt.fragility_table(curves, max_mph=250.0, step=0.5))
+        np.testing.assert_allclose(table.lookup(wind_mph), p_failure, rtol=1e-9, atol=1e-15)
+
+        damaged = table.sample(wind_mph, n_samples=2000, seed=1)
+        self.assertEqual(damaged.shape, (2000, len(curves), len(wind_mph)))
+        np.testing.assert_allclose(damaged.mean(axis=0), p_failure, atol=0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
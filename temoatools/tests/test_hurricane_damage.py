@@ -0,0 +1,57 @@
+import itertools
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from temoatools.hurricane_damage import node_cap_reduction
+
+
+def old_node_cap_reduction(df, rates, events, event_years):
+    # Per-technology loop of temoa_stochastic/tools/rewrite_tree_nodes.py, replaced by node_cap_reduction
+    df = df.copy()
+    df.val = 1.0
+    for tech in rates.index:
+        r = 1.0
+        for e, y in zip(reversed(events), reversed(event_years)):
+            r = r * rates.loc[tech, e]
+            df.loc[(df.v <= y) & (df.t == tech), 'val'] = r
+    return df
+
+
+class TestNodeCapReduction(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.types = ['H0', 'H1', 'H2', 'H3']
+        self.techs = ['EX_COAL', 'EC_NG_CC', 'EC_SOLPV', 'EC_WIND', 'EC_BATT']
+        self.rates = pd.DataFrame(rng.uniform(0.5, 1.0, (len(self.techs), len(self.types))), index=self.techs,
+                                  columns=self.types)
+        self.rates['H0'] = 1.0
+        self.years = [2020, 2030, 2040, 2050]
+
+        # CapReduction of a node as written by generate_scenario_tree_JB.py, including a technology without rates
+        rows = [(2050, t, v, 0.0) for t in self.techs + ['EC_HYDRO'] for v in [2000, 2015] + self.years]
+        self.df = pd.DataFrame(rows, columns=['p', 't', 'v', 'val'])
+
+    def test_old_loop(self):
+        # Every path of up to three events, repeated events included, and a few paths of four events
+        paths = [list(events) for n in range(4) for events in itertools.product(self.types, repeat=n)]
+        paths += [['H1', 'H2', 'H3', 'H0'], ['H3', 'H3', 'H1', 'H2'], ['H0', 'H0', 'H0', 'H3']]
+        for events in paths:
+            n = len(events)
+            expected = old_node_cap_reduction(self.df, self.rates, events, self.years[:n])
+            df = node_cap_reduction(self.df, self.rates, events, self.years[:n])
+            pd.testing.assert_frame_equal(df, expected, check_exact=False)
+
+    def test_values(self):
+        df = node_cap_reduction(self.df, self.rates, ['H1', 'H2'], [2020, 2030]).set_index(['t', 'v'])['val']
+        wind = self.rates.loc['EC_WIND']
+        self.assertAlmostEqual(df[('EC_WIND', 2015)], wind['H1'] * wind['H2'])
+        self.assertAlmostEqual(df[('EC_WIND', 2030)], wind['H2'])
+        self.assertEqual(df[('EC_WIND', 2040)], 1.0)
+        self.assertEqual(df[('EC_HYDRO', 2000)], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import glob
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import temoatools as tt
+from temoatools import analyze_sql
+
+schema = """
+CREATE TABLE technologies (tech text primary key, flag text, sector text, tech_desc text, tech_category text);
+CREATE TABLE time_periods (t_periods integer primary key, flag text);
+CREATE TABLE Efficiency (input_comm text, tech text, vintage integer, output_comm text, efficiency real,
+                         eff_notes text);
+CREATE TABLE Output_Objective (scenario text, objective_name text, total_system_cost real);
+INSERT INTO technologies VALUES ('EC_NG', 'p', 'electric', '', 'gas');
+INSERT INTO time_periods VALUES (2020, 'f');
+INSERT INTO time_periods VALUES (2030, 'f');
+INSERT INTO Efficiency VALUES ('GAS', 'EC_NG', 2020, 'ELC', 0.5, '');
+INSERT INTO Output_Objective VALUES ('solve', 'TotalCost', 1.0);
+"""
+
+
+class TestMetadataCache(unittest.TestCase):
+
+    def setUp(self):
+        self.wrkdir = tempfile.mkdtemp()
+        self.folder = os.path.join(self.wrkdir, 'results')
+        os.mkdir(self.folder)
+        con = sqlite3.connect(os.path.join(self.folder, 'T_0.sqlite'))
+        con.executescript(schema)
+        con.close()
+        analyze_sql.metadata_cache.clear()
+
+    def tearDown(self):
+        analyze_sql.metadata_dir = None
+        analyze_sql.metadata_cache.clear()
+        shutil.rmtree(self.wrkdir)
+
+    def read(self):
+        context = tt.open_db(self.folder, 'T_0.sqlite')
+        metadata = tt.read_metadata(context)
+        tt.close_db(context)
+        return metadata
+
+    def test_memory_only(self):
+        # By default nothing is written next to the database
+        self.assertEqual(self.read()['fuel'], {'EC_NG': 'GAS'})
+        self.assertEqual(os.listdir(self.folder), ['T_0.sqlite'])
+
+    def test_metadata_dir(self):
+        analyze_sql.metadata_dir = os.path.join(self.wrkdir, 'metadata')
+        metadata = self.read()
+        files = glob.glob(os.path.join(analyze_sql.metadata_dir, '*'))
+        self.assertEqual(len(files), 1)
+        self.assertTrue(os.path.basename(files[0]).startswith('T_0.sqlite.'))
+        self.assertEqual(os.listdir(self.folder), ['T_0.sqlite'])
+
+        # Later processes read the file rather than the database
+        with open(files[0], 'r') as f:
+            cached = json.load(f)
+        cached['metadata']['scenarios'] = ['cached']
+        with open(files[0], 'w') as f:
+            json.dump(cached, f)
+        analyze_sql.metadata_cache.clear()
+        self.assertEqual(self.read()['scenarios'], ['cached'])
+
+        # A truncated file (e.g. read while being written) is rebuilt from the database
+        with open(files[0], 'w') as f:
+            f.write('{"key": ["')
+        analyze_sql.metadata_cache.clear()
+        self.assertEqual(self.read(), metadata)
+        with open(files[0], 'r') as f:
+            self.assertEqual(json.load(f)['metadata'], metadata)
+        self.assertEqual(len(glob.glob(os.path.join(analyze_sql.metadata_dir, '*'))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import temoatools as tt
+
+# More than 10 branches at the first stage, so that node names such as "Rs11s2" have multi-digit branches
+first = np.arange(1.0, 13.0) / np.sum(np.arange(1.0, 13.0))
+second = [0.2, 0.3, 0.5]
+
+
+def write_structure(filename):
+    # ScenarioStructure.dat of the tree, as written by generate_scenario_tree.py
+    nodes = ['R']
+    children = {'R': []}
+    for i in range(len(first)):
+        child = 'Rs' + str(i)
+        nodes.append(child)
+        children['R'].append(child)
+        children[child] = [child + 's' + str(j) for j in range(len(second))]
+        nodes.extend(children[child])
+    leaves = [n for n in nodes if n.count('s') == 2]
+    stage = {0: 's2020', 1: 's2030', 2: 's2040'}
+    prob = {'R': 1.0}
+    for i in range(len(first)):
+        prob['Rs' + str(i)] = first[i]
+        for j in range(len(second)):
+            prob['Rs' + str(i) + 's' + str(j)] = second[j]
+    with open(filename, 'w') as f:
+        f.write('set Stages := s2020 s2030 s2040 ;\n')
+        f.write('set Nodes := ' + ' '.join(nodes) + ' ;\n')
+        f.write('param NodeStage := ' + ' '.join(n + ' ' + stage[n.count('s')] for n in nodes) + ' ;\n')
+        for parent in ['R'] + children['R']:
+            f.write('set Children[' + parent + '] := ' + ' '.join(children[parent]) + ' ;\n')
+        f.write('param ConditionalProbability := ' + ' '.join(n + ' ' + repr(prob[n]) for n in nodes) + ' ;\n')
+        f.write('set Scenarios := ' + ' '.join('S' + n[2:] for n in leaves) + ' ;\n')
+        f.write('param ScenarioLeafNode := ' + ' '.join('S' + n[2:] + ' ' + n for n in leaves) + ' ;\n')
+
+
+class TestScenarioTree(unittest.TestCase):
+
+    def setUp(self):
+        self.wrkdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.wrkdir)
+
+    def check_tree(self, tree):
+        self.assertEqual(len(tree.nodes), 1 + 12 + 36)
+        self.assertEqual(len(tree.leaves), 36)
+        self.assertAlmostEqual(np.sum(tree.prob[tree.leaves]), 1.0)
+
+        self.assertEqual(tree.path('S11s2'), ['R', 'Rs11', 'Rs11s2'])
+        self.assertEqual(tree.path('Rs1s1'), ['R', 'Rs1', 'Rs1s1'])
+        self.assertEqual(tree.branches('Rs11s2'), [11, 2])
+        self.assertAlmostEqual(tree.probability('Rs11'), first[11])
+        self.assertAlmostEqual(tree.probability('WA_0.S11s2'), first[11] * second[2])
+        self.assertAlmostEqual(tree.probability('WA_0.S1s1'), first[1] * second[1])
+
+        prob = tree.scenario_prob(['WA_0.S10s0', 'WA_0.S1s0', 'WA_0.S0s10', 'solve'])
+        np.testing.assert_allclose(prob[:2], [first[10] * second[0], first[1] * second[0]])
+        self.assertTrue(np.all(np.isnan(prob[2:])))
+
+    def test_from_branches(self):
+        self.check_tree(tt.ScenarioTree.from_branches([first, second]))
+
+    def test_from_structure(self):
+        filename = os.path.join(self.wrkdir, 'ScenarioStructure.dat')
+        write_structure(filename)
+        tree = tt.ScenarioTree.from_structure(filename)
+        self.check_tree(tree)
+        self.assertEqual(tree.nodes, tt.ScenarioTree.from_branches([first, second]).nodes)
+
+    def test_save_load(self):
+        filename = os.path.join(self.wrkdir, 'scenario_tree.csv')
+        tt.ScenarioTree.from_branches([first, second]).save(filename)
+        tree = tt.ScenarioTree.load(filename)
+        self.check_tree(tree)
+        np.testing.assert_array_equal(tree.prob, tt.ScenarioTree.from_branches([first, second]).prob)
+
+    def test_scenario_probs(self):
+        # Same branches at every stage, as many stages as the scenario names are deep
+        prob = tt.scenario_probs(['WA_0.S11s2', 'WA_0.S2s11', 'WB_1.S0s1'], {'0': first, '1': second})
+        np.testing.assert_allclose(prob, [first[11] * first[2], first[2] * first[11], second[0] * second[1]])
+
+        tree = tt.ScenarioTree.from_branches([first, second])
+        prob = tt.scenario_probs(['WA_0.S11s2', 'WA_0.S3s0'], {'0': tree})
+        np.testing.assert_allclose(prob, [first[11] * second[2], first[3] * second[0]])
+
+    def test_scenario_probs_cases(self):
+        # More than 10 cases: the case follows the "_" of the database name up to the "."
+        node_prob = dict((str(case), [first, second][case % 2]) for case in range(12))
+        tree = tt.ScenarioTree.from_branches([first, second])
+        node_prob['10'] = tree
+        prob = tt.scenario_probs(['WA_10.S11s2', 'WA_1.S1s1', 'WB_11.S0s1', 'WB_0.S11s0'], node_prob)
+        np.testing.assert_allclose(prob, [first[11] * second[2], second[1] * second[1], second[0] * second[1],
+                                          first[11] * first[0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import temoatools as tt
+from temoatools.analyze_activity_year import SingleDB as activity_db
+from temoatools.analyze_capacity import SingleDB as capacity_db
+from temoatools.analyze_emissions import SingleDB as emissions_db
+
+schema = """
+CREATE TABLE technologies (tech text primary key, flag text, sector text, tech_desc text, tech_category text);
+CREATE TABLE time_periods (t_periods integer primary key, flag text);
+CREATE TABLE Efficiency (input_comm text, tech text, vintage integer, output_comm text, efficiency real,
+                         eff_notes text);
+CREATE TABLE Output_VFlow_Out (scenario text, sector text, t_periods integer, t_season text, t_day text,
+                               input_comm text, tech text, vintage integer, output_comm text, vflow_out real);
+CREATE TABLE Output_CapacityByPeriodAndTech (scenario text, sector text, t_periods integer, tech text,
+                                             capacity real);
+CREATE TABLE Output_Emissions (scenario text, sector text, t_periods integer, emissions_comm text, tech text,
+                               vintage integer, emissions real);
+CREATE TABLE Output_Objective (scenario text, objective_name text, total_system_cost real);
+"""
+
+# Two-stage tree: the root (2020) and one node per scenario (2030)
+tree = tt.ScenarioTree.from_branches([[0.6, 0.4]])
+run = 'WA_0'
+
+
+def flows(scenario, period, gas, coal):
+    return [(scenario, 'electric', period, 'summer', 'day', 'GAS', 'EC_NG', 2020, 'ELC', gas),
+            (scenario, 'electric', period, 'summer', 'day', 'COAL', 'EC_COAL', 2000, 'ELC', coal)]
+
+
+def emissions(scenario, period, co2):
+    return [(scenario, 'electric', period, 'CO2', 'EC_COAL', 2000, co2)]
+
+
+# Rows of each node, a deterministic run (solve) is stored next to the stochastic one
+node_rows = {
+    'Output_VFlow_Out': flows('R', 2020, 1.0, 2.0) + flows('Rs0', 2030, 3.0, 0.5) + flows('Rs1', 2030, 1.5, 2.5),
+    'Output_Emissions': emissions('R', 2020, 10.0) + emissions('Rs0', 2030, 2.0) + emissions('Rs1', 2030, 12.0),
+    'Output_CapacityByPeriodAndTech': [(n, 'electric', p, 'EC_NG', c) for n, c in [('Rs0', 4.0), ('Rs1', 2.0)]
+                                       for p in [2020, 2030]],
+    'Output_Objective': [('Rs0', 'TotalCost', 100.0), ('Rs1', 'TotalCost', 120.0)],
+}
+solve_rows = {
+    'Output_VFlow_Out': flows('solve', 2020, 1.0, 1.0),
+    'Output_Emissions': emissions('solve', 2020, 5.0),
+    'Output_CapacityByPeriodAndTech': [('solve', 'electric', 2020, 'EC_NG', 1.0)],
+    'Output_Objective': [('solve', 'TotalCost', 90.0)],
+}
+
+
+def create_db(path, by_node):
+    # Same results stored by scenario tree node (as by temoa write_ef_results) or by scenario
+    con = sqlite3.connect(path)
+    con.executescript(schema)
+    con.executemany("INSERT INTO technologies VALUES(?, ?, ?, ?, ?)",
+                    [('EC_NG', 'p', 'electric', '', ''), ('EC_COAL', 'p', 'electric', '', '')])
+    con.executemany("INSERT INTO time_periods VALUES(?, ?)", [(2000, 'e'), (2020, 'f'), (2030, 'f'), (2040, 'f')])
+    con.executemany("INSERT INTO Efficiency VALUES(?, ?, ?, ?, ?, ?)",
+                    [('GAS', 'EC_NG', 2020, 'ELC', 0.5, ''), ('COAL', 'EC_COAL', 2000, 'ELC', 0.4, '')])
+    paths = {run + '.' + s: tree.path(s) for s in sorted(tree.scenarios)}
+    for table, rows in node_rows.items():
+        qry = "INSERT INTO " + table + " VALUES(" + ", ".join(["?"] * len(rows[0])) + ")"
+        if by_node:
+            con.executemany(qry, [(run + '.' + row[0],) + row[1:] for row in rows])
+        else:
+            con.executemany(qry, [(s,) + row[1:] for s, path in paths.items() for row in rows if row[0] in path])
+        con.executemany(qry, solve_rows[table])
+    if by_node:
+        con.execute("CREATE TABLE Output_Scenario_Tree (scenario text, node text, stage text, "
+                    "conditional_probability real, probability real)")
+        con.executemany("INSERT INTO Output_Scenario_Tree VALUES(?, ?, ?, ?, ?)",
+                        [(s, run + '.' + n, 's' + str(2020 + 10 * tree.stage[tree.index[n]]),
+                          tree.cond_prob[tree.index[n]], tree.probability(n)) for s, path in paths.items()
+                         for n in path])
+    con.commit()
+    con.close()
+
+
+class TestScenarioTreeOutputs(unittest.TestCase):
+
+    def setUp(self):
+        self.wrkdir = tempfile.mkdtemp()
+        self.folders = {}
+        for layout in ['node', 'scenario']:
+            self.folders[layout] = os.path.join(self.wrkdir, layout)
+            os.mkdir(self.folders[layout])
+            create_db(os.path.join(self.folders[layout], run + '.sqlite'), layout == 'node')
+
+    def tearDown(self):
+        shutil.rmtree(self.wrkdir)
+
+    def test_scenarios(self):
+        context = tt.open_db(self.folders['node'], run + '.sqlite')
+        scenarios = tt.read_metadata(context)['scenarios']
+        tt.close_db(context)
+        self.assertEqual(sorted(scenarios), ['WA_0.S0', 'WA_0.S1', 'solve'])
+
+        prob = tt.scenario_probs(['WA_0.S0', 'WA_0.S1'], {'0': tree})
+        np.testing.assert_allclose(prob, [0.6, 0.4])
+
+    def test_node_rows_expanded(self):
+        # Shared rows of the root are listed for both scenarios, the tables themselves are unchanged
+        context = tt.open_db(self.folders['node'], run + '.sqlite')
+        rows = context['con'].execute("SELECT scenario, vflow_out FROM Output_VFlow_Out WHERE t_periods = 2020 "
+                                      "AND tech = 'EC_NG' ORDER BY scenario").fetchall()
+        stored = context['con'].execute("SELECT COUNT(*) FROM main.Output_VFlow_Out").fetchone()[0]
+        tt.close_db(context)
+        self.assertEqual(rows, [('WA_0.S0', 1.0), ('WA_0.S1', 1.0), ('solve', 1.0)])
+        self.assertEqual(stored, 8)
+
+    def test_analyses(self):
+        # Analyses of results stored by node match those of the same results stored by scenario
+        for analysis in [activity_db, capacity_db]:
+            for switch in ['fuel', 'tech']:
+                node = analysis(self.folders['node'], run + '.sqlite', switch=switch).sort_index()
+                scenario = analysis(self.folders['scenario'], run + '.sqlite', switch=switch).sort_index()
+                pd.testing.assert_frame_equal(node, scenario)
+
+        node = emissions_db(self.folders['node'], run + '.sqlite')
+        scenario = emissions_db(self.folders['scenario'], run + '.sqlite')
+        for df_node, df_scenario in zip(node, scenario):
+            pd.testing.assert_frame_equal(df_node.sort_index(), df_scenario.sort_index())
+        self.assertEqual(node[0].loc[(run + '.sqlite', 'WA_0.S1'), 2030], 12.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
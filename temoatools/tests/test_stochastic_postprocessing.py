@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import temoatools as tt
+from temoatools.stochastic_postprocessing import read_weighted
+
+# Node probabilities by case (0 is simulated, 1 is calculated), as in projects/puerto_rico_stoch
+node_prob = {"0": [0.6, 0.4], "1": [0.2, 0.8]}
+db_shift = {"WA_0": "WA_1", "WB_0": "WB_1"}
+
+
+def results():
+    # Results csv as written by the analyze scripts: databases with their extension, scenarios "<database>.<node>"
+    rows = []
+    for db in ["WA_0", "WB_0", "T_0"]:
+        rows.append([db + ".sqlite", "solve", "GAS", 1.0])
+        for node, value in [("S0", 2.0), ("S1", 3.0)]:
+            rows.append([db + ".sqlite", db + "." + node, "GAS", value])
+    return pd.DataFrame(rows, columns=["database", "scenario", "fuelOrTech", "2020"])
+
+
+class TestStochExpand(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        results().to_csv(os.path.join(self.path, "activity_by_fuel.csv"))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def check_expanded(self, df):
+        df = df.drop(columns=[c for c in df.columns if c.startswith("Unnamed")])
+        original = results()
+        self.assertEqual(len(df), len(original) + 6)
+        pd.testing.assert_frame_equal(df.iloc[:len(original)].reset_index(drop=True), original, check_dtype=False)
+        shifted = df.iloc[len(original):]
+        self.assertEqual(sorted(shifted["database"].unique()), ["WA_1.sqlite", "WB_1.sqlite"])
+        self.assertEqual(sorted(shifted["scenario"]), ["WA_1.S0", "WA_1.S1", "WB_1.S0", "WB_1.S1", "solve", "solve"])
+        np.testing.assert_array_equal(shifted.loc[shifted["scenario"] == "WA_1.S1", "2020"].astype(float), [3.0])
+
+    def test_expand(self):
+        fileout = tt.stoch_expand(self.path, "activity_by_fuel", db_shift, chunksize=4)
+        self.check_expanded(pd.read_csv(fileout))
+
+    def test_expand_view(self):
+        # The mapping table expands to the same rows, "solve" is removed and each scenario weighted by its case
+        tt.stoch_expand(self.path, "activity_by_fuel", db_shift, view=True)
+        df = read_weighted(os.path.join(self.path, "activity_by_fuel_exp"), node_prob)
+        expected = read_weighted(os.path.join(self.path, "activity_by_fuel"), node_prob)
+        self.assertEqual(len(df), len(expected) + 4)
+        prob = df.set_index("scenario")["prob"]
+        self.assertAlmostEqual(prob["WA_0.S1"], 0.4)
+        self.assertAlmostEqual(prob["WA_1.S1"], 0.8)
+        self.assertAlmostEqual(prob["WB_1.S0"], 0.2)
+        self.assertEqual(sorted(df.loc[df["database"] == "WA_1.sqlite", "scenario"]), ["WA_1.S0", "WA_1.S1"])
+
+
+if __name__ == '__main__':
+    unittest.main()
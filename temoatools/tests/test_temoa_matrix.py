@@ -0,0 +1,92 @@
+import os
+import unittest
+from argparse import Namespace
+
+import numpy as np
+
+import temoatools as tt
+
+try:
+    import pyomo.environ as pe
+    from pyomo.repn import generate_standard_repn
+except ImportError:
+    pe = None
+
+temoa_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'temoa-energysystem')
+utopia = os.path.join(temoa_path, 'data_files', 'temoa_utopia.sqlite')
+
+
+def expression_rows(instance):
+    # Rows of every active constraint of instance, read from its Pyomo expression:
+    # name -> (lower, upper, {variable name: coefficient}), rows without coefficients are left out as by TemoaMatrix
+    rows = {}
+    for con in instance.component_data_objects(pe.Constraint, active=True):
+        repn = generate_standard_repn(con.body)
+        coefs = {}
+        for v, coef in zip(repn.linear_vars, repn.linear_coefs):
+            coefs[v.name] = coefs.get(v.name, 0.0) + coef
+        coefs = dict((name, coef) for name, coef in coefs.items() if coef)
+        if coefs:
+            lower = -np.inf if con.lower is None else pe.value(con.lower) - repn.constant
+            upper = np.inf if con.upper is None else pe.value(con.upper) - repn.constant
+            rows[con.name] = (lower, upper, coefs)
+    return rows
+
+
+def matrix_rows(matrix):
+    # Rows of a TemoaMatrix, as in expression_rows
+    rows = dict((name, (matrix.row_lower[i], matrix.row_upper[i], {})) for i, name in enumerate(matrix.row_names))
+    for i, j, coef in zip(matrix.rows, matrix.cols, matrix.vals):
+        rows[matrix.row_names[i]][2][matrix.column_names[j]] = coef
+    return rows
+
+
+@unittest.skipIf(pe is None or not os.path.isfile(utopia), 'requires pyomo and temoa-energysystem')
+class TestTemoaMatrix(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        temoa = tt.temoa_model_run.load_temoa(temoa_path)
+        from temoa_config import db_2_data
+        from temoa_matrix import TemoaMatrix, create_instance
+
+        # Read the database as TemoaSolverInstance does
+        data = pe.DataPortal(model=temoa.model)
+        data._data.setdefault(None, dict()).update(db_2_data(utopia, Namespace(mga_weight=None))[None])
+        cls.instance = temoa.model.create_instance(data)
+        cls.matrix = TemoaMatrix(create_instance(temoa.model, data))
+
+    def test_rows(self):
+        # Rows generated from the sparse dicts match the Pyomo expressions of the full model, up to their sign
+        expected = expression_rows(self.instance)
+        rows = matrix_rows(self.matrix)
+        self.assertEqual(len(rows), len(self.matrix.row_names))
+        self.assertEqual(set(rows), set(expected))
+        for name in expected:
+            lower, upper, coefs = rows[name]
+            lower_ref, upper_ref, coefs_ref = expected[name]
+            self.assertEqual(set(coefs), set(coefs_ref), name)
+            sign = 1.0 if np.sign(coefs[sorted(coefs)[0]]) == np.sign(coefs_ref[sorted(coefs)[0]]) else -1.0
+            if sign < 0:
+                lower, upper = -upper, -lower
+            for col in coefs:
+                self.assertAlmostEqual(sign * coefs[col] / coefs_ref[col], 1.0, places=12, msg=name)
+            self.assertAlmostEqual(lower, lower_ref, places=6, msg=name)
+            self.assertAlmostEqual(upper, upper_ref, places=6, msg=name)
+
+    def test_columns(self):
+        # Same variables and objective as the full model
+        variables = list(self.instance.component_data_objects(pe.Var))
+        self.assertEqual(sorted(self.matrix.column_names), sorted(v.name for v in variables))
+        objective = list(self.instance.component_data_objects(pe.Objective, active=True))[0]
+        repn = generate_standard_repn(objective.expr)
+        coefs = dict((v.name, 0.0) for v in variables)
+        for v, coef in zip(repn.linear_vars, repn.linear_coefs):
+            coefs[v.name] += coef
+        np.testing.assert_allclose(self.matrix.objective, [coefs[name] for name in self.matrix.column_names],
+                                   rtol=1e-12)
+        self.assertAlmostEqual(self.matrix.objective_constant, repn.constant)
+
+
+if __name__ == '__main__':
+    unittest.main()
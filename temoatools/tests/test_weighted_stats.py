@@ -0,0 +1,65 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import temoatools as tt
+
+
+def replicate(values, counts):
+    # Population in which each value appears as many times as its count, as stoch_resample used to build
+    return np.sort(np.repeat(values, counts))
+
+
+class TestWeightedStats(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.values = np.round(rng.normal(10.0, 3.0, 40), 1)  # rounded, so that some values repeat
+        self.counts = rng.randint(1, 50, 40)
+        self.weights = self.counts / float(np.sum(self.counts))
+        self.population = replicate(self.values, self.counts)
+
+    def test_quantile(self):
+        # Inverse of the cdf of the replicated population: the value at position ceil(q * n) of the sorted values
+        q = np.array([0.0, 0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99, 1.0])
+        n = len(self.population)
+        expected = self.population[np.maximum(np.ceil(q * n).astype('int64') - 1, 0)]
+        np.testing.assert_array_equal(tt.weighted_quantile(self.values, self.weights, q), expected)
+        np.testing.assert_array_equal(tt.weighted_quantile(self.values, self.counts, q), expected)
+        self.assertEqual(tt.weighted_quantile(self.values, self.weights, 0.5), expected[4])
+
+    def test_quantile_steps(self):
+        # Quantiles at the cumulative probability of a value are not moved to the next value by rounding
+        values = [3.0, 1.0, 2.0]
+        weights = [0.3, 0.1, 0.6]
+        np.testing.assert_array_equal(tt.weighted_quantile(values, weights, [0.1, 0.1 + 1e-9, 0.7, 0.71, 1.0]),
+                                      [1.0, 2.0, 2.0, 3.0, 3.0])
+
+    def test_cdf(self):
+        cdf = tt.weighted_cdf(self.values, self.weights)
+        unique = np.unique(self.population)
+        np.testing.assert_array_equal(cdf['value'].values, unique)
+        expected = np.searchsorted(self.population, unique, side='right') / float(len(self.population))
+        np.testing.assert_allclose(cdf['cdf'].values, expected, rtol=1e-12)
+        self.assertAlmostEqual(cdf['cdf'].values[-1], 1.0)
+
+    def test_moments(self):
+        self.assertAlmostEqual(tt.weighted_mean(self.values, self.weights), np.mean(self.population))
+        self.assertAlmostEqual(tt.weighted_std(self.values, self.weights), np.std(self.population))
+
+    def test_stats(self):
+        df = pd.DataFrame({'database': np.repeat(['WA_0', 'WB_0'], 20), 'value': self.values,
+                           'prob': self.weights})
+        stats = tt.weighted_stats(df, 'database', quantiles=(0.05, 0.5, 0.95))
+        self.assertEqual(list(stats.columns), ['database', 'mean', 'std', '5%', '50%', '95%'])
+        for i, db in enumerate(['WA_0', 'WB_0']):
+            population = replicate(self.values[20 * i:20 * (i + 1)], self.counts[20 * i:20 * (i + 1)])
+            row = stats.loc[stats['database'] == db].iloc[0]
+            self.assertAlmostEqual(row['mean'], np.mean(population))
+            self.assertAlmostEqual(row['std'], np.std(population))
+            self.assertEqual(row['50%'], population[int(np.ceil(0.5 * len(population))) - 1])
+
+
+if __name__ == '__main__':
+    unittest.main()